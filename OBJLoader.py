@@ -1,24 +1,50 @@
+import os
+import time
 from OpenGL.GL import *
 from OpenGL.GLU import *
 from OpenGL.GLUT import *
 from instances import Instances
 from particleSystem import ParticleSystem
+from objParser import OBJParser
+import meshCache
 
 class OBJLoader:
-    def __init__(self, filename):
-        vertices = []
-        faces = []
-        
-        with open(filename, 'r') as f:
-            for line in f:
-                parts = line.strip().split()
-                if len(parts) == 0:
-                    continue
-                if parts[0] == 'v':
-                    vertices.append(list(map(float, parts[1:4])))
-                elif parts[0] == 'f':
-                    faces.append(int(parts[1]))
-                    faces.append(int(parts[2]))
-                    faces.append(int(parts[3]))
-
-        Instances.particle_system_instance = ParticleSystem(vertices, faces, indexOffset=-1)
\ No newline at end of file
+    # Set to False to always parse the OBJ text and never read or write the binary cache
+    cache_enabled = True
+
+    def __init__(self, filename, use_cache = None):
+        if use_cache is None:
+            use_cache = OBJLoader.cache_enabled
+
+        vertices, faces = None, None
+        if use_cache:
+            start_time = time.perf_counter()
+            cached = meshCache.load_mesh_cache(filename)
+            if cached is not None:
+                vertices, faces = cached
+                print("{}: mapped {} vertices, {} triangles from {} in {:.1f} ms".format(
+                    filename, len(vertices), len(faces), meshCache.cache_path_for(filename), (time.perf_counter() - start_time) * 1000.0))
+
+        if vertices is None:
+            vertices, faces = self.parse(filename, use_cache)
+
+        Instances.particle_system_instance = ParticleSystem(vertices, faces, indexOffset=0)
+        Instances.particle_system_instance.source_path = filename
+        Instances.particle_system_instance.auto_build_lod()
+
+    # Parse the OBJ text, and write the cache next to it if enabled
+    def parse(self, filename, use_cache):
+        stat = os.stat(filename)
+        hasher = meshCache.new_hasher() if use_cache else None
+
+        parser = OBJParser()
+        vertices, faces = parser.parse(filename, hasher.update if hasher is not None else None)
+        print("{}: {}".format(filename, parser.stats_string()))
+
+        if use_cache:
+            try:
+                meshCache.write_mesh_cache(filename, vertices, faces, stat.st_size, stat.st_mtime_ns, hasher.digest())
+            except OSError as e:
+                print("Could not write mesh cache for {}: {}".format(filename, e))
+
+        return vertices, faces
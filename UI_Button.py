@@ -7,6 +7,7 @@ from OpenGL.GLU import *
 from OpenGL.GLUT import *
 
 from instances import Instances
+from renderScheduler import request_redisplay
 
 class UI_Button:
     def __init__(self, x, y, width, height, text=""):
@@ -25,6 +26,7 @@ class UI_Button:
             # Check if the click coordinates are within the button's bounding box
             if self.x <= x and x <= self.x + self.width and self.y <= y and y <= self.y + self.height:
                 self.on_click()
+                request_redisplay()
     
     def render(self):
         # Draw the button rectangle
@@ -0,0 +1,127 @@
+"""
+This file contains the AnimationData class and the compact binary animation format.
+
+Layout of a binary animation file:
+    8 bytes magic, uint32 version, uint32 header length, a JSON header, zero padding up to a 64 byte boundary,
+    then the frames as a frames x vertices x 3 float32 block and the triangle indices as a triangles x 3 uint32 block.
+The JSON header holds the counts, the block offsets, the frame types and the marks.
+
+Convert a JSON animation with: python animationFormat.py <animation.json> <animation.pmanim>
+"""
+
+import json
+import struct
+import sys
+import numpy as np
+
+MAGIC = b"PMVANIM\0"
+VERSION = 1
+ALIGNMENT = 64
+BINARY_SUFFIX = ".pmanim"
+
+class AnimationData:
+    def __init__(self, frames, frame_types, triangles, marks = None):
+        # frames x vertices x 3 float32, either in memory or memory-mapped
+        self.frames = frames
+        self.frame_types = frame_types
+        # triangles x 3 uint32
+        self.triangles = triangles
+        # mark name -> frame index
+        self.marks = marks if marks is not None else {}
+
+    def frame_count(self):
+        return len(self.frames)
+
+    def vertex_count(self):
+        return self.frames.shape[1] if len(self.frames) > 0 else 0
+
+    # Convert the decoded JSON schema: {"frames": [{"type", "points": [{"X", "Y", "Z"}]}], "triangle_indices": [{"A", "B", "C"}]}
+    @staticmethod
+    def from_json_dict(data):
+        frames = np.array([[[vertex['X'], vertex['Y'], vertex['Z']] for vertex in frame['points']] for frame in data['frames']], dtype=np.float32)
+        frame_types = [frame['type'] for frame in data['frames']]
+        triangles = np.array([[t['A'], t['B'], t['C']] for t in data['triangle_indices']], dtype=np.uint32).reshape(-1, 3)
+        return AnimationData(frames, frame_types, triangles, data.get('marks'))
+
+    # Write the animation in the binary format
+    def save_binary(self, path):
+        frames_offset, triangles_offset, header = make_header(len(self.frames), self.vertex_count(), len(self.triangles), self.frame_types, self.marks)
+        with open(path, "wb") as f:
+            f.write(header)
+            f.write(b"\0" * (frames_offset - len(header)))
+            # Write frame by frame so memory-mapped sources are not loaded as a whole
+            for i in range(len(self.frames)):
+                np.ascontiguousarray(self.frames[i], dtype=np.float32).tofile(f)
+            f.write(b"\0" * (triangles_offset - f.tell()))
+            np.ascontiguousarray(self.triangles, dtype=np.uint32).tofile(f)
+
+# Build the file header and compute where the frame and triangle blocks start
+def make_header(frame_count, vertex_count, triangle_count, frame_types, marks):
+    description = {
+        "frame_count": frame_count,
+        "vertex_count": vertex_count,
+        "triangle_count": triangle_count,
+        "frame_types": frame_types,
+        "marks": marks,
+    }
+    # The offsets are part of the header, so grow the reserved header size until they fit
+    reserved = ALIGNMENT
+    while True:
+        frames_offset = align(16 + reserved)
+        triangles_offset = align(frames_offset + frame_count * vertex_count * 3 * 4)
+        description["frames_offset"] = frames_offset
+        description["triangles_offset"] = triangles_offset
+        text = json.dumps(description).encode("utf-8")
+        if 16 + len(text) <= frames_offset:
+            return frames_offset, triangles_offset, MAGIC + struct.pack("<II", VERSION, len(text)) + text
+        reserved = len(text)
+
+def align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def is_binary_animation(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+# Memory-map a binary animation. Only the frames that are read become resident.
+def load_binary_animation(path):
+    with open(path, "rb") as f:
+        magic, version, header_length = struct.unpack("<8sII", f.read(16))
+        if magic != MAGIC:
+            raise ValueError("{} is not a binary animation".format(path))
+        if version != VERSION:
+            raise ValueError("{} has unsupported animation format version {}".format(path, version))
+        description = json.loads(f.read(header_length).decode("utf-8"))
+
+    frame_count = description["frame_count"]
+    vertex_count = description["vertex_count"]
+    triangle_count = description["triangle_count"]
+
+    if frame_count * vertex_count > 0:
+        frames = np.memmap(path, dtype=np.float32, mode="r", offset=description["frames_offset"], shape=(frame_count, vertex_count, 3))
+    else:
+        frames = np.empty((frame_count, vertex_count, 3), dtype=np.float32)
+    if triangle_count > 0:
+        triangles = np.memmap(path, dtype=np.uint32, mode="r", offset=description["triangles_offset"], shape=(triangle_count, 3))
+    else:
+        triangles = np.empty((0, 3), dtype=np.uint32)
+
+    return AnimationData(frames, description["frame_types"], triangles, description.get("marks"))
+
+# Convert an animation in the JSON schema to the binary format
+def convert_json_to_binary(json_path, binary_path):
+    # Imported here, the streaming loader itself depends on AnimationData
+    from streamingAnimationLoader import StreamingAnimationLoader
+    data = StreamingAnimationLoader(json_path).load()
+    data.save_binary(binary_path)
+    return data
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python animationFormat.py <animation.json> <animation{}>".format(BINARY_SUFFIX))
+        sys.exit(1)
+    data = convert_json_to_binary(sys.argv[1], sys.argv[2])
+    print("Converted {} frames of {} vertices to {}".format(data.frame_count(), data.vertex_count(), sys.argv[2]))
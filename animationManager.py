@@ -7,6 +7,12 @@ from OpenGL.GL import *
 from OpenGL.GLU import *
 from OpenGL.GLUT import *
 import time
+import numpy as np
+from compressedAnimation import CompressedFrames
+from framePrefetcher import FramePrefetcher
+from vertexTrajectory import VertexTrajectory
+from vector3 import Vector3
+from renderScheduler import request_redisplay
 
 class AnimationManager:
     def __init__(self, particle_system, animation_frames, animation_frame_types):
@@ -17,51 +23,146 @@ class AnimationManager:
         self.animating = False
         self.paused = False
         self.tracking_vertex = -1
-        self.stop_animation = False
         self.marks = {}
 
-    def tprint(self, s):
-        Instances.terminalManager_instance.tprint("[Animation] " + s)
+        # Playback clock, advanced by the render loop
+        self.start_index = 0
+        self.end_index = 0
+        self.frame_time = 0.0
+        self.speed = 1.0
+        self.interpolate = False
+        # Fractional frame index of the playback
+        self.play_position = 0.0
+        self.last_clock_time = 0.0
+        self.frames_shown = 0
+        self.dropped_frames = 0
+        # Reused for the blended positions when interpolating
+        self.blend_buffer = None
+        # Set while frames are still being streamed in
+        self.loading = False
+        # Result of the last trajectory query
+        self.trajectory = None
 
-    # Animate the particle system from start_index to end_index with a delay of dt
-    def animate(self, start_index, end_index, dt):
-        self.animating = True
+    def tprint(self, s, source = None):
+        Instances.terminalManager_instance.tprint("[Animation] " + s, source)
 
-        if start_index > end_index:
+    # Play the frames start_index to end_index - 1, each one shown for dt seconds at speed 1.
+    # Returns immediately, the render loop advances the playback through update().
+    def animate(self, start_index, end_index, dt):
+        if start_index >= end_index:
             return
         
         if start_index > len(self.animation_frames) or end_index > len(self.animation_frames):
             return
 
-        for i in range(start_index, end_index):
-            while self.paused:
-                time.sleep(dt)
-            if self.stop_animation:
-                self.stop_animation = False
-                self.animating = False
-                return
-            
-
-            self.animation_index = i
-
-            prev_position = None
-            if self.tracking_vertex != -1:
-                # Get change of position
-                prev_position = self.particle_system.particles[self.tracking_vertex].position
-
-            self.particle_system.update_vertices(self.animation_frames[i])
-            self.particle_system.frame_type = self.animation_frame_types[i]
-
-            self.tprint("Animating frame {}, type {}".format(i, self.animation_frame_types[i]))
-            if self.tracking_vertex != -1:
-                self.particle_system.select_particle_enabled = True
-                self.particle_system.select_triangle_enabled = False
-                self.particle_system.selected_element_index = self.tracking_vertex
-                curr_position = self.particle_system.particles[self.tracking_vertex].position
-                self.tprint("Tracking Vertex Position: {}, Change of Position: {}\n".format(curr_position, curr_position - prev_position))
-            
-            time.sleep(dt)
+        self.start_index = start_index
+        self.end_index = end_index
+        self.frame_time = max(dt, 1e-6)
+        self.play_position = float(start_index)
+        self.last_clock_time = time.perf_counter()
+        self.frames_shown = 0
+        self.dropped_frames = 0
+        self.paused = False
+        self.animating = True
+        self.set_playback_active(True)
+        self.show_frame(start_index)
+
+    # Keep the render loop running at the FPS cap while frames are being played
+    def set_playback_active(self, active):
+        if Instances.render_scheduler_instance is not None:
+            Instances.render_scheduler_instance.playback_active = active
+
+    # Called by the render loop before drawing. Picks the frame for the current wall-clock time,
+    # frames that fell between two rendered frames are skipped and counted as dropped.
+    def update(self, now = None):
+        if not self.animating:
+            return
+        if now is None:
+            now = time.perf_counter()
+        elapsed = now - self.last_clock_time
+        self.last_clock_time = now
+        if self.paused:
+            return
+
+        self.play_position += elapsed * self.speed / self.frame_time
+        last_index = self.end_index - 1
+        if self.play_position >= last_index:
+            self.play_position = float(last_index)
+            self.show_frame(last_index)
+            self.finish()
+            return
+
+        # The tolerance keeps clock rounding from skipping a frame when frames and renders have the same period
+        index = int(self.play_position + 1e-6)
+        if index != self.animation_index:
+            # When interpolating the blend below is the frame that gets shown
+            self.show_frame(index, upload=not self.interpolate)
+        if self.interpolate:
+            self.show_blend(index, self.play_position - index)
+
+    def show_frame(self, index, upload = True):
+        if self.animation_index != -1 and index > self.animation_index + 1:
+            self.dropped_frames += index - self.animation_index - 1
+        self.frames_shown += 1
+
+        prev_position = None
+        if self.tracking_vertex != -1:
+            # Get change of position
+            prev_position = self.particle_system.particles[self.tracking_vertex].position
+
+        direction = -1 if index < self.animation_index else 1
+        self.animation_index = index
+        frame = self.animation_frames[index]
+        if isinstance(self.animation_frames, FramePrefetcher):
+            # Decode the coming frames while this one is shown
+            rate = self.speed / self.frame_time if self.animating else 0.0
+            self.animation_frames.prefetch_around(index, direction, rate)
+        if upload:
+            self.particle_system.update_vertices(frame)
+        self.particle_system.frame_type = self.animation_frame_types[index]
+
+        # Sent every frame during playback, the terminal keeps only the latest
+        self.tprint("Animating frame {}, type {}".format(index, self.animation_frame_types[index]), "frame")
+        if self.tracking_vertex != -1:
+            self.particle_system.select_particle_enabled = True
+            self.particle_system.select_triangle_enabled = False
+            self.particle_system.select_edge_enabled = False
+            self.particle_system.selected_element_index = self.tracking_vertex
+            # The particle system shows the new frame from the next render on, read it from the frame
+            curr_position = Vector3(*(float(c) for c in frame[self.tracking_vertex]))
+            self.tprint("Tracking Vertex Position: {}, Change of Position: {}\n".format(curr_position, curr_position - prev_position), "tracking")
+
+    # Show the positions blended between frame index and the next one
+    def show_blend(self, index, alpha):
+        current = self.animation_frames[index]
+        following = self.animation_frames[index + 1]
+        if self.blend_buffer is None or self.blend_buffer.shape != current.shape:
+            self.blend_buffer = np.empty(current.shape, dtype=np.float32)
+        np.subtract(following, current, out=self.blend_buffer)
+        self.blend_buffer *= alpha
+        self.blend_buffer += current
+        self.particle_system.update_vertices(self.blend_buffer)
+
+    def finish(self):
         self.animating = False
+        self.set_playback_active(False)
+        self.tprint(self.stats_string())
+
+    def stats_string(self):
+        return "Played {} frames at speed {}, {} dropped frames".format(self.frames_shown, self.speed, self.dropped_frames)
+
+    # Change the playback speed, e.g. 0.25 for slow motion
+    def set_speed(self, speed):
+        if speed <= 0.0:
+            self.tprint("Speed must be positive.")
+            return
+        self.speed = speed
+        self.tprint("Playback speed {}.".format(speed))
+
+    # Blend the positions between frames, for smooth slow motion
+    def set_interpolate(self, interpolate):
+        self.interpolate = interpolate
+        self.tprint("Interpolation {}.".format("on" if interpolate else "off"))
 
     # Pause the animation
     def pause(self):
@@ -80,7 +181,10 @@ class AnimationManager:
 
     # Stop the animation
     def stop(self):
-        self.stop_animation = True
+        if self.animating:
+            self.animating = False
+            self.set_playback_active(False)
+            self.tprint(self.stats_string())
         self.tprint("Stopped animation.")
 
     # Go to a specific frame
@@ -88,25 +192,89 @@ class AnimationManager:
         index = -1
         if name.isnumeric():
             index = int(name)
-        elif self.marks[name] != None:
+        elif name in self.marks:
             index = self.marks[name]
         else:
             self.tprint("No such mark!")
             return
 
         self.stop()
-        self.animation_index = index
-        self.particle_system.update_vertices(self.animation_frames[index])
-        self.particle_system.frame_type = self.animation_frame_types[index]
-        self.tprint("Animating frame {}, type {}".format(index, self.animation_frame_types[index]))
-        if self.tracking_vertex != -1:
-                self.particle_system.select_particle_enabled = True
-                self.particle_system.select_triangle_enabled = False
-                self.particle_system.selected_element_index = self.tracking_vertex
-                curr_position = self.particle_system.particles[self.tracking_vertex].position
-                self.tprint("Tracking Vertex Position: {}\n".format(curr_position))
+        self.animation_index = -1
+        self.show_frame(index)
+
+    # Replace the frames by keyframes and quantized deltas, each position within error_bound of the original
+    def compress(self, error_bound, keyframe_interval = 30):
+        if self.loading:
+            self.tprint("The animation is still loading.")
+            return
+        prefetching = isinstance(self.animation_frames, FramePrefetcher)
+        frames = self.animation_frames.source if prefetching else self.animation_frames
+        if isinstance(frames, CompressedFrames):
+            self.tprint("The animation is already compressed.")
+            return
+
+        compressed = CompressedFrames(frames, error_bound, keyframe_interval)
+        self.tprint("Compressed " + compressed.stats_string())
+        self.tprint("Decoding at {:.0f} frames per second".format(compressed.decode_fps()))
+        self.set_prefetch(False)
+        self.animation_frames = compressed
+        self.blend_buffer = None
+        if prefetching:
+            self.set_prefetch(True)
+
+    # Decode frames ahead of the playhead in the background, for frames that are slow to read
+    def set_prefetch(self, enabled, byte_budget = None):
+        if enabled and self.loading:
+            # The loader keeps replacing animation_frames with longer slices, which would drop the prefetcher
+            self.tprint("The animation is still loading.")
+            return
+        prefetcher = self.animation_frames if isinstance(self.animation_frames, FramePrefetcher) else None
+        if enabled and prefetcher is None:
+            prefetcher = FramePrefetcher(self.animation_frames)
+            self.animation_frames = prefetcher
+        elif not enabled and prefetcher is not None:
+            self.animation_frames = prefetcher.source
+            prefetcher.shutdown()
+            prefetcher = None
+        if prefetcher is not None and byte_budget is not None:
+            prefetcher.set_byte_budget(byte_budget)
+
+    def prefetch_stats_string(self):
+        if not isinstance(self.animation_frames, FramePrefetcher):
+            return "Prefetching is off."
+        return self.animation_frames.stats_string()
+
+    # Release the prefetch workers, the animation is being replaced
+    def close(self):
+        self.animating = False
+        self.set_prefetch(False)
+
+    # Compute the trajectories of the vertices over the frames start to end - 1
+    def query_trajectory(self, vertex_ids, start = 0, end = None):
+        start_time = time.perf_counter()
+        self.trajectory = VertexTrajectory(self.animation_frames, vertex_ids, start, end)
+        for line in self.trajectory.summary_lines():
+            self.tprint(line)
+        self.tprint("Trajectory of {} vertices over {} frames in {:.2f} ms".format(
+            len(self.trajectory.vertex_ids), self.trajectory.frame_count(), (time.perf_counter() - start_time) * 1000.0))
+
+    # Write the last trajectory to a .csv or .npy file
+    def export_trajectory(self, path):
+        if self.trajectory is None:
+            self.tprint("No trajectory, query one first.")
+            return
+        self.trajectory.save(path)
+        self.tprint("Saved trajectory to {}.".format(path))
+
+    # Draw the last trajectory as a polyline, or remove it
+    def draw_trajectory(self, visible):
+        if visible and self.trajectory is None:
+            self.tprint("No trajectory, query one first.")
+            return
+        self.particle_system.lines = self.trajectory.polyline() if visible else []
+        request_redisplay()
 
     # Mark a frame with a name
     def mark(self, index, name):
-        self.marks[index] = name
+        self.marks[name] = index
         self.tprint("Marked frame {} as {}.".format(index, name))
\ No newline at end of file
@@ -0,0 +1,184 @@
+"""
+This file contains the BVH class, a bounding volume hierarchy over the triangles of a mesh used to accelerate ray picking.
+"""
+
+import time
+import numpy as np
+from rayIntersection import to_np3, nearest_ray_triangle_hit
+
+# Spread the lower 21 bits of each value so that there are two zero bits between every bit
+def _part1by2(v):
+    v = v & 0x1fffff
+    v = (v | (v << 32)) & 0x1f00000000ffff
+    v = (v | (v << 16)) & 0x1f0000ff0000ff
+    v = (v | (v << 8)) & 0x100f00f00f00f00f
+    v = (v | (v << 4)) & 0x10c30c30c30c30c3
+    v = (v | (v << 2)) & 0x1249249249249249
+    return v
+
+# 63 bit Morton codes of Nx3 points, normalized to their bounding box
+def morton_codes(points):
+    if len(points) == 0:
+        return np.empty(0, dtype=np.uint64)
+    lo = points.min(axis=0)
+    extent = np.maximum(points.max(axis=0) - lo, 1e-30)
+    q = ((points - lo) / extent * 2097151.0).astype(np.uint64)
+    return _part1by2(q[:, 0]) | (_part1by2(q[:, 1]) << np.uint64(1)) | (_part1by2(q[:, 2]) << np.uint64(2))
+
+class BVH:
+    def __init__(self, positions, indices, leaf_size = 32):
+        self.indices = indices
+        self.leaf_size = leaf_size
+
+        # Per node arrays, nodes are stored level by level so children always come after their parent
+        self.bounds_min = None
+        self.bounds_max = None
+        self.left = None
+        self.right = None
+        self.start = None
+        self.count = None
+        self.depth = None
+
+        # Triangle ids ordered so that every leaf owns the contiguous range [start, start + count)
+        self.triangle_order = None
+
+        self.build_time = 0.0
+        self.refit_time = 0.0
+        self.refit_count = 0
+
+        self.build(positions)
+
+    # Build the tree topology level by level over the triangles sorted along a Morton curve, then compute the bounds
+    def build(self, positions):
+        start_time = time.perf_counter()
+
+        triangle_count = len(self.indices)
+        centroids = (positions[self.indices[:, 0]].astype(np.float64) + positions[self.indices[:, 1]] + positions[self.indices[:, 2]]) / 3.0
+        self.triangle_order = np.argsort(morton_codes(centroids), kind="stable")
+
+        start = [np.array([0], dtype=np.int64)]
+        count = [np.array([triangle_count], dtype=np.int64)]
+        depth = [np.array([0], dtype=np.int64)]
+        parents = []
+        children = []
+
+        # Split every node of the current level that holds more than leaf_size triangles at its median
+        node_count = 1
+        level_nodes = np.array([0], dtype=np.int64)
+        d = 0
+        while True:
+            split = count[-1] > self.leaf_size
+            if not split.any():
+                break
+
+            lo = start[-1][split]
+            n = count[-1][split]
+            mid = n // 2
+            level_children = node_count + np.arange(2 * len(n), dtype=np.int64)
+            node_count += len(level_children)
+
+            parents.append(level_nodes[split])
+            children.append(level_children)
+            start.append(np.stack([lo, lo + mid], axis=1).ravel())
+            count.append(np.stack([mid, n - mid], axis=1).ravel())
+            depth.append(np.full(len(level_children), d + 1, dtype=np.int64))
+
+            level_nodes = level_children
+            d += 1
+
+        self.start = np.concatenate(start)
+        self.count = np.concatenate(count)
+        self.depth = np.concatenate(depth)
+        self.left = np.full(node_count, -1, dtype=np.int64)
+        self.right = np.full(node_count, -1, dtype=np.int64)
+        for level_parents, level_children in zip(parents, children):
+            self.left[level_parents] = level_children[0::2]
+            self.right[level_parents] = level_children[1::2]
+
+        # Internal nodes own no triangles directly
+        self.count[self.left >= 0] = 0
+
+        self.bounds_min = np.empty((node_count, 3), dtype=np.float32)
+        self.bounds_max = np.empty((node_count, 3), dtype=np.float32)
+        self.refit(positions)
+        self.refit_count = 0
+
+        self.build_time = time.perf_counter() - start_time
+
+    # Recompute the node bounds bottom-up for new vertex positions, keeping the topology
+    def refit(self, positions):
+        start_time = time.perf_counter()
+
+        leaves = np.flatnonzero(self.count > 0)
+        if len(leaves) > 0:
+            leaves = leaves[np.argsort(self.start[leaves])]
+            tris = self.indices[self.triangle_order]
+            v0 = positions[tris[:, 0]]
+            v1 = positions[tris[:, 1]]
+            v2 = positions[tris[:, 2]]
+            tri_min = np.minimum(np.minimum(v0, v1), v2)
+            tri_max = np.maximum(np.maximum(v0, v1), v2)
+            self.bounds_min[leaves] = np.minimum.reduceat(tri_min, self.start[leaves], axis=0)
+            self.bounds_max[leaves] = np.maximum.reduceat(tri_max, self.start[leaves], axis=0)
+        else:
+            self.bounds_min[:] = np.inf
+            self.bounds_max[:] = -np.inf
+
+        internal = np.flatnonzero(self.left >= 0)
+        for d in range(int(self.depth.max()), -1, -1):
+            nodes = internal[self.depth[internal] == d]
+            if len(nodes) == 0:
+                continue
+            self.bounds_min[nodes] = np.minimum(self.bounds_min[self.left[nodes]], self.bounds_min[self.right[nodes]])
+            self.bounds_max[nodes] = np.maximum(self.bounds_max[self.left[nodes]], self.bounds_max[self.right[nodes]])
+
+        self.refit_time = time.perf_counter() - start_time
+        self.refit_count += 1
+
+    # Collect the ids of the triangles in every leaf whose box is hit by the ray
+    def candidate_triangles(self, ray_origin, ray_direction):
+        origin = to_np3(ray_origin)
+        direction = to_np3(ray_direction)
+        with np.errstate(divide="ignore"):
+            inv_direction = 1.0 / direction
+
+        leaves = []
+        frontier = np.array([0], dtype=np.int64)
+        while len(frontier) > 0:
+            # Slab test of all nodes of the frontier at once
+            with np.errstate(invalid="ignore"):
+                t0 = (self.bounds_min[frontier] - origin) * inv_direction
+                t1 = (self.bounds_max[frontier] - origin) * inv_direction
+            t_near = np.nanmax(np.minimum(t0, t1), axis=1)
+            t_far = np.nanmin(np.maximum(t0, t1), axis=1)
+            frontier = frontier[(t_near <= t_far) & (t_far >= 0.0)]
+
+            is_leaf = self.left[frontier] < 0
+            leaves.append(frontier[is_leaf])
+            internal = frontier[~is_leaf]
+            frontier = np.concatenate([self.left[internal], self.right[internal]])
+
+        leaves = np.concatenate(leaves)
+        counts = self.count[leaves]
+        if counts.sum() == 0:
+            return np.empty(0, dtype=np.int64)
+
+        # Expand the [start, start + count) ranges of the hit leaves
+        offsets = np.repeat(self.start[leaves] - np.cumsum(counts) + counts, counts)
+        return self.triangle_order[offsets + np.arange(counts.sum())]
+
+    # Returns (triangle_index, distance) of the nearest hit, or (-1, None) on a miss
+    def intersect(self, ray_origin, ray_direction, positions):
+        candidates = np.sort(self.candidate_triangles(ray_origin, ray_direction))
+        return nearest_ray_triangle_hit(ray_origin, ray_direction, positions, self.indices, candidates)
+
+    def node_count(self):
+        return len(self.left)
+
+    def leaf_count(self):
+        return int(np.count_nonzero(self.left < 0))
+
+    def stats_string(self):
+        return "BVH: {} triangles, {} nodes, {} leaves, depth {}, build {:.2f} ms, last refit {:.2f} ms ({} refits)".format(
+            len(self.indices), self.node_count(), self.leaf_count(), int(self.depth.max()),
+            self.build_time * 1000.0, self.refit_time * 1000.0, self.refit_count)
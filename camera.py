@@ -4,6 +4,7 @@ This file contains the Camera class, which is used to represent the camera in th
 
 from vector3 import Vector3
 import math
+import numpy as np
 
 class Camera:
     def __init__(self):
@@ -28,4 +29,40 @@ class Camera:
         u = u.normalize()
         v = w.cross(u)
 
-        return u, v, w
\ No newline at end of file
+        return u, v, w
+
+    # Compute the projection, model view and viewport without a GL context, the same matrices
+    # gluPerspective(fovy, width / height, near, far) and gluLookAt along the view direction produce
+    def update_matrices(self, width, height, fovy = 45.0, near = 0.1, far = 50.0):
+        u, v, w = self.compute_direction_vectors()
+        self.projection = Camera.perspective_matrix(fovy, float(width) / float(height), near, far)
+        self.modelView = Camera.look_at_matrix(self.camera_pos, self.camera_pos + w, Vector3(0.0, 1.0, 0.0))
+        self.viewPort = np.array([0, 0, width, height], dtype=np.int32)
+
+    # Matrices are returned in the layout of glGetFloatv, column-major, i.e. the transpose of the math notation
+    @staticmethod
+    def perspective_matrix(fovy, aspect, near, far):
+        f = 1.0 / math.tan(math.radians(fovy) / 2.0)
+        m = np.zeros((4, 4), dtype=np.float32)
+        m[0, 0] = f / aspect
+        m[1, 1] = f
+        m[2, 2] = (far + near) / (near - far)
+        m[3, 2] = 2.0 * far * near / (near - far)
+        m[2, 3] = -1.0
+        return m
+
+    @staticmethod
+    def look_at_matrix(eye, target, up):
+        eye = np.array([eye[0], eye[1], eye[2]], dtype=np.float64)
+        forward = np.array([target[0], target[1], target[2]], dtype=np.float64) - eye
+        forward /= np.linalg.norm(forward)
+        side = np.cross(forward, [up[0], up[1], up[2]])
+        side /= np.linalg.norm(side)
+        up = np.cross(side, forward)
+
+        m = np.identity(4, dtype=np.float64)
+        m[:3, 0] = side
+        m[:3, 1] = up
+        m[:3, 2] = -forward
+        m[3, :3] = -eye @ m[:3, :3]
+        return m.astype(np.float32)
@@ -0,0 +1,136 @@
+"""
+This file contains the CommandQueue and CommandServer classes, which let scripts drive the viewer over a local socket.
+
+The server runs on the asyncio loop of the TerminalManager and accepts the command language of InputHandler.command,
+one command per line. Clients may send many commands without waiting: every command gets one JSON line in response,
+in order, e.g. {"ok": true, "output": ["Hit vertex index: 3, ..."]}.
+
+Commands are not run on the loop. They are queued and the render thread runs them between frames, for at most a
+small time budget per tick, so scripted control never races the renderer and never stalls it for long.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from instances import Instances
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 47800
+
+# Commands waiting for the render thread
+class CommandQueue:
+    def __init__(self, time_budget = 0.004):
+        self.commands = deque()
+        self.lock = threading.Lock()
+        # Seconds the render thread spends on commands per tick, at least one command always runs
+        self.time_budget = time_budget
+        self.commands_run = 0
+
+    # Queue a command, on_done(response) is called on the render thread once it ran
+    def submit(self, command, on_done):
+        with self.lock:
+            self.commands.append((command, on_done))
+
+    def has_pending(self):
+        return len(self.commands) > 0
+
+    # Called by the render thread. Returns True when commands ran.
+    def run_pending(self):
+        deadline = time.perf_counter() + self.time_budget
+        ran = False
+        while True:
+            with self.lock:
+                if len(self.commands) == 0:
+                    break
+                command, on_done = self.commands.popleft()
+            on_done(run_command(command))
+            self.commands_run += 1
+            ran = True
+            if time.perf_counter() >= deadline:
+                break
+        return ran
+
+# Run one command through the InputHandler, collecting what it prints as the response
+def run_command(command):
+    terminal = Instances.terminalManager_instance
+    terminal.begin_capture()
+    try:
+        Instances.input_handler_instance.command(command)
+        response = {"ok": True}
+    except Exception as e:
+        response = {"ok": False, "error": "{}: {}".format(type(e).__name__, e)}
+    response["output"] = terminal.end_capture()
+    return response
+
+class CommandServer:
+    def __init__(self, command_queue, host = DEFAULT_HOST, port = DEFAULT_PORT, path = None):
+        self.command_queue = command_queue
+        self.host = host
+        self.port = port
+        # Unix domain socket path, used instead of TCP when given
+        self.path = path
+        self.server = None
+        self.loop = None
+        self.connections = 0
+
+    # Start listening, has to run on the asyncio loop
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        if self.path is not None:
+            self.server = await asyncio.start_unix_server(self.handle_client, path=self.path)
+        else:
+            self.server = await asyncio.start_server(self.handle_client, self.host, self.port)
+            # Port 0 picks a free port
+            self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    def address_string(self):
+        return self.path if self.path is not None else "{}:{}".format(self.host, self.port)
+
+    async def handle_client(self, reader, writer):
+        self.connections += 1
+        # Responses in command order, the writer awaits them while the reader keeps queueing commands
+        responses = asyncio.Queue()
+        writer_task = self.loop.create_task(self.write_responses(responses, writer))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode("utf-8", errors="replace").strip()
+                if len(command) == 0:
+                    continue
+                await responses.put(self.submit(command))
+        finally:
+            await responses.put(None)
+            await writer_task
+            writer.close()
+
+    # Queue the command for the render thread, returns a future of its response
+    def submit(self, command):
+        future = self.loop.create_future()
+
+        def on_done(response):
+            self.loop.call_soon_threadsafe(future.set_result, response)
+
+        self.command_queue.submit(command, on_done)
+        return future
+
+    async def write_responses(self, responses, writer):
+        while True:
+            future = await responses.get()
+            if future is None:
+                break
+            response = await future
+            try:
+                writer.write((json.dumps(response) + "\n").encode("utf-8"))
+                await writer.drain()
+            except ConnectionError:
+                # The client went away, the remaining commands still run but nobody reads the responses
+                pass
@@ -0,0 +1,137 @@
+"""
+This file contains the CompressedFrames class, a compact in-memory store for the frames of an animation.
+
+Every keyframe_interval-th frame is kept as float32. The frames in between are stored as the difference to the
+previous frame, quantized to steps of twice the error bound, packed into the smallest integer type that holds them
+and deflated. The encoder quantizes against its own reconstruction, so the error never accumulates along a run
+of deltas and every decoded position is within the error bound of the original.
+
+Frames are decoded on demand into two reusable buffers, which makes sequential playback one delta per frame
+and lets a frame and its successor be read at the same time, e.g. for interpolation.
+"""
+
+import time
+import zlib
+import numpy as np
+
+DELTA_TYPES = (np.int8, np.int16, np.int32, np.int64)
+
+class CompressedFrames:
+    def __init__(self, frames, error_bound = 1e-4, keyframe_interval = 30):
+        if error_bound <= 0.0:
+            raise ValueError("error_bound must be positive")
+        self.error_bound = error_bound
+        self.keyframe_interval = max(int(keyframe_interval), 1)
+        self.step = np.float32(2.0 * error_bound)
+
+        self.frame_count = len(frames)
+        self.vertex_count = len(frames[0]) if self.frame_count > 0 else 0
+        self.shape = (self.frame_count, self.vertex_count, 3)
+        self.dtype = np.dtype(np.float32)
+
+        # frame index -> float32 positions of the keyframes
+        self.keyframes = {}
+        # per frame (deflated bytes, integer type) of the quantized delta, None for keyframes
+        self.deltas = []
+        self.encode_time = 0.0
+        self.encode(frames)
+
+        self.buffers = [np.empty((self.vertex_count, 3), dtype=np.float32) for i in range(2)]
+        self.buffer_frames = [-1, -1]
+        self.last_used = 0
+
+    def encode(self, frames):
+        start_time = time.perf_counter()
+        reconstructed = None
+        for i in range(self.frame_count):
+            frame = np.asarray(frames[i], dtype=np.float32).reshape(-1, 3)
+            if i % self.keyframe_interval == 0:
+                reconstructed = frame.copy()
+                self.keyframes[i] = reconstructed.copy()
+                self.deltas.append(None)
+                continue
+
+            quantized = np.rint((frame - reconstructed) / self.step)
+            largest = np.abs(quantized).max() if quantized.size > 0 else 0
+            delta_type = next(t for t in DELTA_TYPES if largest <= np.iinfo(t).max)
+            quantized = quantized.astype(delta_type)
+            # The same arithmetic as apply_delta, so encoder and decoder agree bit for bit
+            reconstructed += quantized.astype(np.float32) * self.step
+            self.deltas.append((zlib.compress(quantized.tobytes(), 1), delta_type))
+        self.encode_time = time.perf_counter() - start_time
+
+    def __len__(self):
+        return self.frame_count
+
+    # Decoded positions of a frame. The returned array is reused by later calls, copy it to keep it.
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.frame_count
+        if index < 0 or index >= self.frame_count:
+            raise IndexError("frame index out of range")
+
+        for slot in range(2):
+            if self.buffer_frames[slot] == index:
+                self.last_used = slot
+                return self.buffers[slot]
+
+        slot = 1 - self.last_used
+        other = self.last_used
+        buffer = self.buffers[slot]
+        keyframe = index - index % self.keyframe_interval
+        if keyframe <= self.buffer_frames[other] < index:
+            # Continue from the other buffer, e.g. the previous frame during playback
+            np.copyto(buffer, self.buffers[other])
+            first = self.buffer_frames[other] + 1
+        else:
+            np.copyto(buffer, self.keyframes[keyframe])
+            first = keyframe + 1
+
+        for i in range(first, index + 1):
+            self.apply_delta(buffer, i)
+        self.buffer_frames[slot] = index
+        self.last_used = slot
+        return buffer
+
+    # Decode a frame from its keyframe into out, without touching the shared buffers, so it is safe from any thread
+    def decode(self, index, out = None):
+        if out is None:
+            out = np.empty((self.vertex_count, 3), dtype=np.float32)
+        keyframe = index - index % self.keyframe_interval
+        np.copyto(out, self.keyframes[keyframe])
+        for i in range(keyframe + 1, index + 1):
+            self.apply_delta(out, i)
+        return out
+
+    def apply_delta(self, buffer, index):
+        data, delta_type = self.deltas[index]
+        quantized = np.frombuffer(zlib.decompress(data), dtype=delta_type).reshape(-1, 3)
+        buffer += quantized.astype(np.float32) * self.step
+
+    # Decoded copy of the frames start to end - 1
+    def decode_range(self, start, end):
+        result = np.empty((max(end - start, 0), self.vertex_count, 3), dtype=np.float32)
+        for i in range(start, end):
+            result[i - start] = self[i]
+        return result
+
+    def nbytes(self):
+        return sum(frame.nbytes for frame in self.keyframes.values()) + sum(len(delta[0]) for delta in self.deltas if delta is not None)
+
+    def raw_nbytes(self):
+        return self.frame_count * self.vertex_count * 3 * 4
+
+    def compression_ratio(self):
+        return self.raw_nbytes() / max(self.nbytes(), 1)
+
+    # Frames per second when decoding the whole animation in order
+    def decode_fps(self):
+        start_time = time.perf_counter()
+        for i in range(self.frame_count):
+            self[i]
+        return self.frame_count / max(time.perf_counter() - start_time, 1e-9)
+
+    def stats_string(self):
+        return "{} frames of {} vertices, {:.2f} MB -> {:.2f} MB ({:.1f}x), error bound {}, keyframe every {} frames, encoded in {:.2f} s".format(
+            self.frame_count, self.vertex_count, self.raw_nbytes() / (1024.0 * 1024.0), self.nbytes() / (1024.0 * 1024.0),
+            self.compression_ratio(), self.error_bound, self.keyframe_interval, self.encode_time)
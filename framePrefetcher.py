@@ -0,0 +1,192 @@
+"""
+This file contains the FrameCache and FramePrefetcher classes, which keep decoded animation frames ahead of the playhead.
+
+FramePrefetcher wraps a frame source that is slow to read, a memory-mapped binary animation or CompressedFrames,
+and behaves like the frame sequence itself. A pool of worker threads decodes the frames ahead of the playhead,
+or behind it when scrubbing backwards, into an LRU cache bounded by a byte budget. The prefetch depth follows
+the playback rate, and grows when playback still runs into frames that were not ready.
+"""
+
+import math
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from compressedAnimation import CompressedFrames
+
+# Least recently used cache of decoded frames, bounded by the bytes it holds
+class FrameCache:
+    def __init__(self, byte_budget):
+        self.byte_budget = byte_budget
+        self.frames = OrderedDict()
+        self.nbytes = 0
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, index):
+        with self.lock:
+            frame = self.frames.get(index)
+            if frame is None:
+                self.misses += 1
+                return None
+            self.frames.move_to_end(index)
+            self.hits += 1
+            return frame
+
+    def contains(self, index):
+        with self.lock:
+            return index in self.frames
+
+    # Like get, without counting a hit or miss
+    def peek(self, index):
+        with self.lock:
+            return self.frames.get(index)
+
+    def put(self, index, frame):
+        with self.lock:
+            if index in self.frames:
+                return
+            self.frames[index] = frame
+            self.nbytes += frame.nbytes
+            while self.nbytes > self.byte_budget and len(self.frames) > 1:
+                evicted_index, evicted = self.frames.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+                self.evictions += 1
+
+    def set_byte_budget(self, byte_budget):
+        with self.lock:
+            self.byte_budget = byte_budget
+            while self.nbytes > self.byte_budget and len(self.frames) > 0:
+                evicted_index, evicted = self.frames.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.frames.clear()
+            self.nbytes = 0
+
+class FramePrefetcher:
+    def __init__(self, source, byte_budget = 256 * 1024 * 1024, worker_count = 2, lookahead = 0.5, min_depth = 2):
+        self.source = source
+        self.cache = FrameCache(byte_budget)
+        self.worker_count = worker_count
+        self.pool = ThreadPoolExecutor(max_workers=worker_count, thread_name_prefix="frame-prefetch")
+        # frame index -> future of a decode that was queued and not finished yet
+        self.pending = {}
+        self.pending_lock = threading.Lock()
+
+        # Seconds of playback to keep decoded ahead of the playhead
+        self.lookahead = lookahead
+        self.min_depth = min_depth
+        self.depth = min_depth
+        self.playhead = -1
+        # Frames of the last prefetch window, a miss on one of them means the prefetch fell behind
+        self.window = set()
+
+        self.prefetched = 0
+        self.waited = 0
+
+    def __len__(self):
+        return len(self.source)
+
+    # The decoded frame, read-only and shared with the cache
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.source)
+        if index < 0 or index >= len(self.source):
+            raise IndexError("frame index out of range")
+        frame = self.cache.get(index)
+        if frame is not None:
+            return frame
+
+        if index in self.window:
+            self.report_stall()
+        with self.pending_lock:
+            future = self.pending.get(index)
+            if future is not None and future.cancel():
+                del self.pending[index]
+                future = None
+        if future is not None:
+            # A worker is on it already
+            self.waited += 1
+            return future.result()
+        return self.load(index)
+
+    def decode(self, index):
+        if isinstance(self.source, CompressedFrames):
+            frame = self.source.decode(index)
+        else:
+            frame = np.array(self.source[index], dtype=np.float32)
+        frame.setflags(write=False)
+        return frame
+
+    def load(self, index):
+        frame = self.decode(index)
+        self.cache.put(index, frame)
+        return frame
+
+    def prefetch_task(self, index):
+        try:
+            frame = self.cache.peek(index)
+            if frame is None:
+                frame = self.load(index)
+                self.prefetched += 1
+            return frame
+        finally:
+            with self.pending_lock:
+                self.pending.pop(index, None)
+
+    # Queue the frames around a new playhead position.
+    # direction is 1 when playing forwards and -1 when scrubbing backwards, rate is in frames per second.
+    def prefetch_around(self, index, direction = 1, rate = 0.0):
+        self.playhead = index
+        self.depth = self.adapt_depth(rate)
+        step = -1 if direction < 0 else 1
+        wanted = [i for i in range(index + step, index + step * (self.depth + 1), step) if 0 <= i < len(self.source)]
+        self.window = set(wanted)
+
+        with self.pending_lock:
+            # Frames that left the window are not worth decoding any more
+            for stale in [i for i in self.pending if i not in self.window]:
+                if self.pending[stale].cancel():
+                    del self.pending[stale]
+            for i in wanted:
+                if i not in self.pending and not self.cache.contains(i):
+                    self.pending[i] = self.pool.submit(self.prefetch_task, i)
+
+    # Frames to keep ahead: the frames played during the lookahead time, at least min_depth
+    # and no more than half of what the byte budget holds
+    def adapt_depth(self, rate):
+        frame_bytes = max(self.frame_nbytes(), 1)
+        budget_depth = max(int(self.cache.byte_budget // frame_bytes // 2), 1)
+        depth = max(int(math.ceil(rate * self.lookahead)), self.min_depth)
+        return min(depth, budget_depth)
+
+    # Playback needed a frame that was not decoded in time, look further ahead
+    def report_stall(self):
+        self.lookahead = min(self.lookahead * 1.5, 4.0)
+
+    def frame_nbytes(self):
+        return self.source.vertex_count * 3 * 4 if isinstance(self.source, CompressedFrames) else self.source[0].nbytes
+
+    def set_byte_budget(self, byte_budget):
+        self.cache.set_byte_budget(byte_budget)
+
+    def shutdown(self):
+        with self.pending_lock:
+            for future in self.pending.values():
+                future.cancel()
+            self.pending.clear()
+        self.pool.shutdown(wait=False)
+        self.cache.clear()
+
+    def stats_string(self):
+        cache = self.cache
+        lookups = max(cache.hits + cache.misses, 1)
+        return "Frame cache: {} hits, {} misses ({:.1f}% hits), {} evictions, {} frames / {:.1f} of {:.1f} MB, {} prefetched, {} waited, depth {}, lookahead {:.2f} s, {} workers".format(
+            cache.hits, cache.misses, cache.hits * 100.0 / lookups, cache.evictions, len(cache.frames), cache.nbytes / (1024.0 * 1024.0),
+            cache.byte_budget / (1024.0 * 1024.0), self.prefetched, self.waited, self.depth, self.lookahead, self.worker_count)
@@ -0,0 +1,106 @@
+"""
+This file contains the FrameProfiler class, which keeps rolling histograms of per-stage frame timings.
+
+Usage in a render function:
+    t = profiler.start()
+    ... stage work ...
+    profiler.stop("stage", t)
+Both calls return immediately while the profiler is disabled.
+"""
+
+import time
+import numpy as np
+from instances import Instances
+
+class FrameProfiler:
+    def __init__(self, history = 1024):
+        self.enabled = False
+        self.overlay_enabled = False
+        self.history = history
+
+        # stage name -> ring buffer of durations in seconds, and the number of samples written
+        self.samples = {}
+        self.sample_counts = {}
+        # Ring buffer of frame end timestamps for the FPS
+        self.frame_times = np.zeros(history, dtype=np.float64)
+        self.frame_count = 0
+
+        # Counters that are reported next to the timings, e.g. drawn triangles
+        self.counters = {}
+
+        self.overlay_lines = []
+        self.overlay_update_time = 0.0
+
+    def start(self):
+        if not self.enabled:
+            return 0.0
+        return time.perf_counter()
+
+    def stop(self, stage, start):
+        if not self.enabled:
+            return
+        duration = time.perf_counter() - start
+        samples = self.samples.get(stage)
+        if samples is None:
+            samples = self.samples[stage] = np.zeros(self.history, dtype=np.float64)
+            self.sample_counts[stage] = 0
+        count = self.sample_counts[stage]
+        samples[count % self.history] = duration
+        self.sample_counts[stage] = count + 1
+
+    def count(self, counter, value):
+        if not self.enabled:
+            return
+        self.counters[counter] = value
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+        self.frame_times[self.frame_count % self.history] = time.perf_counter()
+        self.frame_count += 1
+
+    def reset(self):
+        self.samples = {}
+        self.sample_counts = {}
+        self.frame_times[:] = 0.0
+        self.frame_count = 0
+        self.counters = {}
+
+    # Returns (p50, p95, p99) of the stage in seconds, or None without samples
+    def percentiles(self, stage):
+        count = min(self.sample_counts.get(stage, 0), self.history)
+        if count == 0:
+            return None
+        return tuple(np.percentile(self.samples[stage][:count], [50, 95, 99]))
+
+    def fps(self):
+        count = min(self.frame_count, self.history)
+        if count < 2:
+            return 0.0
+        times = np.sort(self.frame_times[:count])
+        return (count - 1) / max(times[-1] - times[0], 1e-9)
+
+    def report_lines(self):
+        lines = ["FPS: {:.1f} over the last {} frames".format(self.fps(), min(self.frame_count, self.history))]
+        for stage in self.samples:
+            p50, p95, p99 = self.percentiles(stage)
+            lines.append("{:<16} p50 {:7.3f} ms  p95 {:7.3f} ms  p99 {:7.3f} ms".format(stage, p50 * 1000.0, p95 * 1000.0, p99 * 1000.0))
+        for counter, value in self.counters.items():
+            lines.append("{:<16} {}".format(counter, value))
+        return lines
+
+    # Lines for the on-screen overlay, recomputed at most twice a second
+    def get_overlay_lines(self):
+        now = time.perf_counter()
+        if now - self.overlay_update_time > 0.5:
+            self.overlay_lines = self.report_lines()
+            self.overlay_update_time = now
+        return self.overlay_lines
+
+# Used while no profiler is installed, e.g. in headless runs
+_disabled_profiler = FrameProfiler(history=1)
+
+def get_profiler():
+    if Instances.frame_profiler_instance is not None:
+        return Instances.frame_profiler_instance
+    return _disabled_profiler
@@ -0,0 +1,61 @@
+"""
+This file contains the FrameSlot class, a triple buffer handing vertex positions from producer threads to the renderer.
+
+Producers copy a new frame into the back buffer and publish it by swapping it with the pending buffer.
+The render thread swaps the pending buffer with the front buffer at the start of a frame, and reads only the
+front buffer. The lock is held for the index swaps only, never while positions are copied, and the three
+buffers are allocated once per vertex count.
+"""
+
+import threading
+import numpy as np
+
+class FrameSlot:
+    def __init__(self, positions):
+        # The front buffer starts as the given positions
+        self.buffers = [positions, np.empty_like(positions), np.empty_like(positions)]
+        self.front = 0
+        self.pending = 1
+        self.back = 2
+        # True when the pending buffer holds a frame the renderer has not taken yet
+        self.fresh = False
+
+        self.swap_lock = threading.Lock()
+        # Serializes producers, the render thread never takes it
+        self.write_lock = threading.Lock()
+
+        self.frames_written = 0
+        self.frames_swapped = 0
+        # Frames published and replaced by a newer one before the renderer took them
+        self.frames_overwritten = 0
+
+    def shape(self):
+        return self.buffers[0].shape
+
+    # Producer side, any thread: copy the positions in and publish them
+    def write(self, positions):
+        with self.write_lock:
+            np.copyto(self.buffers[self.back], positions)
+            with self.swap_lock:
+                self.back, self.pending = self.pending, self.back
+                if self.fresh:
+                    self.frames_overwritten += 1
+                self.fresh = True
+            self.frames_written += 1
+
+    # Render thread: take the newest published frame. Returns the new front buffer, or None without a new frame.
+    def swap(self):
+        if not self.fresh:
+            return None
+        with self.swap_lock:
+            self.front, self.pending = self.pending, self.front
+            self.fresh = False
+        self.frames_swapped += 1
+        return self.buffers[self.front]
+
+    def front_buffer(self):
+        return self.buffers[self.front]
+
+    def stats_string(self):
+        return "Frame slot: {} frames written, {} shown, {} replaced before shown".format(
+            self.frames_written, self.frames_swapped, self.frames_overwritten)
@@ -0,0 +1,87 @@
+"""
+This file contains the MeshBuffers class, which owns the GPU buffers of a mesh.
+
+The element buffer is uploaded once per topology. Vertex positions are streamed into a ring of vertex buffers,
+and each buffer is orphaned before it is rewritten, so an upload never waits for the buffer that is being drawn.
+"""
+
+import OpenGL.GL
+
+class MeshBuffers:
+    def __init__(self, gl = None, vertex_buffer_count = 3):
+        # Any object providing the GL buffer functions and constants, e.g. a mock for headless runs
+        self.gl = gl if gl is not None else OpenGL.GL
+        self.vertex_buffer_count = vertex_buffer_count
+
+        self.vertex_buffers = []
+        self.current = 0
+        self.ebo = None
+        # Optional element buffer of vertex indices, for drawing the points of parts of the mesh
+        self.point_ebo = None
+        # Element buffer of the unique edges, for drawing the wireframe as lines
+        self.edge_ebo = None
+        self.edge_count = 0
+
+        # Versions of the data currently on the GPU, -1 if nothing was uploaded yet
+        self.topology_version = -1
+        self.positions_version = -1
+        self.edge_version = -1
+
+    # Upload the triangle indices, done once per topology
+    def upload_topology(self, indices, topology_version):
+        gl = self.gl
+        if self.ebo is None:
+            self.ebo = gl.glGenBuffers(1)
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+        gl.glBufferData(gl.GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, gl.GL_STATIC_DRAW)
+        self.topology_version = topology_version
+        # The edges belong to the old triangles
+        self.edge_version = -1
+
+    # Upload the vertex indices used to draw points, done once per topology like the triangle indices
+    def upload_point_indices(self, indices):
+        gl = self.gl
+        if self.point_ebo is None:
+            self.point_ebo = gl.glGenBuffers(1)
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.point_ebo)
+        gl.glBufferData(gl.GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, gl.GL_STATIC_DRAW)
+
+    # Upload the Ex2 vertex indices of the edges drawn as the wireframe
+    def upload_edge_indices(self, edges, edge_version):
+        gl = self.gl
+        if self.edge_ebo is None:
+            self.edge_ebo = gl.glGenBuffers(1)
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.edge_ebo)
+        gl.glBufferData(gl.GL_ELEMENT_ARRAY_BUFFER, edges.nbytes, edges, gl.GL_STATIC_DRAW)
+        self.edge_count = len(edges)
+        self.edge_version = edge_version
+
+    # Stream the positions into the next vertex buffer of the ring
+    def upload_positions(self, positions, positions_version):
+        gl = self.gl
+        if len(self.vertex_buffers) == 0:
+            buffers = gl.glGenBuffers(self.vertex_buffer_count)
+            self.vertex_buffers = list(buffers) if self.vertex_buffer_count > 1 else [buffers]
+            self.current = -1
+
+        self.current = (self.current + 1) % len(self.vertex_buffers)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vertex_buffers[self.current])
+        # Orphan the old storage, the driver hands out fresh memory instead of waiting for pending draws
+        gl.glBufferData(gl.GL_ARRAY_BUFFER, positions.nbytes, None, gl.GL_STREAM_DRAW)
+        gl.glBufferSubData(gl.GL_ARRAY_BUFFER, 0, positions.nbytes, positions)
+        self.positions_version = positions_version
+
+    # Bind the most recently uploaded vertex buffer and the element buffer for drawing
+    def bind(self):
+        gl = self.gl
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vertex_buffers[self.current])
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+
+    def bind_point_indices(self):
+        self.gl.glBindBuffer(self.gl.GL_ELEMENT_ARRAY_BUFFER, self.point_ebo)
+
+    def bind_edge_indices(self):
+        self.gl.glBindBuffer(self.gl.GL_ELEMENT_ARRAY_BUFFER, self.edge_ebo)
+
+    def is_uploaded(self):
+        return self.ebo is not None and len(self.vertex_buffers) > 0
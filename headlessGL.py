@@ -0,0 +1,117 @@
+"""
+This file contains GL stand-ins for running the viewer code without a display or GPU.
+"""
+
+import os
+import re
+import sys
+import types
+import numpy as np
+
+# Records the buffer calls MeshBuffers makes and counts the bytes uploaded per frame
+class MockGLBackend:
+    GL_ARRAY_BUFFER = 0x8892
+    GL_ELEMENT_ARRAY_BUFFER = 0x8893
+    GL_STATIC_DRAW = 0x88E4
+    GL_STREAM_DRAW = 0x88E0
+    GL_DYNAMIC_DRAW = 0x88E8
+
+    def __init__(self):
+        self.next_buffer = 1
+        self.bound = {}
+        # buffer id -> size of its storage in bytes
+        self.buffer_sizes = {}
+        self.orphan_count = 0
+
+        # bytes uploaded per target in the current frame, and the totals of finished frames
+        self.frame_bytes = {self.GL_ARRAY_BUFFER: 0, self.GL_ELEMENT_ARRAY_BUFFER: 0}
+        self.bytes_per_frame = []
+
+    def glGenBuffers(self, count):
+        ids = list(range(self.next_buffer, self.next_buffer + count))
+        self.next_buffer += count
+        for i in ids:
+            self.buffer_sizes[i] = 0
+        return ids[0] if count == 1 else np.array(ids, dtype=np.uint32)
+
+    def glDeleteBuffers(self, count, buffers):
+        for i in np.atleast_1d(buffers)[:count]:
+            self.buffer_sizes.pop(int(i), None)
+
+    def glBindBuffer(self, target, buffer):
+        self.bound[target] = buffer
+
+    def glBufferData(self, target, size, data, usage):
+        self.buffer_sizes[self.bound[target]] = size
+        if data is None:
+            self.orphan_count += 1
+        else:
+            self.frame_bytes[target] += size
+
+    def glBufferSubData(self, target, offset, size, data):
+        if offset + size > self.buffer_sizes[self.bound[target]]:
+            raise ValueError("glBufferSubData out of the buffer's storage")
+        self.frame_bytes[target] += size
+
+    # Close the current frame and start counting the next one
+    def end_frame(self):
+        self.bytes_per_frame.append(dict(self.frame_bytes))
+        for target in self.frame_bytes:
+            self.frame_bytes[target] = 0
+
+# Identifiers the viewer uses from PyOpenGL, collected from its sources by install_stub_gl
+GL_NAME_PATTERN = re.compile(r"\b(?:glut|glu|gl)[A-Z]\w*|\b(?:GLUT|GLU|GL)_\w+")
+
+# Module standing in for OpenGL.GL, OpenGL.GLU or OpenGL.GLUT: constants are 0 and functions do nothing,
+# except the buffer functions, which are forwarded to the MockGLBackend, and a few queries
+class StubGLModule(types.ModuleType):
+    def __init__(self, name, backend, names):
+        super().__init__(name)
+        self.__all__ = names
+        self._backend = backend
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        if hasattr(self._backend, name):
+            return getattr(self._backend, name)
+        if name in STUB_QUERIES:
+            return STUB_QUERIES[name]
+        if name[0].isupper():
+            return 0
+        return _no_op
+
+def _no_op(*args, **kwargs):
+    return None
+
+STUB_QUERIES = {
+    "glGetFloatv": lambda name: np.identity(4, dtype=np.float32),
+    "glGetDoublev": lambda name: np.identity(4, dtype=np.float64),
+    "glGetIntegerv": lambda name: np.array([0, 0, 800, 600], dtype=np.int32),
+    "glutGet": lambda name: 0,
+}
+
+# Collect the GL identifiers used in the python files of a directory
+def collect_gl_names(directory):
+    names = set()
+    for filename in os.listdir(directory):
+        if filename.endswith(".py"):
+            with open(os.path.join(directory, filename), encoding="utf-8", errors="replace") as f:
+                names.update(GL_NAME_PATTERN.findall(f.read()))
+    return sorted(names)
+
+# Replace the OpenGL package with stubs so the viewer modules import without a display or GPU.
+# Has to run before any viewer module is imported. Returns the MockGLBackend recording the buffer calls.
+def install_stub_gl(backend = None):
+    if backend is None:
+        backend = MockGLBackend()
+    names = collect_gl_names(os.path.dirname(os.path.abspath(__file__)))
+
+    package = types.ModuleType("OpenGL")
+    package.__path__ = []
+    sys.modules["OpenGL"] = package
+    for submodule in ("GL", "GLU", "GLUT"):
+        module = StubGLModule("OpenGL." + submodule, backend, names)
+        setattr(package, submodule, module)
+        sys.modules["OpenGL." + submodule] = module
+    return backend
@@ -13,8 +13,14 @@ import json
 from instances import Instances
 import threading
 import vector3
+from renderScheduler import request_redisplay
+from animationFormat import is_binary_animation, load_binary_animation, convert_json_to_binary
+from streamingAnimationLoader import StreamingAnimationLoader
 
 class InputHandler:
+    # JSON animations are decoded on a background thread, the batch mode loads them before the next command instead
+    load_in_background = True
+
     def __init__(self, camera, width, height):
         self.window_width = width
         self.window_height = height
@@ -39,7 +45,7 @@ class InputHandler:
         elif key == b'\x1b':  # ESC key
             sys.exit()
 
-        glutPostRedisplay()
+        request_redisplay()
 
     def mouse(self, button, state, x, y):
         # convert y value
@@ -71,7 +77,7 @@ class InputHandler:
             self.camera.camera_angle[0] = max(min(self.camera.camera_angle[0] + dy * 0.5, 89), -89)  # pitch clamped
 
             self.last_mouse_x, self.last_mouse_y = x, y
-            glutPostRedisplay()
+            request_redisplay()
 
     def get_ray_from_mouse(self, x, y):
         modelview_matrix = glGetDoublev(GL_MODELVIEW_MATRIX)
@@ -110,11 +116,13 @@ class InputHandler:
                 Instances.particle_system_instance.highlight_vertex(index)
             elif cmd[1] == "triangle" or cmd[1] == "t":
                 Instances.particle_system_instance.highlight_triangle(index)
+            elif cmd[1] == "edge" or cmd[1] == "e":
+                Instances.particle_system_instance.highlight_edge(index)
             else:
                 Instances.terminalManager_instance.tprint("Invalid highlight type.")
                 return
             
-            glutPostRedisplay()
+            request_redisplay()
 
         if cmd[0] == "loadAnimation" or cmd[0] == "la":
             if len(cmd) < 2:
@@ -122,16 +130,38 @@ class InputHandler:
                 return
 
             path = cmd[1]
-            data = self.decode_animation_data(path)
+            if not is_binary_animation(path):
+                # JSON animations are decoded in the background, the first frame shows as soon as it is ready
+                if InputHandler.load_in_background:
+                    threading.Thread(target=self.stream_animation, args=[path]).start()
+                else:
+                    # Without a window nothing shows the error, the caller has to see it
+                    self.stream_animation(path, raise_errors=True)
+                return
+
+            data = load_binary_animation(path)
             # Get first set of vertices
             Instances.particle_system_instance.load_animation(data)
-            glutPostRedisplay()
+            request_redisplay()
         
+        # e.g.: convertAnimation animation.json animation.pmanim
+        if cmd[0] == "convertAnimation" or cmd[0] == "ca":
+            if len(cmd) < 3:
+                Instances.terminalManager_instance.tprint("Convert animation commands take in 2 arguments.")
+                return
+
+            data = convert_json_to_binary(cmd[1], cmd[2])
+            Instances.terminalManager_instance.tprint("Converted {} frames of {} vertices to {}".format(data.frame_count(), data.vertex_count(), cmd[2]))
+
         if cmd[0] == "animation":
             if len(cmd) < 2:
                 Instances.terminalManager_instance.tprint("No arguments provided!")
                 return
 
+            if Instances.particle_system_instance.animation_manager is None:
+                Instances.terminalManager_instance.tprint("No animation loaded.")
+                return
+
             if cmd[1] == "animate":
                 if len(cmd) != 5:
                     Instances.terminalManager_instance.tprint("Invalid number of arguments!")
@@ -140,11 +170,73 @@ class InputHandler:
                 start_index = int(cmd[2])
                 end_index = int(cmd[3])
                 dt = float(cmd[4])
-                threading.Thread(target=Instances.particle_system_instance.animation_manager.animate, args=[start_index, end_index, dt]).start()
+                Instances.particle_system_instance.animation_manager.animate(start_index, end_index, dt)
             
             elif cmd[1] == "pause":
                 Instances.particle_system_instance.animation_manager.pause()
 
+            # e.g.: animation speed 0.25
+            elif cmd[1] == "speed":
+                if len(cmd) != 3:
+                    Instances.terminalManager_instance.tprint("Invalid number of arguments!")
+                    return
+
+                Instances.particle_system_instance.animation_manager.set_speed(float(cmd[2]))
+
+            # e.g.: animation interpolate on
+            elif cmd[1] == "interpolate":
+                if len(cmd) != 3 or cmd[2] not in ("on", "off"):
+                    Instances.terminalManager_instance.tprint("Usage: animation interpolate on|off")
+                    return
+
+                Instances.particle_system_instance.animation_manager.set_interpolate(cmd[2] == "on")
+
+            elif cmd[1] == "stats":
+                Instances.terminalManager_instance.tprint(Instances.particle_system_instance.animation_manager.stats_string())
+
+            # e.g.: animation trajectory 3,17 0 500, animation trajectory export path.csv, animation trajectory draw
+            elif cmd[1] == "trajectory":
+                if len(cmd) < 3:
+                    Instances.terminalManager_instance.tprint("Usage: animation trajectory <vertex,...> [start end] | export <file.csv|file.npy> | draw | clear")
+                    return
+
+                animation_manager = Instances.particle_system_instance.animation_manager
+                if cmd[2] == "export" and len(cmd) == 4:
+                    animation_manager.export_trajectory(cmd[3])
+                elif cmd[2] == "draw":
+                    animation_manager.draw_trajectory(True)
+                elif cmd[2] == "clear":
+                    animation_manager.draw_trajectory(False)
+                else:
+                    vertex_ids = [int(i) for i in cmd[2].split(",")]
+                    start = int(cmd[3]) if len(cmd) > 3 else 0
+                    end = int(cmd[4]) if len(cmd) > 4 else None
+                    animation_manager.query_trajectory(vertex_ids, start, end)
+
+            # e.g.: animation cache, animation prefetch on, animation prefetch budget 512
+            elif cmd[1] == "cache":
+                Instances.terminalManager_instance.tprint(Instances.particle_system_instance.animation_manager.prefetch_stats_string())
+
+            elif cmd[1] == "prefetch":
+                animation_manager = Instances.particle_system_instance.animation_manager
+                if len(cmd) == 3 and cmd[2] in ("on", "off"):
+                    animation_manager.set_prefetch(cmd[2] == "on")
+                elif len(cmd) == 4 and cmd[2] == "budget":
+                    animation_manager.set_prefetch(True, int(float(cmd[3]) * 1024 * 1024))
+                else:
+                    Instances.terminalManager_instance.tprint("Usage: animation prefetch on|off|budget <MB>")
+                    return
+                Instances.terminalManager_instance.tprint(animation_manager.prefetch_stats_string())
+
+            # e.g.: animation compress 0.0001, animation compress 0.0001 60
+            elif cmd[1] == "compress":
+                if len(cmd) < 3 or len(cmd) > 4:
+                    Instances.terminalManager_instance.tprint("Usage: animation compress <error_bound> [keyframe_interval]")
+                    return
+
+                keyframe_interval = int(cmd[3]) if len(cmd) == 4 else 30
+                Instances.particle_system_instance.animation_manager.compress(float(cmd[2]), keyframe_interval)
+
             elif cmd[1] == "resume":
                 Instances.particle_system_instance.animation_manager.resume()
 
@@ -176,9 +268,178 @@ class InputHandler:
                 name = cmd[2]
                 Instances.particle_system_instance.animation_manager.goto(name)
 
-    
+
+        # Frame profiler commands
+        # e.g.: stats, stats on, stats off, stats reset, stats overlay
+        if cmd[0] == "stats":
+            profiler = Instances.frame_profiler_instance
+            if profiler is None:
+                # Headless runs, e.g. the command server without a window, have no render loop to profile
+                Instances.terminalManager_instance.tprint("Stats: no renderer")
+                return
+            if len(cmd) > 1:
+                if cmd[1] == "on":
+                    profiler.enabled = True
+                elif cmd[1] == "off":
+                    profiler.enabled = False
+                elif cmd[1] == "reset":
+                    profiler.reset()
+                elif cmd[1] == "overlay":
+                    profiler.enabled = True
+                    profiler.overlay_enabled = not profiler.overlay_enabled
+                else:
+                    Instances.terminalManager_instance.tprint("Invalid stats command.")
+                    return
+                request_redisplay()
+                return
+
+            if not profiler.enabled:
+                Instances.terminalManager_instance.tprint("Profiling is off, enable it with 'stats on'.")
+            else:
+                for line in profiler.report_lines():
+                    Instances.terminalManager_instance.tprint(line)
+            scheduler = Instances.render_scheduler_instance
+            Instances.terminalManager_instance.tprint(scheduler.stats_string() if scheduler is not None else "Render: no renderer")
+
+        # Terminal commands
+        # e.g.: terminal stats
+        if cmd[0] == "terminal":
+            Instances.terminalManager_instance.tprint(Instances.terminalManager_instance.stats_string())
+
+        # Render commands
+        # e.g.: render stats, render fps 30, render cull off
+        if cmd[0] == "render":
+            scheduler = Instances.render_scheduler_instance
+            particle_system = Instances.particle_system_instance
+            if len(cmd) > 1 and cmd[1] == "fps":
+                if len(cmd) != 3:
+                    Instances.terminalManager_instance.tprint("Invalid number of arguments!")
+                    return
+                if scheduler is None:
+                    Instances.terminalManager_instance.tprint("Render: no renderer")
+                    return
+                scheduler.set_fps_cap(float(cmd[2]))
+            elif len(cmd) > 2 and cmd[1] == "cull":
+                particle_system.culling_enabled = cmd[2] == "on"
+                request_redisplay()
+            # Headless runs, e.g. batch scripts or the command server, have no render loop
+            Instances.terminalManager_instance.tprint(scheduler.stats_string() if scheduler is not None else "Render: no renderer")
+            Instances.terminalManager_instance.tprint(particle_system.frame_slot.stats_string())
+            if particle_system.clusters is not None:
+                Instances.terminalManager_instance.tprint(particle_system.clusters.stats_string() + ("" if particle_system.culling_enabled else " (culling off)"))
+
+        # BVH commands
+        # e.g.: bvh, bvh rebuild, bvh refit
+        if cmd[0] == "bvh":
+            particle_system = Instances.particle_system_instance
+            if len(cmd) > 1 and cmd[1] == "rebuild":
+                particle_system.bvh = None
+            elif len(cmd) > 1 and cmd[1] == "refit":
+                particle_system.bvh_needs_refit = True
+            if particle_system.bvh is None:
+                # Building prints the stats
+                particle_system.get_bvh()
+            else:
+                Instances.terminalManager_instance.tprint(particle_system.get_bvh().stats_string())
+
+        # Level of detail commands
+        # e.g.: lod, lod build, lod on, lod off, lod error 2
+        if cmd[0] == "lod":
+            particle_system = Instances.particle_system_instance
+            if len(cmd) > 1 and cmd[1] == "build":
+                if InputHandler.load_in_background:
+                    Instances.terminalManager_instance.tprint("Building the LOD chain in the background.")
+                # Prints the levels when done
+                particle_system.build_lod(InputHandler.load_in_background)
+                return
+            if len(cmd) > 1 and cmd[1] in ("on", "off"):
+                particle_system.lod_enabled = cmd[1] == "on"
+            elif len(cmd) > 2 and cmd[1] == "error":
+                particle_system.lod_pixel_error = float(cmd[2])
+            request_redisplay()
+            if particle_system.lod_chain is None:
+                Instances.terminalManager_instance.tprint("No LOD chain{}, build it with: lod build".format(" yet" if particle_system.lod_building else ""))
+                return
+            Instances.terminalManager_instance.tprint(particle_system.lod_chain.stats_string())
+            Instances.terminalManager_instance.tprint("LOD {}, error {} px, drawing {}".format(
+                "on" if particle_system.lod_enabled else "off", particle_system.lod_pixel_error,
+                "level {}".format(particle_system.lod_level) if particle_system.lod_level >= 0 else "full resolution"))
+
+        # Wireframe edge commands
+        # e.g.: edges, edges all, edges features, edges features 45, edges pick on
+        if cmd[0] == "edges":
+            particle_system = Instances.particle_system_instance
+            if len(cmd) > 1 and cmd[1] == "all":
+                particle_system.set_edge_mode("all")
+            elif len(cmd) > 1 and cmd[1] == "features":
+                particle_system.set_edge_mode("features", float(cmd[2]) if len(cmd) > 2 else None)
+            elif len(cmd) > 2 and cmd[1] == "pick":
+                particle_system.select_edge_enabled = cmd[2] == "on"
+                if particle_system.select_edge_enabled:
+                    particle_system.select_particle_enabled = False
+                    particle_system.select_triangle_enabled = False
+            edges = particle_system.get_edges()
+            if edges is None:
+                Instances.terminalManager_instance.tprint("The edges are being built in the background.")
+                return
+            particle_system.edge_mask(edges, particle_system.positions, particle_system.indices)
+            Instances.terminalManager_instance.tprint(edges.stats_string())
+            Instances.terminalManager_instance.tprint("Drawing {}, edge picking {}".format(
+                "all edges" if particle_system.edge_mode == "all" else "feature edges sharper than {:g} degrees".format(particle_system.feature_angle),
+                "on" if particle_system.select_edge_enabled else "off"))
+
     def redisplay(self):
-        glutPostRedisplay()
+        request_redisplay()
+
+    def stream_animation(self, file_path, raise_errors = False):
+        """
+        Decodes a JSON animation frame by frame and loads it into the particle system while it is decoded.
+
+        Parameters:
+        file_path (str): The path to the JSON file.
+        raise_errors (bool): Raise a missing or broken file after printing it, instead of only printing it.
+        """
+        particle_system = Instances.particle_system_instance
+        # The manager this stream created, a later load replaces it and the stream must not touch the new one
+        stream = {"manager": None}
+
+        def current_manager():
+            manager = stream["manager"]
+            return manager if manager is not None and particle_system.animation_manager is manager else None
+
+        def on_first_frame(data):
+            particle_system.load_animation(data)
+            stream["manager"] = particle_system.animation_manager
+            stream["manager"].loading = True
+
+        def on_frames(frames, frame_types):
+            manager = current_manager()
+            if manager is not None:
+                manager.animation_frames = frames
+
+        def on_progress(fraction, frame_count):
+            Instances.terminalManager_instance.tprint("[Animation] Loading {}: {:.0f}% ({} frames)".format(file_path, fraction * 100.0, frame_count), "loading")
+
+        try:
+            loader = StreamingAnimationLoader(file_path)
+            data = loader.load(on_first_frame, on_frames, on_progress)
+            manager = current_manager()
+            if manager is not None:
+                manager.animation_frames = data.frames
+                manager.marks.update(data.marks)
+                Instances.terminalManager_instance.tprint("[Animation] " + loader.stats_string())
+        except FileNotFoundError:
+            Instances.terminalManager_instance.tprint(f"The file {file_path} was not found.")
+            if raise_errors:
+                raise
+        except (ValueError, KeyError, TypeError) as e:
+            Instances.terminalManager_instance.tprint(f"An error occurred while decoding the animation: {e}")
+            if raise_errors:
+                raise
+        finally:
+            # Also after an error, else compress and prefetch refuse the frames that did load forever
+            if stream["manager"] is not None:
+                stream["manager"].loading = False
 
     def decode_animation_data(self, file_path):
         """
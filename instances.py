@@ -3,4 +3,8 @@ class Instances:
     input_handler_instance = None
     particle_system_instance = None
     debuggerUI_instance = None
-    terminalManager_instance = None
\ No newline at end of file
+    terminalManager_instance = None
+    render_scheduler_instance = None
+    frame_profiler_instance = None
+    command_queue_instance = None
+    command_server_instance = None
\ No newline at end of file
@@ -0,0 +1,111 @@
+"""
+This file contains the binary mesh cache written next to loaded OBJ files.
+
+Layout: a 128 byte header followed by the raw float32 positions (Nx3) and the raw uint32 triangle indices (Mx3).
+The header records the size, modification time and hash of the source file so stale caches can be detected.
+"""
+
+import hashlib
+import os
+import struct
+import numpy as np
+
+MAGIC = b"PMVMESH\0"
+VERSION = 2
+HEADER_SIZE = 128
+# magic, version, source size, source mtime in ns, vertex count, triangle count, blake2b digest of the source
+HEADER_FORMAT = "<8sIQqQQ32s"
+
+CACHE_SUFFIX = ".meshcache"
+
+def cache_path_for(source_path):
+    return source_path + CACHE_SUFFIX
+
+def new_hasher():
+    return hashlib.blake2b(digest_size=32)
+
+def file_digest(path, chunk_size = 16 * 1024 * 1024):
+    hasher = new_hasher()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            hasher.update(chunk)
+    return hasher.digest()
+
+class MeshCacheHeader:
+    def __init__(self, source_size, source_mtime_ns, vertex_count, triangle_count, digest):
+        self.source_size = source_size
+        self.source_mtime_ns = source_mtime_ns
+        self.vertex_count = vertex_count
+        self.triangle_count = triangle_count
+        self.digest = digest
+
+    def pack(self):
+        header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, self.source_size, self.source_mtime_ns, self.vertex_count, self.triangle_count, self.digest)
+        return header.ljust(HEADER_SIZE, b"\0")
+
+    def positions_offset(self):
+        return HEADER_SIZE
+
+    def indices_offset(self):
+        return HEADER_SIZE + self.vertex_count * 3 * 4
+
+    def file_size(self):
+        return self.indices_offset() + self.triangle_count * 3 * 4
+
+    # Returns the header of the cache file, or None if it is missing or not a cache of this version
+    @staticmethod
+    def read(path):
+        try:
+            with open(path, "rb") as f:
+                data = f.read(HEADER_SIZE)
+        except OSError:
+            return None
+        if len(data) < HEADER_SIZE:
+            return None
+
+        magic, version, source_size, source_mtime_ns, vertex_count, triangle_count, digest = struct.unpack_from(HEADER_FORMAT, data)
+        if magic != MAGIC or version != VERSION:
+            return None
+        header = MeshCacheHeader(source_size, source_mtime_ns, vertex_count, triangle_count, digest)
+        if os.path.getsize(path) != header.file_size():
+            return None
+        return header
+
+# Returns (vertices, indices) memory-mapped from the cache of source_path, or None if there is no valid cache
+def load_mesh_cache(source_path):
+    cache_path = cache_path_for(source_path)
+    header = MeshCacheHeader.read(cache_path)
+    if header is None:
+        return None
+
+    stat = os.stat(source_path)
+    if header.source_size != stat.st_size:
+        return None
+
+    if header.source_mtime_ns != stat.st_mtime_ns:
+        # Touched or copied, only trust the cache if the content is unchanged
+        if file_digest(source_path) != header.digest:
+            return None
+        header.source_mtime_ns = stat.st_mtime_ns
+        try:
+            with open(cache_path, "r+b") as f:
+                f.write(header.pack())
+        except OSError:
+            pass
+
+    # Positions are mapped copy-on-write since animations update them in place
+    vertices = np.memmap(cache_path, dtype=np.float32, mode="c", offset=header.positions_offset(), shape=(header.vertex_count, 3)) if header.vertex_count > 0 else np.empty((0, 3), dtype=np.float32)
+    indices = np.memmap(cache_path, dtype=np.uint32, mode="r", offset=header.indices_offset(), shape=(header.triangle_count, 3)) if header.triangle_count > 0 else np.empty((0, 3), dtype=np.uint32)
+    return vertices, indices
+
+# Write the cache of source_path. The file is written under a temporary name and moved in place.
+def write_mesh_cache(source_path, vertices, indices, source_size, source_mtime_ns, digest):
+    cache_path = cache_path_for(source_path)
+    header = MeshCacheHeader(source_size, source_mtime_ns, len(vertices), len(indices), digest)
+
+    temp_path = cache_path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(header.pack())
+        np.ascontiguousarray(vertices, dtype=np.float32).tofile(f)
+        np.ascontiguousarray(indices, dtype=np.uint32).tofile(f)
+    os.replace(temp_path, cache_path)
@@ -0,0 +1,96 @@
+"""
+This file contains the MeshClusters class, which splits a mesh into spatially coherent clusters of triangles so the
+ones outside the view frustum are not drawn.
+
+The triangles are sorted along a Morton curve, like the BVH does, and cut into clusters of cluster_size triangles.
+The element buffer is uploaded in this order, so every cluster is a contiguous range and neighbouring visible
+clusters are drawn with one call. Each cluster also lists its vertices, for drawing the vertex points of the visible
+clusters only. The cluster bounds are computed from these vertex lists and refit when the positions change.
+"""
+
+import time
+import numpy as np
+from bvh import morton_codes
+
+class MeshClusters:
+    def __init__(self, positions, indices, cluster_size = 4096):
+        self.cluster_size = cluster_size
+        vertex_count = len(positions)
+        triangle_count = len(indices)
+
+        centroids = (positions[indices[:, 0]].astype(np.float64) + positions[indices[:, 1]] + positions[indices[:, 2]]) / 3.0
+        # Original triangle id of every triangle in cluster order
+        self.triangle_order = np.argsort(morton_codes(centroids), kind="stable")
+        self.indices = np.ascontiguousarray(indices[self.triangle_order], dtype=np.uint32)
+        self.triangle_start = np.arange(0, triangle_count, cluster_size, dtype=np.int64)
+        self.triangle_count = np.diff(np.append(self.triangle_start, triangle_count))
+
+        # Vertices of every cluster, once per cluster, concatenated in cluster order
+        cluster_of_corner = np.repeat(np.arange(len(self.triangle_start), dtype=np.int64), self.triangle_count * 3)
+        keys = np.unique(cluster_of_corner * vertex_count + self.indices.reshape(-1))
+        self.vertex_indices = (keys % vertex_count).astype(np.uint32)
+        self.vertex_start = np.searchsorted(keys, np.arange(len(self.triangle_start), dtype=np.int64) * vertex_count)
+        self.vertex_count = np.diff(np.append(self.vertex_start, len(keys)))
+
+        self.bounds_min = None
+        self.bounds_max = None
+        self.positions_version = None
+        self.refit_time = 0.0
+        self.refit_count = 0
+
+        # Results of the last cull
+        self.visible = np.ones(len(self.triangle_start), dtype=bool)
+        self.drawn_triangles = triangle_count
+        self.culled_triangles = 0
+        self.draw_calls = 1
+
+    def cluster_count(self):
+        return len(self.triangle_start)
+
+    # Recompute the cluster bounds if the positions changed since the last refit
+    def refit(self, positions, positions_version):
+        if positions_version == self.positions_version:
+            return
+        start_time = time.perf_counter()
+        points = positions[self.vertex_indices]
+        self.bounds_min = np.minimum.reduceat(points, self.vertex_start, axis=0)
+        self.bounds_max = np.maximum.reduceat(points, self.vertex_start, axis=0)
+        self.positions_version = positions_version
+        self.refit_time = time.perf_counter() - start_time
+        self.refit_count += 1
+
+    # Mark the clusters that intersect the frustum of the camera matrices (glGetFloatv layout) as visible
+    def cull(self, model_view, projection):
+        planes = frustum_planes(model_view, projection)
+        normals, distances = planes[:, :3], planes[:, 3]
+        # For every plane the box corner furthest along its normal, the box is outside if that corner is behind it
+        positive = normals[None, :, :] >= 0.0
+        corners = np.where(positive, self.bounds_max[:, None, :], self.bounds_min[:, None, :])
+        inside = np.einsum("cpk,pk->cp", corners, normals) + distances >= 0.0
+        self.visible = inside.all(axis=1)
+        self.drawn_triangles = int(self.triangle_count[self.visible].sum())
+        self.culled_triangles = len(self.indices) - self.drawn_triangles
+        return self.visible
+
+    # Runs of neighbouring visible clusters as (first triangle, triangle count, first point, point count) ranges
+    def visible_ranges(self):
+        edges = np.diff(np.concatenate([[0], self.visible.astype(np.int8), [0]]))
+        first = np.nonzero(edges == 1)[0]
+        last = np.nonzero(edges == -1)[0] - 1
+        triangle_first = self.triangle_start[first]
+        triangle_counts = self.triangle_start[last] + self.triangle_count[last] - triangle_first
+        point_first = self.vertex_start[first]
+        point_counts = self.vertex_start[last] + self.vertex_count[last] - point_first
+        self.draw_calls = len(first)
+        return zip(triangle_first.tolist(), triangle_counts.tolist(), point_first.tolist(), point_counts.tolist())
+
+    def stats_string(self):
+        return "Clusters: {} of up to {} triangles, last frame drew {} of them: {} triangles drawn, {} culled, {} draw calls, refit {:.2f} ms".format(
+            self.cluster_count(), self.cluster_size, int(self.visible.sum()), self.drawn_triangles, self.culled_triangles, self.draw_calls, self.refit_time * 1000.0)
+
+# The six planes (a, b, c, d) of the view frustum, inside where a x + b y + c z + d >= 0.
+# The matrices are in glGetFloatv layout, so the columns of their product are the rows of the clip matrix.
+def frustum_planes(model_view, projection):
+    m = (model_view.astype(np.float64) @ projection.astype(np.float64)).T
+    planes = np.array([m[3] + m[0], m[3] - m[0], m[3] + m[1], m[3] - m[1], m[3] + m[2], m[3] - m[2]])
+    return planes / np.linalg.norm(planes[:, :3], axis=1)[:, None]
@@ -0,0 +1,127 @@
+"""
+This file contains the MeshEdges class, which lists every edge of a triangle mesh once, for drawing the wireframe
+as lines, picking edges and finding the feature edges.
+
+The three edges of every triangle are keyed by their sorted vertex pair and sorted once, so an edge shared by two
+triangles is drawn once instead of once per triangle. The triangles next to every edge are kept for the dihedral
+angle of the feature edges, and the edges of every triangle for picking.
+"""
+
+import time
+import numpy as np
+
+class MeshEdges:
+    def __init__(self, indices, vertex_count):
+        start_time = time.perf_counter()
+        indices = np.asarray(indices).reshape(-1, 3)
+        self.triangle_count = len(indices)
+
+        keys = edge_keys(indices, vertex_count)
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        first = first_of_runs(keys)
+        starts = np.nonzero(first)[0]
+
+        # Ex2 vertex indices of every edge, the smaller index first
+        self.edges = np.stack([keys[starts] // vertex_count, keys[starts] % vertex_count], axis=1).astype(np.uint32)
+        # Number of triangles of every edge: 1 on the boundary, more than 2 where the mesh is not manifold
+        self.edge_triangle_count = np.diff(np.append(starts, len(keys)))
+        # First two triangles of every edge, -1 on the boundary
+        triangle_of_key = order // 3
+        self.edge_triangles = np.full((len(starts), 2), -1, dtype=np.int64)
+        self.edge_triangles[:, 0] = triangle_of_key[starts]
+        shared = self.edge_triangle_count >= 2
+        self.edge_triangles[shared, 1] = triangle_of_key[starts[shared] + 1]
+        # Mx3 edge ids of every triangle
+        self.triangle_edges = np.empty(len(keys), dtype=np.int64)
+        self.triangle_edges[order] = np.cumsum(first) - 1
+        self.triangle_edges = self.triangle_edges.reshape(-1, 3)
+
+        # Mask of the last feature_mask call
+        self.features = None
+        self.feature_angle = None
+        self.build_time = time.perf_counter() - start_time
+
+    def edge_count(self):
+        return len(self.edges)
+
+    # Boundary and non-manifold edges, and the edges whose triangles meet at more than angle degrees
+    def feature_mask(self, positions, indices, angle = 30.0):
+        indices = np.asarray(indices).reshape(-1, 3)
+        a = positions[indices[:, 0]]
+        normals = np.cross(positions[indices[:, 1]] - a, positions[indices[:, 2]] - a)
+        lengths = np.linalg.norm(normals, axis=1)
+        degenerate = lengths == 0.0
+        normals /= np.where(degenerate, 1.0, lengths)[:, None]
+
+        t0 = self.edge_triangles[:, 0]
+        t1 = self.edge_triangles[:, 1]
+        open_edges = self.edge_triangle_count != 2
+        t1 = np.where(open_edges, t0, t1)
+        cosine = np.einsum("ij,ij->i", normals[t0], normals[t1])
+        # The crease of a degenerate triangle is undefined, do not report it
+        cosine[degenerate[t0] | degenerate[t1]] = 1.0
+        self.features = open_edges | (cosine < np.cos(np.radians(angle)))
+        self.feature_angle = angle
+        return self.features
+
+    # Edge indices to upload for drawing, all edges or the ones in mask. With clusters the edges are sorted by the
+    # cluster of their first triangle, and the start of the edges of every cluster is returned too, else None.
+    def draw_list(self, mask = None, clusters = None):
+        ids = np.arange(len(self.edges)) if mask is None else np.nonzero(mask)[0]
+        if clusters is None:
+            return np.ascontiguousarray(self.edges[ids]), None
+        # A cluster contains all vertices of its triangles, so the edge is inside the bounds of the cluster
+        cluster_of_triangle = np.empty(self.triangle_count, dtype=np.int64)
+        cluster_of_triangle[clusters.triangle_order] = np.arange(self.triangle_count) // clusters.cluster_size
+        edge_cluster = cluster_of_triangle[self.edge_triangles[ids, 0]]
+        order = np.argsort(edge_cluster, kind="stable")
+        cluster_start = np.searchsorted(edge_cluster[order], np.arange(clusters.cluster_count() + 1))
+        return np.ascontiguousarray(self.edges[ids[order]]), cluster_start
+
+    # The edge of the triangle closest to a point, e.g. the point where a picking ray hits the triangle
+    def nearest_edge(self, triangle, point, positions):
+        edge_ids = self.triangle_edges[triangle]
+        ends = positions[self.edges[edge_ids]].astype(np.float64)
+        a, d = ends[:, 0], ends[:, 1] - ends[:, 0]
+        length2 = np.einsum("ij,ij->i", d, d)
+        t = np.clip(np.einsum("ij,ij->i", np.asarray(point, dtype=np.float64) - a, d) / np.where(length2 > 0.0, length2, 1.0), 0.0, 1.0)
+        distances = np.linalg.norm(a + t[:, None] * d - point, axis=1)
+        return int(edge_ids[np.argmin(distances)])
+
+    def stats_string(self):
+        features = ""
+        if self.features is not None:
+            features = ", {} feature edges at {:g} degrees".format(int(self.features.sum()), self.feature_angle)
+        return "Edges: {} unique of {} triangle edges, {} boundary, {} non-manifold{}, build {:.2f} ms".format(
+            len(self.edges), self.triangle_count * 3, int((self.edge_triangle_count == 1).sum()),
+            int((self.edge_triangle_count > 2).sum()), features, self.build_time * 1000.0)
+
+# Key of every triangle edge, from its smaller to its larger vertex index.
+# Edge k of a triangle goes from its corner k to corner k + 1.
+def edge_keys(indices, vertex_count):
+    ends = indices[:, [1, 2, 0]]
+    low = np.minimum(indices, ends).astype(np.int64).reshape(-1)
+    high = np.maximum(indices, ends).astype(np.int64).reshape(-1)
+    return low * vertex_count + high
+
+# Mask of the first element of every run of equal sorted keys
+def first_of_runs(keys):
+    first = np.ones(len(keys), dtype=bool)
+    first[1:] = keys[1:] != keys[:-1]
+    return first
+
+# Ex2 vertex indices of every edge once, in the order of MeshEdges.edges, when the triangles next to them are not needed
+def unique_edges(indices, vertex_count):
+    keys = np.sort(edge_keys(np.asarray(indices).reshape(-1, 3), vertex_count))
+    keys = keys[first_of_runs(keys)]
+    return np.stack([keys // vertex_count, keys % vertex_count], axis=1).astype(np.uint32)
+
+# Draw ranges (first edge, edge count) of the edges of the triangle ranges of MeshClusters.visible_ranges,
+# cluster_start as returned by MeshEdges.draw_list
+def edge_ranges(ranges, cluster_start, cluster_size):
+    for first_triangle, triangle_count, first_point, point_count in ranges:
+        first = cluster_start[first_triangle // cluster_size]
+        end = cluster_start[(first_triangle + triangle_count - 1) // cluster_size + 1]
+        if end > first:
+            yield int(first), int(end - first)
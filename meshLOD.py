@@ -0,0 +1,269 @@
+"""
+This file contains the LODChain class, which holds simplified versions of a mesh for drawing it when it is small on screen.
+
+Each level is built by quadric-based vertex clustering: the vertices are grouped by a uniform grid, every cluster
+becomes one vertex placed where the sum of the plane quadrics of its triangles is smallest, and triangles that
+collapse are dropped. Each level halves the grid resolution of the previous one. All levels are built from the full
+resolution mesh, so every level keeps the map from full resolution vertices to its clusters and can follow animated
+positions by moving every cluster with the mean displacement of its vertices.
+
+The chain can be cached next to the source mesh, validated like the mesh cache by size, modification time and hash.
+
+Build the cache offline with: python meshLOD.py mesh.obj
+"""
+
+import math
+import os
+import sys
+import time
+import numpy as np
+import meshCache
+
+CACHE_SUFFIX = ".lod.npz"
+VERSION = 2
+
+class LODLevel:
+    def __init__(self, positions, indices, vertex_map, rest_centroids, cell_size):
+        # Kx3 float32 cluster positions and Tx3 uint32 triangles of the simplified mesh
+        self.positions = positions
+        self.indices = indices
+        # Cluster of every full resolution vertex
+        self.vertex_map = vertex_map
+        # Mean position of the vertices of every cluster in the mesh the level was built from
+        self.rest_centroids = rest_centroids
+        # Grid cell size, a vertex moved at most about the diagonal of a cell
+        self.cell_size = cell_size
+        self.cluster_sizes = np.bincount(vertex_map, minlength=len(positions)).astype(np.float64)
+
+        self.current_positions = positions
+        self.current_version = None
+
+    # The level positions for the full resolution positions, moved along when they are animated
+    def positions_for(self, full_positions, positions_version, rest_version):
+        if positions_version == rest_version:
+            return self.positions
+        if positions_version != self.current_version:
+            moved = np.empty((len(self.positions), 3), dtype=np.float32)
+            for axis in range(3):
+                moved[:, axis] = np.bincount(self.vertex_map, weights=full_positions[:, axis], minlength=len(self.positions)) / self.cluster_sizes
+            moved += self.positions - self.rest_centroids
+            self.current_positions = moved
+            self.current_version = positions_version
+        return self.current_positions
+
+class LODChain:
+    def __init__(self, levels, center, radius, vertex_count, triangle_count):
+        # Coarser with every level, level i has the grid cell size levels[i].cell_size
+        self.levels = levels
+        # Bounding sphere of the full resolution mesh
+        self.center = center
+        self.radius = radius
+        self.vertex_count = vertex_count
+        self.triangle_count = triangle_count
+        self.build_time = 0.0
+        # positions_version of the particle system the chain was built from
+        self.rest_version = None
+
+    # Build the chain down to about min_triangles triangles. Levels that do not drop at least a quarter of the
+    # triangles of the previous level are left out.
+    @staticmethod
+    def build(positions, indices, min_triangles = 2000):
+        start_time = time.perf_counter()
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+        low, high = positions.min(axis=0), positions.max(axis=0)
+        center = (low + high) * 0.5
+        radius = float(np.linalg.norm(high - low) * 0.5)
+        extent = max(float((high - low).max()), 1e-9)
+
+        quadrics = vertex_quadrics(positions, indices)
+        levels = []
+        triangle_count = len(indices)
+        # A surface in a grid of resolution r has about r * r triangles, start just below the full mesh
+        resolution = 2 ** int(math.log2(max(math.sqrt(len(indices)), 4.0)))
+        while resolution >= 4 and triangle_count > min_triangles:
+            level = simplify(positions, indices, quadrics, low, extent / resolution)
+            resolution //= 2
+            if len(level.indices) > triangle_count * 0.75:
+                continue
+            levels.append(level)
+            triangle_count = len(level.indices)
+
+        chain = LODChain(levels, center, radius, len(positions), len(indices))
+        chain.build_time = time.perf_counter() - start_time
+        return chain
+
+    # Index of the coarsest level whose error stays below pixel_error pixels for the camera, -1 for full resolution.
+    # The distance is taken to the nearest point of the bounding sphere, so no part of the mesh gets too coarse.
+    def select(self, camera, viewport_height, pixel_error = 1.0, fovy = 45.0):
+        eye = np.array([camera.camera_pos[0], camera.camera_pos[1], camera.camera_pos[2]], dtype=np.float64)
+        distance = float(np.linalg.norm(eye - self.center)) - self.radius
+        if distance <= 0.0:
+            return -1
+        pixels_per_unit = viewport_height / (2.0 * math.tan(math.radians(fovy) * 0.5) * distance)
+        selected = -1
+        for i, level in enumerate(self.levels):
+            # A vertex moves at most about the diagonal of its cell
+            if level.cell_size * math.sqrt(3.0) * pixels_per_unit > pixel_error:
+                break
+            selected = i
+        return selected
+
+    def stats_string(self):
+        lines = ["LOD chain of {} vertices, {} triangles, built in {:.2f} s:".format(self.vertex_count, self.triangle_count, self.build_time)]
+        for i, level in enumerate(self.levels):
+            lines.append("  level {}: {} vertices, {} triangles, cell size {:.4g}".format(i, len(level.positions), len(level.indices), level.cell_size))
+        return "\n".join(lines)
+
+    # Write the chain to path, with the identity of the source mesh file and of the mesh it was built from
+    def save(self, path, source_size, source_mtime_ns, digest, mesh_digest):
+        arrays = {
+            "meta": np.array([VERSION, source_size, source_mtime_ns, self.vertex_count, self.triangle_count, len(self.levels)], dtype=np.int64),
+            "digest": np.frombuffer(digest, dtype=np.uint8),
+            "mesh_digest": np.frombuffer(mesh_digest, dtype=np.uint8),
+            "bounds": np.array([self.center[0], self.center[1], self.center[2], self.radius, self.build_time], dtype=np.float64),
+        }
+        for i, level in enumerate(self.levels):
+            arrays["positions_{}".format(i)] = level.positions
+            arrays["indices_{}".format(i)] = level.indices
+            arrays["vertex_map_{}".format(i)] = level.vertex_map
+            arrays["rest_centroids_{}".format(i)] = level.rest_centroids
+            arrays["cell_size_{}".format(i)] = np.array(level.cell_size)
+        # Written under a temporary name and moved in place, like the mesh cache
+        temp_path = path + ".tmp.npz"
+        np.savez(temp_path, **arrays)
+        os.replace(temp_path, path)
+
+    # Read a chain written by save, or None if it is missing, of another version, not of this source file
+    # or not built from the mesh with this mesh_digest
+    @staticmethod
+    def load(path, source_path, mesh_digest):
+        try:
+            data = np.load(path)
+        except (OSError, ValueError):
+            return None
+        with data:
+            meta = data["meta"]
+            if meta[0] != VERSION:
+                return None
+            stat = os.stat(source_path)
+            if meta[1] != stat.st_size:
+                return None
+            if meta[2] != stat.st_mtime_ns and meshCache.file_digest(source_path) != data["digest"].tobytes():
+                return None
+            # The file matches, but the mesh drawn may not come from it, e.g. an animation loaded after the OBJ
+            if data["mesh_digest"].tobytes() != mesh_digest:
+                return None
+            bounds = data["bounds"]
+            levels = [LODLevel(data["positions_{}".format(i)], data["indices_{}".format(i)], data["vertex_map_{}".format(i)],
+                               data["rest_centroids_{}".format(i)], float(data["cell_size_{}".format(i)])) for i in range(int(meta[5]))]
+        chain = LODChain(levels, bounds[:3], float(bounds[3]), int(meta[3]), int(meta[4]))
+        chain.build_time = float(bounds[4])
+        return chain
+
+def cache_path_for(source_path):
+    return source_path + CACHE_SUFFIX
+
+# Hash of the positions and triangles a chain is built from
+def mesh_digest(positions, indices):
+    hasher = meshCache.new_hasher()
+    hasher.update(np.ascontiguousarray(positions, dtype=np.float32).data)
+    hasher.update(np.ascontiguousarray(indices, dtype=np.uint32).data)
+    return hasher.digest()
+
+# Load the cached chain of the source mesh, or build it and write the cache
+def load_or_build(source_path, positions, indices, use_cache = True):
+    cache_path = cache_path_for(source_path)
+    if use_cache:
+        digest = mesh_digest(positions, indices)
+        chain = LODChain.load(cache_path, source_path, digest)
+        if chain is not None and chain.vertex_count == len(positions) and chain.triangle_count == len(indices):
+            return chain, True
+
+    chain = LODChain.build(positions, indices)
+    if use_cache:
+        stat = os.stat(source_path)
+        try:
+            chain.save(cache_path, stat.st_size, stat.st_mtime_ns, meshCache.file_digest(source_path), digest)
+        except OSError as e:
+            print("Could not write LOD cache for {}: {}".format(source_path, e))
+    return chain, False
+
+# Sum of the area weighted plane quadrics of the triangles around every vertex.
+# Returns Nx9: the 6 entries of the symmetric 3x3 part A (xx, xy, xz, yy, yz, zz) and the 3 entries of b = n * d.
+def vertex_quadrics(positions, indices):
+    a, b, c = positions[indices[:, 0]], positions[indices[:, 1]], positions[indices[:, 2]]
+    normal = np.cross(b - a, c - a)
+    double_area = np.linalg.norm(normal, axis=1)
+    valid = double_area > 0.0
+    normal = normal[valid] / double_area[valid, None]
+    area = double_area[valid] * 0.5
+    d = -np.einsum("ij,ij->i", normal, a[valid])
+
+    nx, ny, nz = normal[:, 0], normal[:, 1], normal[:, 2]
+    face = np.stack([nx * nx, nx * ny, nx * nz, ny * ny, ny * nz, nz * nz, nx * d, ny * d, nz * d], axis=1) * area[:, None]
+    quadrics = np.zeros((len(positions), 9), dtype=np.float64)
+    corners = indices[valid]
+    for column in range(9):
+        for corner in range(3):
+            quadrics[:, column] += np.bincount(corners[:, corner], weights=face[:, column], minlength=len(positions))
+    return quadrics
+
+# One level: cluster the vertices into grid cells of cell_size and place every cluster at its quadric minimum
+def simplify(positions, indices, quadrics, origin, cell_size):
+    cells = np.floor((positions - origin) / cell_size).astype(np.int64)
+    size = int(cells.max()) + 2
+    keys = (cells[:, 0] * size + cells[:, 1]) * size + cells[:, 2]
+    cluster_keys, vertex_map = np.unique(keys, return_inverse=True)
+    vertex_map = vertex_map.astype(np.uint32).reshape(-1)
+    cluster_count = len(cluster_keys)
+
+    counts = np.bincount(vertex_map, minlength=cluster_count).astype(np.float64)
+    centroids = np.empty((cluster_count, 3), dtype=np.float64)
+    for axis in range(3):
+        centroids[:, axis] = np.bincount(vertex_map, weights=positions[:, axis], minlength=cluster_count) / counts
+    q = np.empty((cluster_count, 9), dtype=np.float64)
+    for column in range(9):
+        q[:, column] = np.bincount(vertex_map, weights=quadrics[:, column], minlength=cluster_count)
+
+    # Minimize x^T A x + 2 b^T x, with a small pull towards the centroid so flat and empty quadrics stay solvable
+    A = np.empty((cluster_count, 3, 3), dtype=np.float64)
+    A[:, 0, 0], A[:, 0, 1], A[:, 0, 2] = q[:, 0], q[:, 1], q[:, 2]
+    A[:, 1, 0], A[:, 1, 1], A[:, 1, 2] = q[:, 1], q[:, 3], q[:, 4]
+    A[:, 2, 0], A[:, 2, 1], A[:, 2, 2] = q[:, 2], q[:, 4], q[:, 5]
+    pull = (q[:, 0] + q[:, 3] + q[:, 5]) * 1e-3 + 1e-12
+    A += pull[:, None, None] * np.identity(3)
+    rhs = pull[:, None] * centroids - q[:, 6:9]
+    placed = np.linalg.solve(A, rhs[:, :, None])[:, :, 0]
+
+    # Keep every vertex inside its cell
+    cell_cells = np.stack([cluster_keys // (size * size), (cluster_keys // size) % size, cluster_keys % size], axis=1)
+    cell_low = origin + cell_cells * cell_size
+    placed = np.clip(placed, cell_low, cell_low + cell_size)
+
+    triangles = vertex_map[indices]
+    keep = (triangles[:, 0] != triangles[:, 1]) & (triangles[:, 1] != triangles[:, 2]) & (triangles[:, 2] != triangles[:, 0])
+    triangles = triangles[keep]
+    # Several triangles collapse onto the same three clusters, keep the first of each
+    corners = np.sort(triangles, axis=1)
+    order = np.lexsort((corners[:, 2], corners[:, 1], corners[:, 0]))
+    corners = corners[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = np.any(corners[1:] != corners[:-1], axis=1)
+    triangles = triangles[np.sort(order[first])]
+
+    return LODLevel(placed.astype(np.float32), np.ascontiguousarray(triangles, dtype=np.uint32), vertex_map, centroids.astype(np.float32), cell_size)
+
+def main(argv):
+    from objParser import OBJParser
+    for path in argv:
+        mesh = meshCache.load_mesh_cache(path)
+        if mesh is None:
+            mesh = OBJParser().parse(path)
+        chain, cached = load_or_build(path, mesh[0], mesh[1])
+        print("{}: {}".format(path, "cache is up to date" if cached else "wrote " + cache_path_for(path)))
+        print(chain.stats_string())
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,249 @@
+"""
+This file contains the OBJParser class, a streaming OBJ parser that converts whole blocks of vertex and face lines to numpy arrays at once.
+"""
+
+import os
+import time
+import numpy as np
+
+SPACE = ord(" ")
+TAB = ord("\t")
+NEWLINE = ord("\n")
+CARRIAGE_RETURN = ord("\r")
+SLASH = ord("/")
+HASH = ord("#")
+
+# Growable numpy array that reallocates in place, so the parsed data is not held twice while loading
+class GrowableArray:
+    def __init__(self, columns, dtype, capacity = 1024):
+        self.data = np.empty((capacity, columns), dtype=dtype)
+        self.size = 0
+
+    def extend(self, rows):
+        needed = self.size + len(rows)
+        if needed > len(self.data):
+            self.data.resize((max(needed, int(len(self.data) * 1.5)), self.data.shape[1]), refcheck=False)
+        self.data[self.size:needed] = rows
+        self.size = needed
+
+    def finish(self):
+        self.data.resize((self.size, self.data.shape[1]), refcheck=False)
+        return self.data
+
+class OBJParser:
+    def __init__(self, chunk_size = 16 * 1024 * 1024):
+        self.chunk_size = chunk_size
+
+        self.bytes_read = 0
+        self.parse_time = 0.0
+        self.vertex_count = 0
+        self.triangle_count = 0
+
+    # Parse the file and return (vertices, indices): an Nx3 float32 array and an Mx3 uint32 array of 0 based indices.
+    # on_chunk is called with every raw chunk, e.g. to hash the file while it is read.
+    def parse(self, filename, on_chunk = None):
+        start_time = time.perf_counter()
+
+        vertices = GrowableArray(3, np.float32)
+        indices = GrowableArray(3, np.uint32)
+        self.vertex_count = 0
+
+        with open(filename, "rb") as f:
+            remainder = b""
+            while True:
+                chunk = f.read(self.chunk_size)
+                if on_chunk is not None and chunk:
+                    on_chunk(chunk)
+                if not chunk:
+                    if remainder:
+                        self.parse_chunk(remainder + b"\n", vertices, indices)
+                    break
+
+                # Only parse whole lines, the partial last line is carried over to the next chunk
+                last_newline = chunk.rfind(b"\n")
+                if last_newline == -1:
+                    remainder += chunk
+                    continue
+                self.parse_chunk(remainder + chunk[:last_newline + 1], vertices, indices)
+                remainder = chunk[last_newline + 1:]
+
+        self.bytes_read = os.path.getsize(filename)
+        vertices = vertices.finish()
+        indices = indices.finish()
+        self.triangle_count = len(indices)
+        self.parse_time = time.perf_counter() - start_time
+
+        if len(indices) > 0 and int(indices.max()) >= len(vertices):
+            raise ValueError("{}: face index out of range".format(filename))
+
+        return vertices, indices
+
+    def mb_per_second(self):
+        return self.bytes_read / (1024.0 * 1024.0) / max(self.parse_time, 1e-9)
+
+    def stats_string(self):
+        return "Parsed {} vertices, {} triangles, {:.2f} MB in {:.1f} ms ({:.1f} MB/s)".format(
+            self.vertex_count, self.triangle_count, self.bytes_read / (1024.0 * 1024.0), self.parse_time * 1000.0, self.mb_per_second())
+
+    # Parse a block of whole lines, every line ends with a newline
+    def parse_chunk(self, chunk, vertices, indices):
+        data = strip_comments(np.frombuffer(chunk, dtype=np.uint8))
+        line_ends = np.flatnonzero(data == NEWLINE)
+        line_starts = np.empty_like(line_ends)
+        line_starts[0] = 0
+        line_starts[1:] = line_ends[:-1] + 1
+
+        # Classify the lines by their keyword, "v" or "f" followed by whitespace, after any indentation
+        keyword_starts = skip_indentation(data, line_starts)
+        first = data[keyword_starts]
+        second = data[np.minimum(keyword_starts + 1, len(data) - 1)]
+        keyword_end = ((second == SPACE) | (second == TAB)) & (keyword_starts < line_ends)
+        is_vertex = keyword_end & (first == ord("v"))
+        is_face = keyword_end & (first == ord("f"))
+
+        vertex_base = self.vertex_count
+        if is_vertex.any():
+            text = select_lines(data, line_starts, line_ends, keyword_starts, is_vertex)
+            values, tokens_per_line = parse_numbers(text, np.float32)
+            if np.any(tokens_per_line < 3):
+                raise ValueError("vertex with fewer than 3 coordinates")
+
+            # Keep x, y, z and drop the optional w or vertex colors
+            first_token = np.cumsum(tokens_per_line) - tokens_per_line
+            vertices.extend(values[first_token[:, None] + np.arange(3)])
+            self.vertex_count += len(tokens_per_line)
+
+        if is_face.any():
+            text = select_lines(data, line_starts, line_ends, keyword_starts, is_face)
+            text = strip_texture_and_normal_indices(text)
+            values, tokens_per_line = parse_numbers(text, np.int64)
+            if np.any(tokens_per_line < 3):
+                raise ValueError("face with fewer than 3 vertices")
+
+            # Negative indices are relative to the vertices defined before the face
+            vertices_before = vertex_base + np.cumsum(is_vertex)[is_face]
+            face_vertices_before = np.repeat(vertices_before, tokens_per_line)
+            if np.any(values == 0):
+                raise ValueError("face index 0 is not valid in OBJ files")
+            values = np.where(values < 0, face_vertices_before + values, values - 1)
+            if np.any(values < 0):
+                raise ValueError("face index out of range")
+
+            indices.extend(fan_triangulate(values, tokens_per_line))
+
+# Concatenate the selected lines without their one character keyword, keeping the newlines as separators
+def select_lines(data, line_starts, line_ends, keyword_starts, selected):
+    mask = np.repeat(selected, line_ends - line_starts + 1)
+    mask[keyword_starts[selected]] = False
+    return data[mask]
+
+# Position of the first character of every line that is not a space or tab.
+# Only indented lines are stepped forward, the newline stops a line of blanks at its end.
+def skip_indentation(data, line_starts):
+    starts = line_starts.copy()
+    indented = np.flatnonzero(is_blank(data[starts]))
+    while len(indented) > 0:
+        starts[indented] += 1
+        indented = indented[is_blank(data[starts[indented]])]
+    return starts
+
+def is_blank(text):
+    return (text == SPACE) | (text == TAB)
+
+# Blank everything from a "#" up to the end of its line, e.g. "f 1 2 3 # tail" or a whole comment line
+def strip_comments(data):
+    hashes = np.flatnonzero(data == HASH)
+    if len(hashes) == 0:
+        return data
+    newlines = np.flatnonzero(data == NEWLINE)
+    ends = newlines[np.searchsorted(newlines, hashes)]
+    # Only the first "#" of every line counts
+    first = np.ones(len(hashes), dtype=bool)
+    first[1:] = ends[1:] != ends[:-1]
+    change = np.zeros(len(data) + 1, dtype=np.int32)
+    change[hashes[first]] = 1
+    change[ends[first]] = -1
+    data = data.copy()
+    data[np.cumsum(change[:-1]) > 0] = SPACE
+    return data
+
+# Blank the texture and normal indices of face tokens, "1/2/3 4//6 7/8" becomes "1     4     7  ".
+# The slashes are turned into spaces, then every number that did not start a token is blanked.
+def strip_texture_and_normal_indices(text):
+    is_slash = text == SLASH
+    if not is_slash.any():
+        return text
+
+    separator = is_whitespace(text)
+    number_start = ~(separator | is_slash)
+    number_start[1:] &= separator[:-1] | is_slash[:-1]
+    token_start = number_start.copy()
+    token_start[1:] &= separator[:-1]
+
+    # Mark each number that follows a slash and blank it up to the next separator or slash
+    text = np.where(is_slash, SPACE, text).astype(np.uint8)
+    after_slash = np.flatnonzero(number_start & ~token_start)
+    if len(after_slash) > 0:
+        stops = np.flatnonzero(separator | is_slash)
+        number_end = stops[np.searchsorted(stops, after_slash)]
+        lengths = number_end - after_slash
+        blank = np.repeat(after_slash - np.cumsum(lengths) + lengths, lengths) + np.arange(int(lengths.sum()))
+        text[blank] = SPACE
+    return text
+
+def is_whitespace(text):
+    return (text == SPACE) | (text == TAB) | (text == NEWLINE) | (text == CARRIAGE_RETURN)
+
+# Parse all numbers of the text at once. Returns the values and the number of tokens on every line.
+def parse_numbers(text, dtype):
+    whitespace = is_whitespace(text)
+    token_start = ~whitespace
+    token_start[1:] &= whitespace[:-1]
+    newlines = np.flatnonzero(text == NEWLINE)
+    line_of_token = np.searchsorted(newlines, np.flatnonzero(token_start))
+    tokens_per_line = np.bincount(line_of_token, minlength=len(newlines))[:len(newlines)]
+
+    token_count = len(line_of_token)
+    if token_count == 0:
+        return np.empty(0, dtype=dtype), tokens_per_line
+
+    if np.issubdtype(dtype, np.integer):
+        values = parse_integers(text, whitespace, np.flatnonzero(token_start)).astype(dtype)
+    else:
+        try:
+            values = np.array(text.tobytes().split(), dtype=dtype)
+        except ValueError:
+            raise ValueError("malformed numbers in OBJ data")
+    if len(values) != token_count:
+        raise ValueError("malformed numbers in OBJ data")
+    return values, tokens_per_line
+
+# Parse the integer tokens starting at starts from their digits, an optional "-" sign first.
+# The text ends with a newline, so every token ends where whitespace follows it.
+def parse_integers(text, whitespace, starts):
+    ends = np.flatnonzero(~whitespace[:-1] & whitespace[1:]) + 1
+    negative = text[starts] == ord("-")
+    digit_starts = starts + negative
+    lengths = ends - digit_starts
+    is_digit = (text >= ord("0")) & (text <= ord("9"))
+    # Every character of a token is a digit apart from the sign, and there is at least one digit
+    if int(is_digit.sum()) + int(negative.sum()) != len(text) - int(whitespace.sum()) or np.any(lengths < 1):
+        raise ValueError("malformed numbers in OBJ data")
+
+    # Horner's rule over the digit columns, tokens shorter than the column keep their value
+    values = np.zeros(len(starts), dtype=np.int64)
+    for column in range(int(lengths.max())):
+        longer = np.flatnonzero(lengths > column)
+        values[longer] = values[longer] * 10 + (text[digit_starts[longer] + column].astype(np.int64) - ord("0"))
+    return np.where(negative, -values, values)
+
+# Triangulate polygons as fans around their first vertex. Returns an Mx3 array.
+def fan_triangulate(values, vertices_per_face):
+    face_start = np.cumsum(vertices_per_face) - vertices_per_face
+    triangles_per_face = vertices_per_face - 2
+    face_of_triangle = np.repeat(np.arange(len(vertices_per_face)), triangles_per_face)
+    first_triangle = np.cumsum(triangles_per_face) - triangles_per_face
+    j = np.arange(len(face_of_triangle)) - first_triangle[face_of_triangle] + 1
+
+    a = face_start[face_of_triangle]
+    return np.stack([values[a], values[a + j], values[a + j + 1]], axis=1)
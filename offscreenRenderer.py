@@ -0,0 +1,308 @@
+"""
+This file contains the OffscreenContext class and the offscreen render entry point of the PyMeshViewer. It renders
+the particle system scene of a mesh or an animation to an image sequence without a window, e.g. on servers without
+a display, using an EGL pbuffer (surfaceless Mesa renders in software when there is no GPU).
+
+Frame ranges are split into chunks and rendered by worker processes, each with its own GL context. Frames are
+written as PNG files, raw RGB files, or streamed in order into the stdin of an encoder, e.g.
+
+    python offscreenRenderer.py anim.pmanim --output frames/frame_%05d.png --workers 4
+    python offscreenRenderer.py anim.pmanim --pipe "ffmpeg -y -f rawvideo -pix_fmt rgb24 -s 800x600 -r 30 -i - out.mp4"
+"""
+
+import os
+# Has to be set before OpenGL is imported, in this process and in the worker processes
+os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+os.environ.setdefault("EGL_PLATFORM", "surfaceless")
+
+import argparse
+import collections
+import ctypes
+import multiprocessing
+import shlex
+import subprocess
+import sys
+import time
+import numpy as np
+
+# Rendering context without a window, draws into an EGL pbuffer of the given size
+class OffscreenContext:
+    def __init__(self, width, height):
+        if os.environ.get("PYOPENGL_PLATFORM") != "egl":
+            raise RuntimeError("offscreen rendering needs PYOPENGL_PLATFORM=egl, it is {}".format(os.environ.get("PYOPENGL_PLATFORM")))
+        from OpenGL import EGL
+        self.EGL = EGL
+        self.width = width
+        self.height = height
+
+        self.display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+        major, minor = EGL.EGLint(), EGL.EGLint()
+        if not EGL.eglInitialize(self.display, ctypes.pointer(major), ctypes.pointer(minor)):
+            raise RuntimeError("eglInitialize failed, is Mesa with EGL installed?")
+
+        config_attributes = (EGL.EGLint * 15)(
+            EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+            EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+            EGL.EGL_RED_SIZE, 8, EGL.EGL_GREEN_SIZE, 8, EGL.EGL_BLUE_SIZE, 8,
+            EGL.EGL_DEPTH_SIZE, 24,
+            EGL.EGL_NONE)
+        config = EGL.EGLConfig()
+        config_count = EGL.EGLint()
+        EGL.eglChooseConfig(self.display, config_attributes, ctypes.pointer(config), 1, ctypes.pointer(config_count))
+        if config_count.value == 0:
+            raise RuntimeError("no EGL config with an RGB pbuffer and a depth buffer")
+
+        surface_attributes = (EGL.EGLint * 5)(EGL.EGL_WIDTH, width, EGL.EGL_HEIGHT, height, EGL.EGL_NONE)
+        self.surface = EGL.eglCreatePbufferSurface(self.display, config, surface_attributes)
+        # Desktop OpenGL, the renderer uses the fixed function pipeline
+        EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+        self.context = EGL.eglCreateContext(self.display, config, EGL.EGL_NO_CONTEXT, None)
+        if not EGL.eglMakeCurrent(self.display, self.surface, self.surface, self.context):
+            raise RuntimeError("eglMakeCurrent failed")
+
+        from OpenGL.GL import glEnable, glViewport, glPixelStorei, GL_DEPTH_TEST, GL_PACK_ALIGNMENT
+        glEnable(GL_DEPTH_TEST)
+        glViewport(0, 0, width, height)
+        glPixelStorei(GL_PACK_ALIGNMENT, 1)
+        self.pixels = np.empty((height, width, 3), dtype=np.uint8)
+
+    # Read the rendered image as an HxWx3 uint8 array, the first row is the top of the image
+    def read_pixels(self):
+        from OpenGL.GL import glFinish, glReadPixels, GL_RGB, GL_UNSIGNED_BYTE
+        glFinish()
+        data = glReadPixels(0, 0, self.width, self.height, GL_RGB, GL_UNSIGNED_BYTE)
+        # GL rows start at the bottom
+        self.pixels[...] = np.frombuffer(data, dtype=np.uint8).reshape(self.height, self.width, 3)[::-1]
+        return self.pixels
+
+    def close(self):
+        EGL = self.EGL
+        EGL.eglMakeCurrent(self.display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, EGL.EGL_NO_CONTEXT)
+        EGL.eglDestroyContext(self.display, self.context)
+        EGL.eglDestroySurface(self.display, self.surface)
+        EGL.eglTerminate(self.display)
+
+# Render the scene the way the viewer window does, without the UI, and return the image
+def render_scene(context, particle_system, camera):
+    from OpenGL.GL import glClear, glMatrixMode, glLoadMatrixf, GL_COLOR_BUFFER_BIT, GL_DEPTH_BUFFER_BIT, GL_PROJECTION, GL_MODELVIEW
+    glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+    camera.update_matrices(context.width, context.height)
+    glMatrixMode(GL_PROJECTION)
+    glLoadMatrixf(camera.projection)
+    glMatrixMode(GL_MODELVIEW)
+    glLoadMatrixf(camera.modelView)
+    particle_system.render()
+    return context.read_pixels()
+
+def frame_path(pattern, index):
+    return pattern % index
+
+def write_frame(pattern, index, pixels):
+    from pngWriter import write_png
+    path = frame_path(pattern, index)
+    if path.lower().endswith(".png"):
+        # Level 1, the frames are mostly flat colors and compress well anyway
+        write_png(path, pixels, compression=1)
+    else:
+        with open(path, "wb") as f:
+            f.write(pixels.tobytes())
+
+# Set by init_worker in every worker process
+worker = None
+# The error of RenderWorker, raised by the first task. A pool respawns workers whose initializer raises forever.
+worker_error = None
+
+class RenderWorker:
+    def __init__(self, input_path, width, height, camera_pos, camera_angle, highlight):
+        from instances import Instances
+        from camera import Camera
+        from inputHandler import InputHandler
+        from particleSystem import ParticleSystem
+        from pyMeshViewerBatch import BatchTerminal, load_input
+        from vector3 import Vector3
+
+        self.context = OffscreenContext(width, height)
+        Instances.camera_instance = Camera()
+        if camera_pos is not None:
+            Instances.camera_instance.camera_pos = Vector3(*camera_pos)
+        if camera_angle is not None:
+            Instances.camera_instance.camera_angle = list(camera_angle)
+        Instances.input_handler_instance = InputHandler(Instances.camera_instance, width, height)
+        InputHandler.load_in_background = False
+        ParticleSystem.edges_in_background = False
+        Instances.terminalManager_instance = BatchTerminal()
+        self.camera = Instances.camera_instance
+
+        load_input(input_path)
+        self.particle_system = Instances.particle_system_instance
+        self.frames = None
+        animation_manager = self.particle_system.animation_manager
+        if animation_manager is not None:
+            # Frames are read in order, the decode threads of the playback prefetcher do not help here
+            animation_manager.set_prefetch(False)
+            self.frames = animation_manager.animation_frames
+        if highlight is not None:
+            kind, index = highlight
+            if kind == "v":
+                self.particle_system.highlight_vertex(int(index))
+            else:
+                self.particle_system.highlight_triangle(int(index))
+        self.particle_system.init_buffers()
+
+    def frame_count(self):
+        return 1 if self.frames is None else len(self.frames)
+
+    # Render frames [start, end). Writes them to files when a pattern is given, otherwise returns their bytes.
+    def render_range(self, start, end, pattern):
+        render_time = 0.0
+        output_time = 0.0
+        images = []
+        for index in range(start, end):
+            t = time.perf_counter()
+            if self.frames is not None:
+                self.particle_system.update_vertices(self.frames[index])
+            pixels = render_scene(self.context, self.particle_system, self.camera)
+            output_start = time.perf_counter()
+            render_time += output_start - t
+            if pattern is not None:
+                write_frame(pattern, index, pixels)
+            else:
+                images.append(pixels.tobytes())
+            output_time += time.perf_counter() - output_start
+        return {"start": start, "end": end, "render_s": render_time, "output_s": output_time, "images": images, "pid": os.getpid()}
+
+def init_worker(*args):
+    global worker, worker_error
+    try:
+        worker = RenderWorker(*args)
+    except Exception as e:
+        worker_error = e
+
+def get_worker():
+    if worker is None:
+        raise worker_error
+    return worker
+
+def worker_frame_count(unused = None):
+    return get_worker().frame_count()
+
+def worker_render_range(task):
+    start, end, pattern = task
+    return get_worker().render_range(start, end, pattern)
+
+# Split [start, end) into chunks, small enough that all workers stay busy and streamed frames arrive steadily
+def split_frames(start, end, worker_count, chunk_size = None):
+    if chunk_size is None:
+        chunk_size = max(1, min(32, (end - start) // (worker_count * 4)))
+    return [(s, min(s + chunk_size, end)) for s in range(start, end, chunk_size)]
+
+class OffscreenRenderer:
+    def __init__(self, input_path, width = 800, height = 600, camera_pos = None, camera_angle = None, highlight = None, worker_count = 1):
+        self.worker_args = (input_path, width, height, camera_pos, camera_angle, highlight)
+        self.width = width
+        self.height = height
+        self.worker_count = worker_count
+        self.pool = None
+        if worker_count > 1:
+            self.pool = multiprocessing.Pool(worker_count, initializer=init_worker, initargs=self.worker_args)
+        else:
+            init_worker(*self.worker_args)
+            get_worker()
+
+        self.frames_rendered = 0
+        self.render_time = 0.0
+        self.output_time = 0.0
+        self.wall_time = 0.0
+        self.worker_pids = set()
+
+    def frame_count(self):
+        if self.pool is not None:
+            return self.pool.apply(worker_frame_count)
+        return worker_frame_count()
+
+    # Render frames [start, end), to files named by pattern (%d is the frame index) or in order to the stream
+    def render(self, start, end, pattern = None, stream = None):
+        if pattern is not None and os.path.dirname(pattern):
+            os.makedirs(os.path.dirname(pattern), exist_ok=True)
+        tasks = [(s, e, pattern) for s, e in split_frames(start, end, self.worker_count)]
+        wall_start = time.perf_counter()
+        if self.pool is None:
+            for task in tasks:
+                self.collect(worker_render_range(task), stream)
+        else:
+            # Keep a few chunks in flight per worker, so streamed frames that wait for an earlier chunk stay bounded
+            in_flight = collections.deque()
+            for task in tasks:
+                if len(in_flight) >= self.worker_count * 2:
+                    self.collect(in_flight.popleft().get(), stream)
+                in_flight.append(self.pool.apply_async(worker_render_range, (task,)))
+            while len(in_flight) > 0:
+                self.collect(in_flight.popleft().get(), stream)
+        self.wall_time += time.perf_counter() - wall_start
+
+    def collect(self, result, stream):
+        self.frames_rendered += result["end"] - result["start"]
+        self.render_time += result["render_s"]
+        self.output_time += result["output_s"]
+        self.worker_pids.add(result["pid"])
+        if stream is not None:
+            for image in result["images"]:
+                stream.write(image)
+
+    def fps(self):
+        return self.frames_rendered / self.wall_time if self.wall_time > 0.0 else 0.0
+
+    def stats_string(self):
+        frames = max(self.frames_rendered, 1)
+        return "Rendered {} frames of {}x{} in {:.2f} s: {:.1f} frames/s with {} workers (render {:.2f} ms/frame, output {:.2f} ms/frame)".format(
+            self.frames_rendered, self.width, self.height, self.wall_time, self.fps(), len(self.worker_pids),
+            self.render_time / frames * 1000.0, self.output_time / frames * 1000.0)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+        elif worker is not None:
+            worker.context.close()
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Render a mesh or an animation to an image sequence without a window")
+    parser.add_argument("input", help="OBJ mesh or JSON or binary animation")
+    parser.add_argument("--output", help="frame file pattern, %%d is the frame index, .png for PNG files, otherwise raw RGB")
+    parser.add_argument("--pipe", help="command that gets the raw RGB frames in order on stdin, - for stdout")
+    parser.add_argument("--frames", type=int, nargs=2, metavar=("START", "END"), help="frame range, END is excluded, all frames by default")
+    parser.add_argument("--size", type=int, nargs=2, default=[800, 600], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--camera-pos", type=float, nargs=3, metavar=("X", "Y", "Z"))
+    parser.add_argument("--camera-angle", type=float, nargs=2, metavar=("PITCH", "YAW"))
+    parser.add_argument("--highlight", nargs=2, metavar=("v|t", "INDEX"), help="highlight a vertex or a triangle")
+    parser.add_argument("--workers", type=int, default=1, help="render processes, each with its own GL context")
+    args = parser.parse_args(argv)
+    if (args.output is None) == (args.pipe is None):
+        parser.error("give either --output or --pipe")
+
+    # Progress and stats go to stderr when the frames go to stdout
+    log = sys.stderr if args.pipe == "-" else sys.stdout
+    renderer = OffscreenRenderer(args.input, args.size[0], args.size[1], args.camera_pos, args.camera_angle, args.highlight, args.workers)
+    encoder = None
+    try:
+        start, end = args.frames if args.frames is not None else (0, renderer.frame_count())
+        print("Rendering frames {} to {} of {}".format(start, end - 1, args.input), file=log)
+        stream = None
+        if args.pipe == "-":
+            stream = sys.stdout.buffer
+        elif args.pipe is not None:
+            encoder = subprocess.Popen(shlex.split(args.pipe), stdin=subprocess.PIPE)
+            stream = encoder.stdin
+        renderer.render(start, end, args.output, stream)
+        print(renderer.stats_string(), file=log)
+    finally:
+        renderer.close()
+        if encoder is not None:
+            encoder.stdin.close()
+            if encoder.wait() != 0:
+                print("Encoder exited with {}".format(encoder.returncode), file=log)
+                return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -3,6 +3,7 @@
     It also contains the Particle and Triangle classes, which are used to represent the particles and triangles of the mesh, respectively.
 """
 
+import ctypes
 import math
 from OpenGL.GL import *
 from OpenGL.GLU import *
@@ -13,44 +14,285 @@ from pyMeshViewerUtils import *
 from instances import *
 import time
 from animationManager import AnimationManager
+from animationFormat import AnimationData
+from bvh import BVH
+from screenSpaceGrid import ScreenSpaceGrid
+from gpuBuffers import MeshBuffers
+from renderScheduler import request_redisplay
+from frameProfiler import get_profiler
+from frameSlot import FrameSlot
+from meshLOD import LODChain, load_or_build
+from meshClusters import MeshClusters
+from meshEdges import MeshEdges, edge_ranges
+from rayIntersection import to_np3
+import threading
 
 class ParticleSystem:
+    # GL object used for the buffer uploads, None for the real OpenGL module
+    gl_backend = None
+    # Build the LOD chain of large meshes in the background when they are loaded, the viewer turns this on
+    lod_auto_build = False
+    lod_min_triangles = 200000
+    lod_cache_enabled = True
+    # Meshes with at least this many triangles are split into clusters that are culled against the view frustum
+    cluster_min_triangles = 100000
+    # The edges of meshes with at least this many triangles are found in the background, batch runs turn this off
+    edges_in_background = True
+    edge_background_triangles = 100000
+
     def __init__(self, vertices, triangleIndices, indexOffset = -1):
         self.animation_manager = None
 
-        self.particles = []
-        self.triangles = []
+        # Nx3 float32 vertex positions and Mx3 uint32 triangle indices, uploaded to the GPU as is
+        self.positions = None
+        self.indices = None
+        self.bvh = None
+        self.bvh_needs_refit = False
+        # Incremented whenever the positions change, used to invalidate the screen space grid
+        self.positions_version = 0
+        # Incremented whenever the triangle indices change, the element buffer is only uploaded then
+        self.topology_version = 0
+        self.screen_grid = ScreenSpaceGrid()
+        self.frame_slot = None
+        # Simplified levels drawn when the mesh is small on screen, picking always uses the full resolution mesh
+        self.lod_chain = None
+        # Incremented for every new LOD chain, the level buffers are uploaded again then
+        self.lod_generation = 0
+        self.lod_building = False
+        self.lod_enabled = True
+        # Largest error of a level on screen, in pixels
+        self.lod_pixel_error = 1.0
+        # Level drawn in the last frame, -1 for full resolution
+        self.lod_level = -1
+        self.lod_buffers = {}
+        # OBJ file of the mesh, the LOD chain is cached next to it
+        self.source_path = None
+        # Clusters of the full resolution mesh for frustum culling, built in the background
+        self.clusters = None
+        self.clusters_building = False
+        self.culling_enabled = True
+        # Unique edges drawn as the wireframe, until they are built the triangles are drawn in line mode
+        self.edges = None
+        self.edges_building = False
+        # Edges of every LOD level, built with the chain
+        self.lod_edges = []
+        # "all" edges or only the "features": boundary edges and creases sharper than feature_angle degrees
+        self.edge_mode = "all"
+        self.feature_angle = 30.0
+        # Incremented when the edge mode changes, the edge buffers are uploaded again then
+        self.edge_settings_version = 0
+        # Start of the edges of every cluster in the edge buffer, None if it is not in cluster order
+        self.edge_cluster_start = None
+        self.set_mesh(vertices, triangleIndices, indexOffset)
+
+        # Particle and Triangle objects are created on access only
+        self.particles = ParticleList(self)
+        self.triangles = TriangleList(self)
         self.lines = []
-        for i in range(len(vertices)):
-            self.particles.append(Particle(Vector3(vertices[i][0], vertices[i][1], vertices[i][2]), self))
-        
-        for i in range(0, len(triangleIndices), 3):
-                self.triangles.append(Triangle(triangleIndices[i + 0] + indexOffset, triangleIndices[i + 1] + indexOffset, triangleIndices[i + 2] + indexOffset, self))
 
         self.select_particle_enabled = False
         self.select_triangle_enabled = False
+        self.select_edge_enabled = False
         self.selected_element_index = -1
 
-        self.vbo = None
-        self.ebo = None
+        self.mesh_buffers = MeshBuffers(ParticleSystem.gl_backend)
         self.need_to_refresh_buffers = False
 
         self.show_highlights_only = False
 
         Instances.input_handler_instance.mouseCallbacksWithRayIntersection.append(self.on_mouse_click)
 
+    # Replace the mesh with new vertices and triangle indices
+    def set_mesh(self, vertices, triangleIndices, indexOffset = 0):
+        self.positions = np.ascontiguousarray(np.asarray(vertices, dtype=np.float32).reshape(-1, 3))
+        indices = np.asarray(triangleIndices).reshape(-1, 3)
+        if indexOffset != 0:
+            indices = indices.astype(np.int64) + indexOffset
+        self.indices = np.ascontiguousarray(indices, dtype=np.uint32)
+
+        self.positions_version += 1
+        self.topology_version += 1
+        # Animation frames are handed over to the render thread through this slot
+        self.frame_slot = FrameSlot(self.positions)
+
+        # Topology changed, the BVH is rebuilt on the next pick
+        self.bvh = None
+        self.bvh_needs_refit = False
+        self.lod_chain = None
+        self.lod_edges = []
+        self.clusters = None
+        self.edges = None
+        # A new mesh does not come from the previous source file, OBJLoader sets it again after loading
+        self.source_path = None
+
+    # Get the BVH for the current vertex positions, building or refitting it if needed
+    def get_bvh(self):
+        if self.bvh is None:
+            self.bvh = BVH(self.positions, self.indices)
+            self.bvh_needs_refit = False
+            Instances.terminalManager_instance.tprint(self.bvh.stats_string())
+        elif self.bvh_needs_refit:
+            self.bvh.refit(self.positions)
+            self.bvh_needs_refit = False
+        return self.bvh
+
+    # Build the LOD chain if the mesh is large enough, see lod_auto_build
+    def auto_build_lod(self):
+        if ParticleSystem.lod_auto_build and len(self.indices) >= ParticleSystem.lod_min_triangles:
+            self.build_lod()
+
+    # Build the LOD chain of the current mesh, or load it from the cache next to the source file
+    def build_lod(self, background = True):
+        if self.lod_building:
+            return
+        self.lod_building = True
+        # The frame slot reuses its buffers, build from a copy of the current positions
+        positions = np.array(self.positions)
+        indices = self.indices
+        positions_version = self.positions_version
+        topology_version = self.topology_version
+        source_path = self.source_path
+
+        def build():
+            try:
+                cached = False
+                if source_path is not None:
+                    chain, cached = load_or_build(source_path, positions, indices, ParticleSystem.lod_cache_enabled)
+                else:
+                    chain = LODChain.build(positions, indices)
+                lod_edges = [MeshEdges(level.indices, len(level.positions)) for level in chain.levels]
+            finally:
+                self.lod_building = False
+            if topology_version != self.topology_version:
+                # The mesh was replaced while building
+                return
+            chain.rest_version = positions_version
+            # Set before the chain, the render thread looks up the edges of the levels it selects
+            self.lod_edges = lod_edges
+            self.lod_chain = chain
+            self.lod_generation += 1
+            Instances.terminalManager_instance.tprint(("Loaded " if cached else "Built ") + chain.stats_string())
+            request_redisplay()
+
+        if background:
+            threading.Thread(target=build, daemon=True).start()
+        else:
+            build()
+
+    # Level of the LOD chain to draw for the current camera, -1 for full resolution
+    def select_lod(self):
+        chain = self.lod_chain
+        camera = Instances.camera_instance
+        if not self.lod_enabled or chain is None or camera is None or camera.viewPort is None:
+            return -1
+        return chain.select(camera, camera.viewPort[3], self.lod_pixel_error)
+
+    # Upload what changed of a level, returns its buffers and positions
+    def upload_lod_buffers(self, level_index):
+        chain = self.lod_chain
+        level = chain.levels[level_index]
+        buffers = self.lod_buffers.get(level_index)
+        if buffers is None:
+            buffers = MeshBuffers(ParticleSystem.gl_backend)
+            self.lod_buffers[level_index] = buffers
+        if buffers.topology_version != self.lod_generation:
+            buffers.upload_topology(level.indices, self.lod_generation)
+            buffers.positions_version = -1
+        positions = level.positions_for(self.positions, self.positions_version, chain.rest_version)
+        if buffers.positions_version != self.positions_version:
+            buffers.upload_positions(positions, self.positions_version)
+        edge_version = (self.lod_generation, self.edge_settings_version)
+        if buffers.edge_version != edge_version:
+            edges = self.lod_edges[level_index]
+            buffers.upload_edge_indices(edges.draw_list(self.edge_mask(edges, level.positions, level.indices))[0], edge_version)
+        return buffers, level
+
+    # Clusters of the mesh for culling, None until they are built. Starts building them for large meshes.
+    def get_clusters(self):
+        if self.clusters is None and self.culling_enabled and not self.clusters_building and len(self.indices) >= ParticleSystem.cluster_min_triangles:
+            self.clusters_building = True
+            positions = np.array(self.positions)
+            indices = self.indices
+            topology_version = self.topology_version
+
+            def build():
+                try:
+                    clusters = MeshClusters(positions, indices)
+                finally:
+                    self.clusters_building = False
+                if topology_version == self.topology_version:
+                    self.clusters = clusters
+                    request_redisplay()
+
+            threading.Thread(target=build, daemon=True).start()
+        return self.clusters if self.culling_enabled else None
+
+    # Unique edges of the mesh, None while they are built in the background for large meshes
+    def get_edges(self):
+        if self.edges is None and not self.edges_building:
+            indices = self.indices
+            vertex_count = len(self.positions)
+            if not ParticleSystem.edges_in_background or len(indices) < ParticleSystem.edge_background_triangles:
+                self.edges = MeshEdges(indices, vertex_count)
+                return self.edges
+            self.edges_building = True
+            topology_version = self.topology_version
+
+            def build():
+                try:
+                    edges = MeshEdges(indices, vertex_count)
+                finally:
+                    self.edges_building = False
+                if topology_version == self.topology_version:
+                    self.edges = edges
+                    request_redisplay()
+
+            threading.Thread(target=build, daemon=True).start()
+        return self.edges
+
+    # Mask of the edges drawn in the current edge mode, None for all of them.
+    # The creases are found once per mode change, from the positions at that time.
+    def edge_mask(self, edges, positions, indices):
+        if self.edge_mode != "features":
+            return None
+        if edges.features is None or edges.feature_angle != self.feature_angle:
+            edges.feature_mask(positions, indices, self.feature_angle)
+        return edges.features
+
+    # Draw "all" edges or only the "features", with an optional crease angle in degrees
+    def set_edge_mode(self, mode, feature_angle = None):
+        self.edge_mode = mode
+        if feature_angle is not None:
+            self.feature_angle = feature_angle
+        # Find the creases again for the current positions
+        for edges in [self.edges] + self.lod_edges:
+            if edges is not None:
+                edges.features = None
+        self.edge_settings_version += 1
+        request_redisplay()
+
     # Initialize the VBOs and EBOs for drawing
     def init_buffers(self):
-        np_particles = self.particles_to_np_array()
-        np_triangles = self.triangles_to_np_array()
-
-        self.vbo = glGenBuffers(1)
-        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
-        glBufferData(GL_ARRAY_BUFFER, np_particles.nbytes, np_particles.tobytes(), GL_STATIC_DRAW)
-
-        self.ebo = glGenBuffers(1)
-        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ebo)
-        glBufferData(GL_ELEMENT_ARRAY_BUFFER, np_triangles.nbytes, np_triangles.tobytes(), GL_STATIC_DRAW)
+        self.upload_buffers()
+
+    # Upload what changed since the last upload: the topology once, the positions once per new frame.
+    # With clusters the triangles are uploaded in cluster order, and again once the clusters are ready.
+    def upload_buffers(self, clusters = None):
+        topology_version = (self.topology_version, clusters is not None)
+        if self.mesh_buffers.topology_version != topology_version:
+            if clusters is not None:
+                self.mesh_buffers.upload_topology(clusters.indices, topology_version)
+                self.mesh_buffers.upload_point_indices(clusters.vertex_indices)
+            else:
+                self.mesh_buffers.upload_topology(self.indices, topology_version)
+        edges = self.get_edges()
+        edge_version = (topology_version, self.edge_settings_version)
+        if edges is not None and self.mesh_buffers.edge_version != edge_version:
+            edge_list, self.edge_cluster_start = edges.draw_list(self.edge_mask(edges, self.positions, self.indices), clusters)
+            self.mesh_buffers.upload_edge_indices(edge_list, edge_version)
+        if self.mesh_buffers.positions_version != self.positions_version:
+            self.mesh_buffers.upload_positions(self.positions, self.positions_version)
+        self.need_to_refresh_buffers = False
 
   
     # Callback function for mouse click events
@@ -60,34 +302,29 @@ class ParticleSystem:
 
         if self.select_particle_enabled:
             self.select_particle(x, y)
+
+        if self.select_edge_enabled:
+            self.select_edge(origin, direction)
+
+        request_redisplay()
         
     # Select the particle that is closest to the mouse click
     def select_particle(self, x, y):
-        closest_hit_vertex = -1
-        smallest_distance = float("inf")
-        for i in range(len(self.particles)):
-            p = self.particles[i]
-            onscreen_x, onscreen_y = PyMeshViewerUtils.world_to_screen(p.position.np(), Instances.camera_instance.modelView, Instances.camera_instance.projection, Instances.camera_instance.viewPort)
-            distance = math.sqrt((onscreen_x - x) ** 2 + (onscreen_y - y) ** 2)
-            if distance < smallest_distance:
-                closest_hit_vertex = i
-                smallest_distance = distance
+        self.screen_grid.update(self.positions, self.positions_version, Instances.camera_instance)
+        closest_hit_vertex, smallest_distance = self.screen_grid.nearest(x, y, 5)
 
-        if smallest_distance < 5:
+        if closest_hit_vertex != -1:
             p = self.particles[closest_hit_vertex]
             Instances.terminalManager_instance.tprint("Hit vertex index: {}, position: ({}, {}, {})".format(closest_hit_vertex, p.position.x, p.position.y, p.position.z))
             self.selected_element_index = closest_hit_vertex
     
     # Select the triangle that is hit by the ray
     def select_triangle(self, origin, direction):
-        smallest_distance = float("inf")
-        closest_hit_triangle = -1
-        for i in range(len(self.triangles)):
-            t = self.triangles[i]
-            distance = t.intersect_with_ray(origin, direction)
-            if distance is not None and distance < smallest_distance:
-                closest_hit_triangle = i
-                smallest_distance = distance
+        closest_hit_triangle, smallest_distance = self.get_bvh().intersect(origin, direction, self.positions)
+        if closest_hit_triangle == -1:
+            Instances.terminalManager_instance.tprint("No triangle hit.")
+            return
+
         Instances.terminalManager_instance.tprint("Hit triangle index: {}".format(closest_hit_triangle))
         hitTriangle = self.triangles[closest_hit_triangle]
         self.selected_element_index = closest_hit_triangle
@@ -97,114 +334,146 @@ class ParticleSystem:
         Instances.terminalManager_instance.tprint("Triangle Vertex Indices: {}, {}, {}".format(hitTriangle.index0, hitTriangle.index1, hitTriangle.index2))
         Instances.terminalManager_instance.tprint("Triangle Vertices: {}, {}, {}".format(p0, p1, p2))
 
+    # Select the edge of the hit triangle that is closest to the hit point
+    def select_edge(self, origin, direction):
+        edges = self.get_edges()
+        if edges is None:
+            Instances.terminalManager_instance.tprint("The edges are still being built.")
+            return
+        closest_hit_triangle, smallest_distance = self.get_bvh().intersect(origin, direction, self.positions)
+        if closest_hit_triangle == -1:
+            Instances.terminalManager_instance.tprint("No edge hit.")
+            return
+
+        hit_point = to_np3(origin) + smallest_distance * to_np3(direction)
+        edge = edges.nearest_edge(closest_hit_triangle, hit_point, self.positions)
+        self.selected_element_index = edge
+        index0, index1 = edges.edges[edge].tolist()
+        t0, t1 = edges.edge_triangles[edge].tolist()
+        Instances.terminalManager_instance.tprint("Hit edge index: {}, vertex indices: {}, {}".format(edge, index0, index1))
+        Instances.terminalManager_instance.tprint("Edge triangles: {}".format("{}, {}".format(t0, t1) if t1 != -1 else "{} (boundary)".format(t0)))
+
 
     """
-    Load animation and create animation manager. Data is json data.
+    Load animation and create animation manager. Data is json data or an AnimationData.
     """
     def load_animation(self, data):
-        animation_vertices = []
-        animation_triangles = []
-        animation_frame_types = []
-        for frame in data['frames']:
-            frame_vertices = []
-            for vertex in frame['points']:
-                frame_vertices.append([vertex['X'], vertex['Y'], vertex['Z']])
-            animation_vertices.append(frame_vertices)
-            animation_frame_types.append(frame['type'])
-        for t in data['triangle_indices']:
-            animation_triangles.append(t['A'])
-            animation_triangles.append(t['B'])
-            animation_triangles.append(t['C'])
-        
-        self.particles = []
-        self.triangles = []
+        if isinstance(data, dict):
+            data = AnimationData.from_json_dict(data)
 
-        for i in range(len(animation_vertices[0])):
-            self.particles.append(Particle(Vector3(animation_vertices[0][i][0], animation_vertices[0][i][1], animation_vertices[0][i][2]), self))
-        
-        for i in range(0, len(animation_triangles), 3):
-            self.triangles.append(Triangle(animation_triangles[i + 0], animation_triangles[i + 1], animation_triangles[i + 2], self))
-        
-        self.vbo = None
-        self.ebo = None
+        # Copy the first frame, the frames may be a read-only memory map
+        self.set_mesh(np.array(data.frames[0], dtype=np.float32), data.triangles)
 
-        self.animation_manager = AnimationManager(self, animation_vertices, animation_frame_types)
+        if self.animation_manager is not None:
+            self.animation_manager.close()
+        self.animation_manager = AnimationManager(self, data.frames, data.frame_types)
+        self.animation_manager.marks = dict(data.marks)
+        if isinstance(data.frames, np.memmap):
+            # Frames of binary animations are read from disk, decode them ahead of the playhead
+            self.animation_manager.set_prefetch(True)
+        self.auto_build_lod()
 
-        glutPostRedisplay()
+        request_redisplay()
 
-    # Update the vertices of the particle system
+    # Update the vertices of the particle system. Safe to call from any thread:
+    # the positions are published to the frame slot and become current at the start of the next frame.
     def update_vertices(self, vertices):
-        self.particles = []
-        for i in range(len(vertices)):
-            self.particles.append(Particle(Vector3(vertices[i][0], vertices[i][1], vertices[i][2]), self))
+        vertices = np.asarray(vertices, dtype=np.float32).reshape(-1, 3)
+        if vertices.shape == self.frame_slot.shape():
+            self.frame_slot.write(vertices)
+        else:
+            # A different vertex count needs new buffers, this only happens with a new mesh
+            self.positions = np.array(vertices, dtype=np.float32)
+            self.frame_slot = FrameSlot(self.positions)
+            self.bvh = None
+            self.positions_version += 1
 
         self.need_to_refresh_buffers = True
-        glutPostRedisplay()
+        request_redisplay()
+
+    # Called by the render thread at the start of a frame, takes the newest published positions
+    def acquire_frame(self):
+        positions = self.frame_slot.swap()
+        if positions is None:
+            return False
+        self.positions = positions
+        self.positions_version += 1
+        self.bvh_needs_refit = True
+        return True
 
     # Convert particles to numpy array
     def particles_to_np_array(self):
-        result = np.array([], dtype=np.float32)
-        for p in self.particles:
-            result = np.append(result, p.position.np())
-        return result
+        return self.positions.reshape(-1)
     
     # Convert triangles to numpy array
     def triangles_to_np_array(self):
-        result = np.array([], dtype=np.uint32)
-        for t in self.triangles:
-            result = np.append(result, np.array([t.index0], dtype=np.uint32))
-            result = np.append(result, np.array([t.index1], dtype=np.uint32))
-            result = np.append(result, np.array([t.index2], dtype=np.uint32))
-        return result
+        return self.indices.reshape(-1)
 
     def render(self):
-        if self.vbo is None or self.ebo is None:
-            self.init_buffers()
-        elif self.need_to_refresh_buffers:
-            new_np_particles = self.particles_to_np_array()
-            new_np_triangles = self.triangles_to_np_array()
-
-            # Bind the VBO
-            glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
-
-            # Update the VBO with new data
-            glBufferSubData(GL_ARRAY_BUFFER, 0, new_np_particles.nbytes, new_np_particles.tobytes())
-
-            # Bind the EBO
-            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ebo)
-
-            # Update the EBO with new data
-            glBufferSubData(GL_ELEMENT_ARRAY_BUFFER, 0, new_np_triangles.nbytes, new_np_triangles.tobytes())
-
-            self.need_to_refresh_buffers = False
-
+        profiler = get_profiler()
+
+        t = profiler.start()
+        self.acquire_frame()
+        # Only the buffers of the level that is drawn are kept up to date
+        self.lod_level = self.select_lod()
+        # (first triangle, triangle count, first point, point count) of the visible clusters, None to draw everything
+        ranges = None
+        if self.lod_level >= 0:
+            buffers, level = self.upload_lod_buffers(self.lod_level)
+            index_count, vertex_count = level.indices.size, len(level.positions)
+        else:
+            clusters = self.get_clusters()
+            self.upload_buffers(clusters)
+            buffers = self.mesh_buffers
+            index_count, vertex_count = self.indices.size, len(self.positions)
+            camera = Instances.camera_instance
+            if clusters is not None and camera is not None and camera.projection is not None:
+                clusters.refit(self.positions, self.positions_version)
+                clusters.cull(camera.modelView, camera.projection)
+                ranges = list(clusters.visible_ranges())
+        profiler.count("lod level", self.lod_level)
+        drawn_triangles = index_count // 3 if ranges is None else clusters.drawn_triangles
+        profiler.count("drawn triangles", drawn_triangles)
+        profiler.count("culled triangles", 0 if ranges is None else clusters.culled_triangles)
+        profiler.stop("buffer refresh", t)
 
         if not self.show_highlights_only:
 
             # Set up VBOs and EBOs for drawing
-            glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
-            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+            buffers.bind()
             
             # Enable the vertex attribute array (assuming 0 is for vertices)
             glEnableVertexAttribArray(0)
-            glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, self.triangles_to_np_array().itemsize * 3, ctypes.c_void_p(0))
+            glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, self.positions.itemsize * 3, ctypes.c_void_p(0))
             
             # Draw filled triangles
+            t = profiler.start()
             glColor3f(0.99, 0.99, 0.99)
             glEnable(GL_POLYGON_OFFSET_FILL)
             glPolygonOffset(1.0, 1.0)
-            glDrawElements(GL_TRIANGLES, len(self.triangles) * 3, GL_UNSIGNED_INT, None)
+            self.draw_triangles(index_count, ranges)
             glDisable(GL_POLYGON_OFFSET_FILL)
+            profiler.stop("fill", t)
             
             # Draw wireframe/edges
-            glPolygonMode(GL_FRONT_AND_BACK, GL_LINE)
+            t = profiler.start()
             glColor3f(0, 0, 0)
             glLineWidth(1.5)
-            glDrawElements(GL_TRIANGLES, len(self.triangles) * 3, GL_UNSIGNED_INT, None)
-            
-            # Reset to fill mode for other renderings
-            glPolygonMode(GL_FRONT_AND_BACK, GL_FILL)
-
+            if buffers.edge_version != -1:
+                # Every edge once as a line
+                buffers.bind_edge_indices()
+                edge_count = self.draw_edges(buffers.edge_count, ranges if self.lod_level < 0 else None)
+            else:
+                # The edges are not built yet, draw the triangles in line mode
+                glPolygonMode(GL_FRONT_AND_BACK, GL_LINE)
+                self.draw_triangles(index_count, ranges)
+                edge_count = drawn_triangles * 3
+                # Reset to fill mode for other renderings
+                glPolygonMode(GL_FRONT_AND_BACK, GL_FILL)
+            profiler.count("drawn edges", edge_count)
+            profiler.stop("wireframe", t)
+
+            t = profiler.start()
             glColor3f(0.0, 0.0, 0.0)  # Set line color to white
             glBegin(GL_LINES)  # Begin drawing lines
             for i in self.lines:
@@ -212,29 +481,44 @@ class ParticleSystem:
             glEnd()
             # Revert settings (optional, depending on your render loop)
             glPolygonMode(GL_FRONT_AND_BACK, GL_FILL)
+            profiler.stop("lines", t)
 
+            t = profiler.start()
             glPolygonOffset(1.0, 1.0)
             glPointSize(5.0)
             glColor3f(0.11, 0.99, 0.11)
-            glDrawArrays(GL_POINTS, 0, len(self.particles))
+            if ranges is None:
+                glDrawArrays(GL_POINTS, 0, vertex_count)
+            else:
+                # Only the vertices of the visible clusters
+                buffers.bind_point_indices()
+                for first_triangle, triangle_count, first_point, point_count in ranges:
+                    glDrawElements(GL_POINTS, point_count, GL_UNSIGNED_INT, ctypes.c_void_p(first_point * 4))
+            profiler.stop("points", t)
 
         # Disable depth testing temporarily to ensure red particle is always on top
+        t = profiler.start()
         glDisable(GL_DEPTH_TEST)
 
+        if self.select_edge_enabled and self.edges is not None:
+            glLineWidth(3.0)
+            glBegin(GL_LINES)
+            glColor3f(0.99, 0.11, 0.11)
+            for index in self.edges.edges[self.selected_element_index]:
+                glVertex3fv(self.positions[index])
+            glEnd()
+
         if self.select_triangle_enabled:
-            triangle = self.triangles[self.selected_element_index]
+            triangle = self.indices[self.selected_element_index]
             glEnable(GL_POLYGON_OFFSET_FILL)
             glPolygonOffset(0.0, 0.0)  # Adjust these values as needed
             glPolygonMode(GL_FRONT_AND_BACK, GL_FILL)
             glBegin(GL_TRIANGLES)
             glColor3f(0.99, 0.11, 0.11)
                 
-            v0 = self.particles[triangle.index0].position
-            v1 = self.particles[triangle.index1].position
-            v2 = self.particles[triangle.index2].position
-            glVertex3fv([v0.x, v0.y, v0.z])
-            glVertex3fv([v1.x, v1.y, v1.z])
-            glVertex3fv([v2.x, v2.y, v2.z])
+            glVertex3fv(self.positions[triangle[0]])
+            glVertex3fv(self.positions[triangle[1]])
+            glVertex3fv(self.positions[triangle[2]])
             glEnd()
             glDisable(GL_POLYGON_OFFSET_FILL)
 
@@ -257,34 +541,102 @@ class ParticleSystem:
         if self.select_particle_enabled:
             glPolygonOffset(0.0, 0.0)
             glPointSize(6.0)
-            particle = self.particles[self.selected_element_index]
             glBegin(GL_POINTS)
             glColor3f(0.99, 0.11, 0.11)    
-            v0 = particle.position
-            glVertex3fv([v0.x, v0.y, v0.z])
+            glVertex3fv(self.positions[self.selected_element_index])
             glEnd()
 
         # Re-enable depth testing if required by other rendering steps
         glEnable(GL_DEPTH_TEST)
+        profiler.stop("highlight", t)
             
+    # Draw the bound triangles, all of them or the visible cluster ranges
+    def draw_triangles(self, index_count, ranges):
+        if ranges is None:
+            glDrawElements(GL_TRIANGLES, index_count, GL_UNSIGNED_INT, None)
+            return
+        for first_triangle, triangle_count, first_point, point_count in ranges:
+            glDrawElements(GL_TRIANGLES, triangle_count * 3, GL_UNSIGNED_INT, ctypes.c_void_p(first_triangle * 12))
+
+    # Draw the bound edges, all of them or the ones of the visible clusters. Returns the number of edges drawn.
+    def draw_edges(self, edge_count, ranges):
+        if ranges is None or self.edge_cluster_start is None:
+            glDrawElements(GL_LINES, edge_count * 2, GL_UNSIGNED_INT, None)
+            return edge_count
+        drawn = 0
+        for first_edge, count in edge_ranges(ranges, self.edge_cluster_start, self.clusters.cluster_size):
+            glDrawElements(GL_LINES, count * 2, GL_UNSIGNED_INT, ctypes.c_void_p(first_edge * 8))
+            drawn += count
+        return drawn
+
     # Highlight the vertex at the given index
     def highlight_vertex(self, index):
         self.select_particle_enabled = True
         self.select_triangle_enabled = False
+        self.select_edge_enabled = False
         self.selected_element_index = index
+        request_redisplay()
 
     # Highlight the triangle at the given index
     def highlight_triangle(self, index):
         self.select_particle_enabled = False
         self.select_triangle_enabled = True
+        self.select_edge_enabled = False
+        self.selected_element_index = index
+        request_redisplay()
+
+    # Highlight the edge at the given index of the unique edges
+    def highlight_edge(self, index):
+        self.select_particle_enabled = False
+        self.select_triangle_enabled = False
+        self.select_edge_enabled = True
         self.selected_element_index = index
+        self.get_edges()
+        request_redisplay()
+
+# Read-only sequence of Particle views over ParticleSystem.positions
+class ParticleList:
+    def __init__(self, particle_system):
+        self.particle_system = particle_system
+
+    def __len__(self):
+        return len(self.particle_system.positions)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("particle index out of range")
+        return Particle(index, self.particle_system)
+
+# Read-only sequence of Triangle views over ParticleSystem.indices
+class TriangleList:
+    def __init__(self, particle_system):
+        self.particle_system = particle_system
+
+    def __len__(self):
+        return len(self.particle_system.indices)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("triangle index out of range")
+        i0, i1, i2 = self.particle_system.indices[index]
+        return Triangle(int(i0), int(i1), int(i2), self.particle_system)
 
 class Particle:
-    # position is a Vector3
-    def __init__(self, position, particle_system):
-        self.position = position
+    # index is the row of the vertex in particle_system.positions
+    def __init__(self, index, particle_system):
+        self.index = index
         self.particle_system = particle_system
 
+    # position is a Vector3 copy of the current vertex position
+    @property
+    def position(self):
+        p = self.particle_system.positions[self.index]
+        return Vector3(float(p[0]), float(p[1]), float(p[2]))
+
 class Triangle:
     # v0, v1, v2 are integers representing the index of the vertex
     def __init__(self, index0, index1, index2, particle_system):
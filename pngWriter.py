@@ -0,0 +1,50 @@
+"""
+This file contains a minimal PNG writer for 8 bit RGB images, so no imaging library is needed.
+"""
+
+import struct
+import zlib
+import numpy as np
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+def png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+# Encode an HxWx3 uint8 image, the first row is the top of the image
+def encode_png(pixels, compression = 6):
+    pixels = np.ascontiguousarray(pixels, dtype=np.uint8)
+    height, width = pixels.shape[:2]
+    # Every row starts with filter type 0, no filtering
+    rows = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    rows[:, 1:] = pixels.reshape(height, width * 3)
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return PNG_SIGNATURE + png_chunk(b"IHDR", header) + png_chunk(b"IDAT", zlib.compress(rows.tobytes(), compression)) + png_chunk(b"IEND", b"")
+
+def write_png(path, pixels, compression = 6):
+    with open(path, "wb") as f:
+        f.write(encode_png(pixels, compression))
+
+# Decode a PNG written by write_png, for checks and golden image comparisons
+def read_png(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:8] != PNG_SIGNATURE:
+        raise ValueError("{} is not a PNG file".format(path))
+    pos = 8
+    idat = b""
+    width = height = 0
+    while pos < len(data):
+        length, kind = struct.unpack(">I4s", data[pos:pos + 8])
+        body = data[pos + 8:pos + 8 + length]
+        if kind == b"IHDR":
+            width, height, depth, color_type, compression, filtering, interlace = struct.unpack(">IIBBBBB", body)
+            if depth != 8 or color_type != 2 or interlace != 0:
+                raise ValueError("{}: only 8 bit RGB PNG files without interlacing are supported".format(path))
+        elif kind == b"IDAT":
+            idat += body
+        pos += 12 + length
+    rows = np.frombuffer(zlib.decompress(idat), dtype=np.uint8).reshape(height, width * 3 + 1)
+    if np.any(rows[:, 0] != 0):
+        raise ValueError("{}: filtered PNG rows are not supported".format(path))
+    return rows[:, 1:].reshape(height, width, 3).copy()
@@ -15,6 +15,9 @@ from pyMeshViewerUtils import *
 from instances import *
 import threading
 from terminalManager import *
+from renderScheduler import RenderScheduler
+from frameProfiler import FrameProfiler
+from commandServer import CommandQueue, CommandServer
 
 # Window dimensions
 width, height = 800, 600
@@ -23,39 +26,52 @@ PyMeshViewerUtils.height = height
 
 Instances.camera_instance = Camera()
 Instances.input_handler_instance = InputHandler(Instances.camera_instance, width, height)
+ParticleSystem.lod_auto_build = True
 model = OBJLoader('cube.obj')
 Instances.debuggerUI_instance = PyMeshViewerUI(width, height)
+Instances.render_scheduler_instance = RenderScheduler()
+Instances.frame_profiler_instance = FrameProfiler()
+Instances.command_queue_instance = CommandQueue()
+Instances.command_server_instance = CommandServer(Instances.command_queue_instance)
 
 server_up_event = threading.Event()
 
 
 def render_scene():
+    profiler = Instances.frame_profiler_instance
+    t = profiler.start()
     glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
-    glMatrixMode(GL_PROJECTION)
-    glLoadIdentity()
-    
-    # Setup perspective projection
-    gluPerspective(45.0, float(width)/float(height), 0.1, 50.0)
-    Instances.camera_instance.projection = glGetFloatv(GL_PROJECTION_MATRIX)
-
-    # Calculate view target based on camera's orientation
-    u, v, w = Instances.camera_instance.compute_direction_vectors()
-    target = Instances.camera_instance.camera_pos + w
 
+    # Perspective projection and look-at view, computed on the CPU so they need no glGet round trip
+    Instances.camera_instance.update_matrices(width, height)
+    glMatrixMode(GL_PROJECTION)
+    glLoadMatrixf(Instances.camera_instance.projection)
     glMatrixMode(GL_MODELVIEW)
-    glLoadIdentity()
-    # Set the view matrix using gluLookAt
-    gluLookAt(Instances.camera_instance.camera_pos[0], Instances.camera_instance.camera_pos[1], Instances.camera_instance.camera_pos[2], 
-              target[0], target[1], target[2],  # Look at the calculated target
-              0, 1, 0)  # Up vector
-    Instances.camera_instance.modelView = glGetFloatv(GL_MODELVIEW_MATRIX)
-    Instances.camera_instance.viewPort = glGetIntegerv(GL_VIEWPORT)
+    glLoadMatrixf(Instances.camera_instance.modelView)
+    profiler.stop("camera setup", t)
+
+    # Advance the animation playback to the current time
+    t = profiler.start()
+    animation_manager = Instances.particle_system_instance.animation_manager
+    if animation_manager is not None and animation_manager.animating:
+        animation_manager.update()
+        profiler.count("dropped frames", animation_manager.dropped_frames)
+    profiler.stop("animation", t)
 
     # render the model
+    t = profiler.start()
     Instances.particle_system_instance.render()
+    profiler.stop("particle system", t)
+
+    t = profiler.start()
     Instances.debuggerUI_instance.render()
+    profiler.stop("ui", t)
 
+    t = profiler.start()
     glutSwapBuffers()
+    profiler.stop("swap", t)
+    profiler.end_frame()
+    Instances.render_scheduler_instance.frame_rendered()
 
 def start_command_daemon():
     Instances.terminalManager_instance = TerminalManager()
@@ -71,7 +87,8 @@ def main():
     glutCreateWindow("3D Scene")
     glEnable(GL_DEPTH_TEST)
     glutDisplayFunc(render_scene)
-    glutIdleFunc(render_scene)
+    # Redraw on demand instead of from a busy idle loop
+    Instances.render_scheduler_instance.start()
     glutKeyboardFunc(Instances.input_handler_instance.keyboard)
     glutMouseFunc(Instances.input_handler_instance.mouse)
     Instances.input_handler_instance.mouseCallbacks.append(Instances.debuggerUI_instance.mouse_callback)
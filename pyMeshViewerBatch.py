@@ -0,0 +1,194 @@
+"""
+This is the batch entry point of the PyMeshViewer. It runs a command script over many meshes and animations
+without a window, a GLUT main loop or a prompt, e.g. on servers without a display.
+
+The script holds one terminal command per line, blank lines and lines starting with # are skipped.
+{input} is replaced by the path of the file being processed and {name} by its name without the extension:
+
+    animation goto 10
+    animation trajectory 3,17
+    animation trajectory export out/{name}_trajectory.csv
+
+Every input is processed in its own worker process: .obj files are loaded as the mesh, animations (.json or binary)
+are loaded into an empty particle system before the script runs. Commands that need the render loop are skipped.
+
+Run with: python pyMeshViewerBatch.py script.txt mesh1.obj anim1.pmanim ... [--workers 4] [--output results.json]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+# Commands that only make sense with a window and a running render loop
+SKIPPED_COMMANDS = {
+    ("render",): "needs the render loop",
+    ("stats",): "needs the render loop",
+    ("animation", "animate"): "playback needs the render loop, use animation goto",
+    ("animation", "pause"): "playback needs the render loop",
+    ("animation", "resume"): "playback needs the render loop",
+    ("terminal",): "needs the interactive terminal",
+}
+
+ANIMATION_SUFFIXES = (".json", ".pmanim")
+
+# Collects the terminal output of the commands of one input
+class BatchTerminal:
+    def __init__(self):
+        self.lines = []
+
+    def tprint(self, s, source = None):
+        self.lines.append(s)
+
+    def take_lines(self):
+        lines = self.lines
+        self.lines = []
+        return lines
+
+def read_script(path):
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.strip().startswith("#")]
+
+def skip_reason(command):
+    words = tuple(command.split(" "))
+    for prefix, reason in SKIPPED_COMMANDS.items():
+        if words[:len(prefix)] == prefix:
+            return reason
+    return None
+
+# Runs once in every worker process: replace OpenGL by stubs and set up the viewer singletons without a window
+def init_worker():
+    from headlessGL import install_stub_gl
+    install_stub_gl()
+
+    from instances import Instances
+    from camera import Camera
+    from inputHandler import InputHandler
+    from particleSystem import ParticleSystem
+    Instances.camera_instance = Camera()
+    Instances.camera_instance.update_matrices(800, 600)
+    Instances.input_handler_instance = InputHandler(Instances.camera_instance, 800, 600)
+    InputHandler.load_in_background = False
+    ParticleSystem.edges_in_background = False
+    Instances.terminalManager_instance = BatchTerminal()
+
+# Load the input into a new particle system
+def load_input(path):
+    import numpy as np
+    from instances import Instances
+    from OBJLoader import OBJLoader
+    from particleSystem import ParticleSystem
+
+    previous = Instances.particle_system_instance
+    if previous is not None and previous.animation_manager is not None:
+        previous.animation_manager.close()
+    Instances.input_handler_instance.mouseCallbacksWithRayIntersection.clear()
+    if path.lower().endswith(ANIMATION_SUFFIXES):
+        Instances.particle_system_instance = ParticleSystem(np.empty((0, 3), dtype=np.float32), np.empty((0, 3), dtype=np.uint32), indexOffset=0)
+        Instances.input_handler_instance.command("la " + path)
+    else:
+        OBJLoader(path)
+
+# Process one input file with the script, returns its report
+def process_input(task):
+    path, commands = task
+    from instances import Instances
+    terminal = Instances.terminalManager_instance
+    name = os.path.splitext(os.path.basename(path))[0]
+    report = {"input": path, "ok": True, "commands": []}
+
+    start_time = time.perf_counter()
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output):
+            load_input(path)
+    except Exception as e:
+        report["ok"] = False
+        report["error"] = "{}: {}".format(type(e).__name__, e)
+    report["load_s"] = time.perf_counter() - start_time
+    report["load_output"] = output.getvalue().splitlines() + terminal.take_lines()
+    if not report["ok"]:
+        report["total_s"] = report["load_s"]
+        return report
+
+    for command in commands:
+        command = command.replace("{input}", path).replace("{name}", name)
+        result = {"command": command}
+        reason = skip_reason(command)
+        if reason is not None:
+            result["skipped"] = reason
+            report["commands"].append(result)
+            continue
+
+        command_start = time.perf_counter()
+        output = io.StringIO()
+        try:
+            with contextlib.redirect_stdout(output):
+                Instances.input_handler_instance.command(command)
+                # Stands in for the start of a frame, so the next command sees the new positions
+                Instances.particle_system_instance.acquire_frame()
+            result["ok"] = True
+        except Exception as e:
+            result["ok"] = False
+            result["error"] = "{}: {}".format(type(e).__name__, e)
+            report["ok"] = False
+        result["time_s"] = time.perf_counter() - command_start
+        result["output"] = output.getvalue().splitlines() + terminal.take_lines()
+        report["commands"].append(result)
+
+    report["total_s"] = time.perf_counter() - start_time
+    return report
+
+# Run the script over all inputs, in worker_count processes. Reports come back in input order.
+def run_batch(script_path, inputs, worker_count = None):
+    commands = read_script(script_path)
+    tasks = [(path, commands) for path in inputs]
+    if worker_count is None:
+        worker_count = min(len(inputs), os.cpu_count() or 1)
+    if worker_count <= 1:
+        init_worker()
+        return [process_input(task) for task in tasks]
+    with multiprocessing.Pool(worker_count, initializer=init_worker) as pool:
+        return pool.map(process_input, tasks, chunksize=1)
+
+def print_report(report, verbose):
+    status = "ok" if report["ok"] else "FAILED"
+    print("{}: {} (load {:.3f} s, total {:.3f} s)".format(report["input"], status, report["load_s"], report["total_s"]))
+    if "error" in report:
+        print("    " + report["error"])
+    for result in report["commands"]:
+        if "skipped" in result:
+            print("    {:<40} skipped: {}".format(result["command"], result["skipped"]))
+            continue
+        print("    {:<40} {:8.3f} ms{}".format(result["command"], result["time_s"] * 1000.0, "" if result["ok"] else "  " + result["error"]))
+        if verbose:
+            for line in result["output"]:
+                print("        " + line)
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Run a PyMeshViewer command script over meshes and animations without a window")
+    parser.add_argument("script", help="command script, one command per line")
+    parser.add_argument("inputs", nargs="+", help="OBJ meshes and JSON or binary animations")
+    parser.add_argument("--workers", type=int, help="worker processes, one per input up to the CPU count by default")
+    parser.add_argument("--output", help="write the reports as JSON")
+    parser.add_argument("--verbose", action="store_true", help="print the output of every command")
+    args = parser.parse_args(argv)
+
+    start_time = time.perf_counter()
+    reports = run_batch(args.script, args.inputs, args.workers)
+    for report in reports:
+        print_report(report, args.verbose)
+    failed = sum(1 for report in reports if not report["ok"])
+    print("{} inputs in {:.2f} s, {} failed".format(len(reports), time.perf_counter() - start_time, failed))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(reports, f, indent=1)
+    return 1 if failed > 0 else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,684 @@
+"""
+This file contains benchmarks for the hot paths of the PyMeshViewer.
+
+The suite runs without a display or GPU, the OpenGL modules are replaced by the stubs of headlessGL.
+It generates grid meshes and animations of 1k to 10M vertices and records the time and the peak traced
+memory of every operation into a JSON file, so two runs can be compared.
+
+Run with: python pyMeshViewerBenchmarks.py [--sizes 1000 100000] [--output results.json] [--compare old.json]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from instances import Instances
+from vector3 import Vector3
+
+# Create a flat grid mesh in the z = 0 plane with about vertex_count vertices
+def make_grid_mesh(vertex_count):
+    side = max(2, int(round(np.sqrt(vertex_count))))
+    xs, ys = np.meshgrid(np.linspace(0.0, 1.0, side, dtype=np.float32), np.linspace(0.0, 1.0, side, dtype=np.float32))
+    positions = np.stack([xs.ravel(), ys.ravel(), np.zeros(side * side, dtype=np.float32)], axis=1)
+
+    row, col = np.meshgrid(np.arange(side - 1), np.arange(side - 1), indexing="ij")
+    corner = (row * side + col).ravel()
+    indices = np.empty((len(corner) * 2, 3), dtype=np.uint32)
+    indices[0::2] = np.stack([corner, corner + 1, corner + side], axis=1)
+    indices[1::2] = np.stack([corner + 1, corner + side + 1, corner + side], axis=1)
+    return positions, indices
+
+# Stand-ins for the viewer singletons the ParticleSystem talks to
+# Does not keep the registered callbacks, so benchmarked particle systems can be freed
+class _NullCallbackList(list):
+    def append(self, callback):
+        pass
+
+class _NullInputHandler:
+    def __init__(self):
+        self.mouseCallbacksWithRayIntersection = _NullCallbackList()
+
+class _NullTerminal:
+    def tprint(self, s, source = None):
+        pass
+
+def install_null_instances():
+    if Instances.input_handler_instance is None:
+        Instances.input_handler_instance = _NullInputHandler()
+    if Instances.terminalManager_instance is None:
+        Instances.terminalManager_instance = _NullTerminal()
+
+def make_particle_system(positions, indices):
+    from particleSystem import ParticleSystem
+    install_null_instances()
+    return ParticleSystem(positions, indices, indexOffset=0)
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+# The original per-object picking loop, kept as the baseline
+def select_triangle_per_object(particle_system, origin, direction):
+    smallest_distance = float("inf")
+    closest_hit_triangle = -1
+    for i in range(len(particle_system.triangles)):
+        distance = particle_system.triangles[i].intersect_with_ray(origin, direction)
+        if distance is not None and distance < smallest_distance:
+            closest_hit_triangle = i
+            smallest_distance = distance
+    return closest_hit_triangle, smallest_distance
+
+# OBJ text the line by line parse of the original loader accepts: indentation, comments, texture and normal indices,
+# negative indices, polygons and Windows line ends
+OBJ_SYNTAX_SAMPLE = b"""# comment line
+mtllib sample.mtl
+  v 0 0 0
+\tv 1 0 0 # inline comment
+v 1 1 0#tight comment
+   # v 9 9 9 indented comment
+vt 0.5 0.5
+vn 0 0 1
+v 0 1 0 1.0
+  f 1/1/1 2//1 3 # tail # second hash
+\tf -4 -2 -1\r
+f 1 2 3 4#
+\t
+"""
+
+# The original loader loop, with comments cut and polygons fanned like OBJParser does
+def parse_obj_per_line(path):
+    vertices = []
+    faces = []
+    with open(path, "r") as f:
+        for line in f:
+            parts = line.split("#")[0].split()
+            if len(parts) == 0:
+                continue
+            if parts[0] == "v":
+                vertices.append([float(x) for x in parts[1:4]])
+            elif parts[0] == "f":
+                corners = [int(p.split("/")[0]) for p in parts[1:]]
+                corners = [c - 1 if c > 0 else len(vertices) + c for c in corners]
+                faces.extend([corners[0], corners[i], corners[i + 1]] for i in range(1, len(corners) - 1))
+    return np.array(vertices, dtype=np.float32), np.array(faces, dtype=np.uint32)
+
+# The vectorized OBJ parser against the line by line parse, on the syntax sample split over every chunk size
+# and on the grid mesh, whose parse speed is reported
+def bench_obj_parser(vertex_count=100000):
+    from objParser import OBJParser
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "sample.obj")
+        with open(path, "wb") as f:
+            f.write(OBJ_SYNTAX_SAMPLE)
+        expected_vertices, expected_indices = parse_obj_per_line(path)
+        for chunk_size in range(4, len(OBJ_SYNTAX_SAMPLE) + 2):
+            vertices, indices = OBJParser(chunk_size).parse(path)
+            assert np.array_equal(vertices, expected_vertices) and np.array_equal(indices, expected_indices), \
+                "OBJParser disagrees with the line by line parse, chunk size {}".format(chunk_size)
+
+        with open(path, "wb") as f:
+            f.write(b"v 0 0 0\nv 1 0 0\nv 0 1 0\nf 1 2 3.5\n")
+        try:
+            OBJParser().parse(path)
+            raise AssertionError("a fractional face index was accepted")
+        except ValueError:
+            pass
+
+        positions, indices = make_grid_mesh(vertex_count)
+        path = os.path.join(directory, "grid.obj")
+        write_obj(path, positions, indices)
+        parser = OBJParser()
+        vertices, parsed_indices = parser.parse(path)
+        expected_vertices, expected_indices = parse_obj_per_line(path)
+        assert np.array_equal(vertices, expected_vertices) and np.array_equal(parsed_indices.reshape(-1, 3), expected_indices.reshape(-1, 3))
+    result = {"vertices": len(vertices), "triangles": len(parsed_indices), "parse_s": parser.parse_time, "mb_per_s": parser.mb_per_second()}
+    print("obj_parser", result)
+    return result
+
+# Compare the vectorized ray picking against the per-object path
+def bench_select_triangle(vertex_counts=(1000, 10000, 100000), per_object_limit=100000):
+    from rayIntersection import nearest_ray_triangle_hit
+
+    origin = Vector3(0.37, 0.61, 5.0)
+    direction = Vector3(0.0, 0.0, -1.0)
+    results = []
+    for vertex_count in vertex_counts:
+        positions, indices = make_grid_mesh(vertex_count)
+        particle_system = make_particle_system(positions, indices)
+
+        vectorized_time, vectorized_hit = timed(nearest_ray_triangle_hit, origin, direction, particle_system.positions, particle_system.indices)
+        result = {"triangles": len(indices), "vectorized_s": vectorized_time}
+        if vertex_count <= per_object_limit:
+            per_object_time, per_object_hit = timed(select_triangle_per_object, particle_system, origin, direction)
+            assert per_object_hit[0] == vectorized_hit[0], "vectorized picking disagrees with the per-object path"
+            result["per_object_s"] = per_object_time
+            result["speedup"] = per_object_time / max(vectorized_time, 1e-9)
+        results.append(result)
+        print("select_triangle", result)
+    return results
+
+# Build, refit and query timings of the picking BVH
+def bench_bvh(vertex_counts=(10000, 100000, 1000000)):
+    from bvh import BVH
+
+    origin = Vector3(0.37, 0.61, 5.0)
+    direction = Vector3(0.0, 0.0, -1.0)
+    results = []
+    for vertex_count in vertex_counts:
+        positions, indices = make_grid_mesh(vertex_count)
+        bvh = BVH(positions, indices)
+        positions[:, 2] = np.sin(positions[:, 0] * 10.0) * 0.1
+        bvh.refit(positions)
+        query_time, hit = timed(bvh.intersect, origin, direction, positions)
+        result = {"triangles": len(indices), "nodes": bvh.node_count(), "build_s": bvh.build_time, "refit_s": bvh.refit_time, "query_s": query_time}
+        results.append(result)
+        print("bvh", result)
+    return results
+
+# Bytes uploaded to the GPU per animation frame, counted by the mock GL backend
+def bench_frame_uploads(vertex_count=100000, frame_count=10):
+    from headlessGL import MockGLBackend
+    from particleSystem import ParticleSystem
+
+    backend = MockGLBackend()
+    ParticleSystem.gl_backend = backend
+    # The edge buffer is uploaded with the first frame, not whenever a background build finishes
+    ParticleSystem.edges_in_background = False
+    try:
+        positions, indices = make_grid_mesh(vertex_count)
+        particle_system = make_particle_system(positions, indices)
+        particle_system.upload_buffers()
+        backend.end_frame()
+        for i in range(frame_count):
+            particle_system.positions[:, 2] = np.sin(positions[:, 0] * i)
+            particle_system.positions_version += 1
+            particle_system.upload_buffers()
+            backend.end_frame()
+        # A frame without new positions uploads nothing
+        particle_system.upload_buffers()
+        backend.end_frame()
+    finally:
+        ParticleSystem.gl_backend = None
+        ParticleSystem.edges_in_background = True
+
+    # The triangles and the unique edges are uploaded once, never again while only the positions change
+    edges_nbytes = particle_system.edges.edges.nbytes
+    first, streamed, idle = backend.bytes_per_frame[0], backend.bytes_per_frame[1:-1], backend.bytes_per_frame[-1]
+    assert first[MockGLBackend.GL_ELEMENT_ARRAY_BUFFER] == indices.nbytes + edges_nbytes
+    assert all(f[MockGLBackend.GL_ELEMENT_ARRAY_BUFFER] == 0 and f[MockGLBackend.GL_ARRAY_BUFFER] == positions.nbytes for f in streamed)
+    assert sum(idle.values()) == 0
+    result = {"vertices": len(positions), "first_frame_bytes": sum(first.values()), "edge_bytes": edges_nbytes, "per_frame_bytes": streamed[0][MockGLBackend.GL_ARRAY_BUFFER],
+              "vertex_buffers": len(particle_system.mesh_buffers.vertex_buffers), "orphaned": backend.orphan_count}
+    print("frame_uploads", result)
+    return result
+
+# Producer threads publish frames while the calling thread renders and picks like the GLUT thread would.
+# Every frame has all z equal to its frame number, so a torn or half-written frame shows up as mixed z values.
+def bench_frame_slot_stress(vertex_count=20000, producer_count=2, seconds=2.0):
+    import threading
+
+    positions, indices = make_grid_mesh(vertex_count)
+    particle_system = make_particle_system(positions, indices)
+    Instances.camera_instance = make_camera()
+    origin, direction = Vector3(0.37, 0.61, 5.0), Vector3(0.0, 0.0, -1.0)
+
+    stop = threading.Event()
+    errors = []
+
+    def produce(offset):
+        frame = positions.copy()
+        number = offset
+        try:
+            while not stop.is_set():
+                frame[:, 2] = number
+                particle_system.update_vertices(frame)
+                number += producer_count
+        except Exception as e:
+            errors.append(e)
+
+    producers = [threading.Thread(target=produce, args=(i,)) for i in range(producer_count)]
+    for producer in producers:
+        producer.start()
+
+    frames_rendered, torn_frames, picks = 0, 0, 0
+    deadline = time.perf_counter() + seconds
+    try:
+        while time.perf_counter() < deadline:
+            if particle_system.acquire_frame():
+                frames_rendered += 1
+            z = particle_system.positions[:, 2]
+            if z.min() != z.max():
+                torn_frames += 1
+            particle_system.select_triangle(origin, direction)
+            particle_system.select_particle(400, 300)
+            picks += 1
+    finally:
+        stop.set()
+        for producer in producers:
+            producer.join()
+
+    slot = particle_system.frame_slot
+    assert not errors, "producer failed: {}".format(errors[0])
+    assert torn_frames == 0, "{} torn frames".format(torn_frames)
+    result = {"vertices": len(positions), "producers": producer_count, "frames_written": slot.frames_written,
+              "frames_rendered": frames_rendered, "frames_replaced": slot.frames_overwritten, "picks": picks, "torn_frames": torn_frames}
+    print("frame_slot_stress", result)
+    return result
+
+# Command socket throughput against a stand-in viewer: the real InputHandler and TerminalManager loop,
+# and a thread standing in for the GLUT timer that runs the queued commands every 1/60 s
+def bench_command_socket(vertex_count=10000, command_count=5000, round_trips=50):
+    import asyncio
+    import threading
+    from camera import Camera
+    from inputHandler import InputHandler
+    from terminalManager import TerminalManager
+    from commandServer import CommandQueue, CommandServer
+    from pyMeshViewerClient import CommandClient
+
+    saved = (Instances.camera_instance, Instances.input_handler_instance, Instances.terminalManager_instance, Instances.particle_system_instance)
+    Instances.camera_instance = make_camera()
+    Instances.input_handler_instance = InputHandler(Instances.camera_instance, 800, 600)
+    Instances.terminalManager_instance = TerminalManager()
+    positions, indices = make_grid_mesh(vertex_count)
+    Instances.particle_system_instance = make_particle_system(positions, indices)
+
+    terminal = Instances.terminalManager_instance
+    loop_thread = threading.Thread(target=terminal.loop.run_forever, daemon=True)
+    loop_thread.start()
+    command_queue = CommandQueue()
+    server = CommandServer(command_queue, port=0)
+    asyncio.run_coroutine_threadsafe(server.start(), terminal.loop).result()
+
+    stop = threading.Event()
+    ticks = []
+
+    def render_thread():
+        while not stop.is_set():
+            start = time.perf_counter()
+            command_queue.run_pending()
+            ticks.append(time.perf_counter() - start)
+            time.sleep(1.0 / 60.0)
+
+    renderer = threading.Thread(target=render_thread)
+    renderer.start()
+    try:
+        client = CommandClient(port=server.port)
+        commands = ["hl v {}".format(i % len(positions)) if i % 2 == 0 else "hl t {}".format(i % len(indices)) for i in range(command_count)]
+        pipelined_time, responses = timed(client.send_batch, commands)
+        assert len(responses) == command_count and all(r["ok"] for r in responses)
+
+        round_trip_time, last = timed(lambda: [client.send("terminal stats") for i in range(round_trips)])
+        assert last[-1]["output"][0].startswith("Terminal:")
+        client.close()
+    finally:
+        stop.set()
+        renderer.join()
+        asyncio.run_coroutine_threadsafe(server.stop(), terminal.loop).result()
+        terminal.loop.call_soon_threadsafe(terminal.loop.stop)
+        loop_thread.join()
+        Instances.camera_instance, Instances.input_handler_instance, Instances.terminalManager_instance, Instances.particle_system_instance = saved
+
+    result = {"commands": command_count, "pipelined_per_s": command_count / pipelined_time, "round_trip_ms": round_trip_time / round_trips * 1000.0,
+              "longest_tick_ms": max(ticks) * 1000.0, "budget_ms": command_queue.time_budget * 1000.0}
+    print("command_socket", result)
+    return result
+
+# Memory and decode speed of the compressed animation storage
+def bench_compressed_animation(vertex_count=20000, frame_count=300, error_bounds=(1e-3, 1e-4, 1e-5)):
+    from compressedAnimation import CompressedFrames
+
+    positions, indices = make_grid_mesh(vertex_count)
+    frames = make_animation_frames(positions, frame_count)
+    results = []
+    for error_bound in error_bounds:
+        compressed = CompressedFrames(frames, error_bound)
+        max_error = max(float(np.abs(compressed[i] - frames[i]).max()) for i in range(frame_count))
+        assert max_error <= error_bound * 1.001, "compressed frames exceed the error bound"
+        result = {"vertices": len(positions), "frames": frame_count, "error_bound": error_bound, "ratio": compressed.compression_ratio(),
+                  "max_error": max_error, "encode_s": compressed.encode_time, "decode_fps": compressed.decode_fps()}
+        results.append(result)
+        print("compressed_animation", result)
+    return results
+
+# Pixels of a fitted thumbnail that the mesh covers, as render_thumbnail sets up the camera
+def thumbnail_coverage(positions, indices, width=256, height=192):
+    from camera import Camera
+    from softwareRasterizer import SoftwareRasterizer, fit_camera, fit_clip_planes
+    camera = fit_camera(Camera(), positions, aspect=width / height)
+    near, far = fit_clip_planes(camera, positions)
+    image = SoftwareRasterizer(width, height, near=near, far=far).render(positions, indices, camera)
+    return (image != image[0, 0]).any(axis=2)
+
+# Software rasterizer: thumbnails and full frames, and the tiled mode, which has to give the same image.
+# A fitted thumbnail has to look the same at any scale of the mesh.
+def bench_software_rasterizer(vertex_counts=(1000, 100000, 1000000), sizes=((256, 192), (1920, 1080)), worker_count=4):
+    from softwareRasterizer import SoftwareRasterizer, render_tiled
+
+    results = []
+    for vertex_count in vertex_counts:
+        positions, indices = make_grid_mesh(vertex_count)
+        positions[:, 2] = make_animation_frames(positions, 1)[0, :, 2]
+        for width, height in sizes:
+            rasterizer = SoftwareRasterizer(width, height)
+            camera = make_camera()
+            start = time.perf_counter()
+            image = rasterizer.render(positions, indices, camera, highlight=("t", 0))
+            single = time.perf_counter() - start
+            start = time.perf_counter()
+            tiled = render_tiled(rasterizer, positions, indices, camera, highlight=("t", 0), worker_count=worker_count)
+            tiled_time = time.perf_counter() - start
+            assert np.array_equal(image, tiled), "tiled image differs"
+            result = {"vertices": len(positions), "size": "{}x{}".format(width, height), "single_s": single, "tiled_s": tiled_time, "workers": worker_count}
+            results.append(result)
+            print("software_rasterizer", result)
+
+    positions, indices = make_grid_mesh(vertex_counts[0])
+    positions[:, 2] = make_animation_frames(positions, 1)[0, :, 2]
+    coverage = thumbnail_coverage(positions, indices)
+    for scale in (100.0, 10000.0):
+        scaled = thumbnail_coverage(positions * scale, indices)
+        assert scaled.any(), "the thumbnail of the mesh scaled by {:g} is empty".format(scale)
+        assert (scaled != coverage).mean() < 0.01, "the thumbnail of the mesh scaled by {:g} differs".format(scale)
+    result = {"vertices": len(positions), "thumbnail_coverage": float(coverage.mean())}
+    results.append(result)
+    print("software_rasterizer", result)
+    return results
+
+# LOD chain: build time from the mesh, load time from the cache, and the triangles of every level
+def bench_lod_chain(vertex_counts=(100000, 1000000)):
+    from meshLOD import load_or_build
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for vertex_count in vertex_counts:
+            positions, indices = make_grid_mesh(vertex_count)
+            positions[:, 2] = make_animation_frames(positions, 1)[0, :, 2]
+            path = os.path.join(directory, "grid_{}.obj".format(vertex_count))
+            write_obj(path, positions, indices)
+            start = time.perf_counter()
+            chain, cached = load_or_build(path, positions, indices)
+            build_time = time.perf_counter() - start
+            start = time.perf_counter()
+            chain, cached = load_or_build(path, positions, indices)
+            load_time = time.perf_counter() - start
+            assert cached, "LOD cache was not used"
+            result = {"vertices": len(positions), "triangles": len(indices), "build_s": build_time, "cache_load_s": load_time,
+                      "level_triangles": [len(level.indices) for level in chain.levels]}
+            results.append(result)
+            print("lod_chain", result)
+    return results
+
+# An animation loaded over an OBJ must not be drawn through the cached chain of the OBJ, even with the same topology,
+# and must not overwrite that cache. Also times the mesh hash that keys the cache.
+def bench_lod_cache_validation(vertex_count=100000):
+    from animationFormat import AnimationData
+    from meshLOD import load_or_build, cache_path_for, mesh_digest
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        positions, indices = make_grid_mesh(vertex_count)
+        path = os.path.join(directory, "grid.obj")
+        write_obj(path, positions, indices)
+        chain, cached = load_or_build(path, positions, indices)
+        cache_bytes = open(cache_path_for(path), "rb").read()
+
+        # The viewer state after OBJLoader('grid.obj'), then an animation with the same topology elsewhere in space
+        particle_system = make_particle_system(positions, indices)
+        particle_system.source_path = path
+        frames = positions[np.newaxis] * 100.0 + 50.0
+        particle_system.load_animation(AnimationData(frames, ["frame"], indices))
+        assert particle_system.source_path is None, "the animation kept the path of the OBJ"
+        particle_system.build_lod(background=False)
+        center = particle_system.lod_chain.center
+        assert np.all((center >= 50.0) & (center <= 150.0)), "the animation is drawn with the LOD chain of the OBJ"
+        assert open(cache_path_for(path), "rb").read() == cache_bytes, "the animation overwrote the LOD cache of the OBJ"
+
+        # Same file and counts, other positions: the cache is rebuilt instead of used
+        chain, cached = load_or_build(path, frames[0], indices)
+        assert not cached, "the LOD cache was used for other positions"
+        start = time.perf_counter()
+        mesh_digest(positions, indices)
+        results = {"vertices": len(positions), "triangles": len(indices), "mesh_digest_s": time.perf_counter() - start}
+    print("lod_cache_validation", results)
+    return results
+
+# Frustum culling of the grid mesh seen from close up: cluster build, refit after an animation frame and cull
+def bench_frustum_culling(vertex_counts=(100000, 1000000)):
+    from meshClusters import MeshClusters
+
+    results = []
+    for vertex_count in vertex_counts:
+        positions, indices = make_grid_mesh(vertex_count)
+        start = time.perf_counter()
+        clusters = MeshClusters(positions, indices)
+        build_time = time.perf_counter() - start
+
+        camera = make_camera()
+        camera.camera_pos = Vector3(0.3, 0.3, 0.3)
+        camera.update_matrices(800, 600)
+        frame = make_animation_frames(positions, 1)[0]
+        start = time.perf_counter()
+        clusters.refit(frame, 1)
+        refit_time = time.perf_counter() - start
+        start = time.perf_counter()
+        clusters.cull(camera.modelView, camera.projection)
+        ranges = list(clusters.visible_ranges())
+        cull_time = time.perf_counter() - start
+        result = {"triangles": len(indices), "clusters": clusters.cluster_count(), "build_s": build_time, "refit_s": refit_time, "cull_s": cull_time,
+                  "drawn_triangles": clusters.drawn_triangles, "culled_triangles": clusters.culled_triangles, "draw_calls": len(ranges)}
+        results.append(result)
+        print("frustum_culling", result)
+    return results
+
+# Unique edge list of the wireframe against the triangle edges a line mode wireframe draws
+def bench_mesh_edges(vertex_counts=(100000, 1000000)):
+    from meshEdges import MeshEdges
+    from meshClusters import MeshClusters
+
+    results = []
+    for vertex_count in vertex_counts:
+        positions, indices = make_grid_mesh(vertex_count)
+        positions[:, 2] = make_animation_frames(positions, 1)[0, :, 2]
+        start = time.perf_counter()
+        edges = MeshEdges(indices, len(positions))
+        build_time = time.perf_counter() - start
+        start = time.perf_counter()
+        features = edges.feature_mask(positions, indices, 30.0)
+        feature_time = time.perf_counter() - start
+        clusters = MeshClusters(positions, indices)
+        start = time.perf_counter()
+        edge_list, cluster_start = edges.draw_list(None, clusters)
+        cluster_order_time = time.perf_counter() - start
+
+        triangle_edges = len(indices) * 3
+        result = {"triangles": len(indices), "triangle_edges": triangle_edges, "unique_edges": edges.edge_count(),
+                  "feature_edges": int(features.sum()), "lines_saved": 1.0 - edges.edge_count() / triangle_edges,
+                  "build_s": build_time, "features_s": feature_time, "cluster_order_s": cluster_order_time, "edge_buffer_bytes": edge_list.nbytes}
+        results.append(result)
+        print("mesh_edges", result)
+    return results
+
+SUITE_SIZES = (1000, 10000, 100000, 1000000, 10000000)
+ANIMATION_FRAMES = 3
+
+# Write the mesh as an OBJ file, in blocks so large meshes do not need the whole text in memory
+def write_obj(path, positions, indices, block = 1000000):
+    with open(path, "w") as f:
+        for start in range(0, len(positions), block):
+            np.savetxt(f, positions[start:start + block], fmt="v %.6f %.6f %.6f")
+        for start in range(0, len(indices), block):
+            np.savetxt(f, indices[start:start + block].astype(np.int64) + 1, fmt="f %d %d %d")
+
+# Animation frames of the grid mesh, a wave travelling over the grid
+def make_animation_frames(positions, frame_count = ANIMATION_FRAMES):
+    frames = np.repeat(positions[np.newaxis], frame_count, axis=0)
+    for i in range(frame_count):
+        frames[i, :, 2] = 0.05 * np.sin(positions[:, 0] * 10.0 + i * 0.5)
+    return frames
+
+# The animation in the JSON schema, as json.load returns it
+def make_animation_dict(frames, indices):
+    return {
+        "frames": [{"type": "frame", "points": [{"X": float(x), "Y": float(y), "Z": float(z)} for x, y, z in frame.tolist()]} for frame in frames],
+        "triangle_indices": [{"A": int(a), "B": int(b), "C": int(c)} for a, b, c in indices.tolist()],
+    }
+
+# A camera looking down at the grid mesh, with the matrices the viewer would compute for an 800x600 window
+def make_camera():
+    from camera import Camera
+    camera = Camera()
+    camera.camera_pos = Vector3(0.5, 0.5, 1.5)
+    camera.update_matrices(800, 600)
+    return camera
+
+# Run setup() and operation(*setup()) repeat times, keeping the best and mean time,
+# then once more with tracemalloc to record the peak memory allocated by the operation
+def measure(setup, operation, repeat = 3, trace_memory = True):
+    times = []
+    # The loaders print their own timings, keep them out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(repeat):
+            args = setup()
+            start = time.perf_counter()
+            operation(*args)
+            times.append(time.perf_counter() - start)
+            del args
+
+        result = {"time_s": min(times), "mean_s": sum(times) / len(times), "repeat": repeat}
+        if trace_memory:
+            args = setup()
+            tracemalloc.start()
+            try:
+                operation(*args)
+                result["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+    return result
+
+# Time every hot path of the viewer for one mesh size
+def bench_mesh_size(vertex_count, directory, repeat = 3, trace_memory = True, json_limit = 100000):
+    from OBJLoader import OBJLoader
+    from animationFormat import AnimationData, load_binary_animation
+
+    positions, indices = make_grid_mesh(vertex_count)
+    Instances.camera_instance = make_camera()
+    click_x, click_y = 400, 300
+    origin, direction = Vector3(0.37, 0.61, 5.0), Vector3(0.0, 0.0, -1.0)
+
+    obj_path = os.path.join(directory, "grid_{}.obj".format(vertex_count))
+    write_obj(obj_path, positions, indices)
+    frames = make_animation_frames(positions)
+    animation_path = os.path.join(directory, "grid_{}.pmanim".format(vertex_count))
+    AnimationData(frames, ["frame"] * len(frames), indices).save_binary(animation_path)
+
+    def fresh():
+        return (make_particle_system(positions, indices),)
+
+    def picked(particle_system):
+        particle_system.select_triangle(origin, direction)
+        particle_system.select_particle(click_x, click_y)
+        return (particle_system,)
+
+    cases = [
+        ("OBJLoader", lambda: (obj_path,), lambda path: OBJLoader(path, use_cache=False)),
+        ("OBJLoader cached", lambda: (OBJLoader(obj_path, use_cache=True) and obj_path,), lambda path: OBJLoader(path, use_cache=True)),
+        ("particles_to_np_array", fresh, lambda ps: ps.particles_to_np_array()),
+        ("triangles_to_np_array", fresh, lambda ps: ps.triangles_to_np_array()),
+        ("select_triangle first", fresh, lambda ps: ps.select_triangle(origin, direction)),
+        ("select_triangle", lambda: picked(*fresh()), lambda ps: ps.select_triangle(origin, direction)),
+        ("select_particle first", fresh, lambda ps: ps.select_particle(click_x, click_y)),
+        ("select_particle", lambda: picked(*fresh()), lambda ps: ps.select_particle(click_x, click_y)),
+        ("load_animation binary", lambda: (make_particle_system(positions, indices), load_binary_animation(animation_path)),
+         lambda ps, data: ps.load_animation(data)),
+    ]
+    if vertex_count <= json_limit:
+        animation_dict = make_animation_dict(frames, indices)
+        cases.append(("load_animation json", lambda: (make_particle_system(positions, indices), animation_dict), lambda ps, data: ps.load_animation(data)))
+
+    results = []
+    for operation, setup, run in cases:
+        result = {"operation": operation, "vertices": len(positions), "triangles": len(indices)}
+        result.update(measure(setup, run, repeat, trace_memory))
+        results.append(result)
+        print("{:<24} {:>10} vertices  {:10.3f} ms  {:>10}".format(operation, len(positions), result["time_s"] * 1000.0,
+              "{:.1f} MB".format(result["peak_bytes"] / (1024.0 * 1024.0)) if "peak_bytes" in result else ""))
+
+    for path in (obj_path, obj_path + ".meshcache", animation_path):
+        if os.path.exists(path):
+            os.remove(path)
+    return results
+
+def run_suite(sizes = SUITE_SIZES, repeat = 3, trace_memory = True, json_limit = 100000):
+    install_null_instances()
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for vertex_count in sizes:
+            results.extend(bench_mesh_size(vertex_count, directory, repeat, trace_memory, json_limit))
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+# Print the time ratio of every operation against an earlier results file
+def compare_results(previous, current):
+    before = {(r["operation"], r["vertices"]): r for r in previous["results"]}
+    for r in current["results"]:
+        old = before.get((r["operation"], r["vertices"]))
+        if old is None:
+            continue
+        ratio = r["time_s"] / max(old["time_s"], 1e-9)
+        print("{:<24} {:>10} vertices  {:10.3f} ms -> {:10.3f} ms  x{:.2f}{}".format(
+            r["operation"], r["vertices"], old["time_s"] * 1000.0, r["time_s"] * 1000.0, ratio, "  SLOWER" if ratio > 1.2 else ""))
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Headless PyMeshViewer benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SUITE_SIZES), help="mesh sizes in vertices")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default="benchmarkResults.json")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc runs")
+    parser.add_argument("--json-limit", type=int, default=100000, help="largest mesh to load as a JSON animation")
+    parser.add_argument("--comparisons", action="store_true", help="also run the picking, BVH and upload comparisons")
+    args = parser.parse_args(argv)
+
+    report = run_suite(args.sizes, args.repeat, not args.no_memory, args.json_limit)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=1)
+    print("Wrote {} results to {}".format(len(report["results"]), args.output))
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare_results(json.load(f), report)
+
+    if args.comparisons:
+        bench_obj_parser()
+        bench_select_triangle()
+        bench_bvh()
+        bench_frame_uploads()
+        bench_compressed_animation()
+        bench_frame_slot_stress()
+        bench_command_socket()
+        bench_software_rasterizer()
+        bench_lod_chain()
+        bench_lod_cache_validation()
+        bench_frustum_culling()
+        bench_mesh_edges()
+
+if __name__ == "__main__":
+    # Must happen before any viewer module imports OpenGL
+    from headlessGL import install_stub_gl
+    install_stub_gl()
+    main(sys.argv[1:])
@@ -0,0 +1,68 @@
+"""
+This file contains the CommandClient class, which sends commands to a running PyMeshViewer over its command socket.
+
+Run with: python pyMeshViewerClient.py "loadAnimation anim.pmanim" "animation goto 10" "hl v 3"
+or pipe one command per line: python pyMeshViewerClient.py < script.txt
+"""
+
+import argparse
+import json
+import socket
+import sys
+from commandServer import DEFAULT_HOST, DEFAULT_PORT
+
+class CommandClient:
+    def __init__(self, host = DEFAULT_HOST, port = DEFAULT_PORT, path = None, timeout = 60.0):
+        if path is not None:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.connect(path)
+        else:
+            self.socket = socket.create_connection((host, port))
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.socket.settimeout(timeout)
+        self.reader = self.socket.makefile("rb")
+
+    # Send all commands at once, then read their responses, one per command and in order
+    def send_batch(self, commands):
+        commands = [c.strip() for c in commands if c.strip()]
+        self.socket.sendall("".join(c + "\n" for c in commands).encode("utf-8"))
+        return [self.read_response() for c in commands]
+
+    def send(self, command):
+        return self.send_batch([command])[0]
+
+    def read_response(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("the viewer closed the connection")
+        return json.loads(line)
+
+    def close(self):
+        self.reader.close()
+        self.socket.close()
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Send commands to a running PyMeshViewer")
+    parser.add_argument("commands", nargs="*", help="commands, read from stdin when none are given")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--socket", help="Unix domain socket path instead of TCP")
+    args = parser.parse_args(argv)
+
+    commands = args.commands if len(args.commands) > 0 else sys.stdin.read().splitlines()
+    client = CommandClient(args.host, args.port, args.socket)
+    failed = False
+    try:
+        for command, response in zip([c for c in commands if c.strip()], client.send_batch(commands)):
+            print("> " + command)
+            for line in response["output"]:
+                print(line)
+            if not response["ok"]:
+                print("Error: " + response["error"])
+                failed = True
+    finally:
+        client.close()
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
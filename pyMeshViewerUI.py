@@ -6,6 +6,7 @@ from OpenGL.GL import *
 from OpenGL.GLU import *
 from OpenGL.GLUT import *
 from UI_Button import *
+from instances import Instances
 
 class PyMeshViewerUI:
     width = 0
@@ -43,8 +44,22 @@ class PyMeshViewerUI:
         for i in range(len(self.buttons)):
             self.buttons[i].render()
 
+        profiler = Instances.frame_profiler_instance
+        if profiler is not None and profiler.enabled and profiler.overlay_enabled:
+            self.render_stats_overlay(profiler.get_overlay_lines())
+
         glMatrixMode(GL_PROJECTION)
         glPopMatrix()
         glMatrixMode(GL_MODELVIEW)
         glPopMatrix()
         glEnable(GL_DEPTH_TEST)
+
+    # Draw the frame profiler report in the top left corner
+    def render_stats_overlay(self, lines):
+        glColor3f(1, 1, 0)
+        y = PyMeshViewerUI.height - 20
+        for line in lines:
+            glRasterPos2f(10, y)
+            for char in line:
+                glutBitmapCharacter(GLUT_BITMAP_8_BY_13, ord(char))
+            y -= 15
@@ -25,4 +25,22 @@ class PyMeshViewerUtils:
         screen_x = ((ndcSpacePos[0] + 1.0) / 2.0) * viewPort[2] + viewPort[0]
         screen_y = ((ndcSpacePos[1] + 1.0) / 2.0) * viewPort[3] + viewPort[1]
 
-        return (screen_x, screen_y)
\ No newline at end of file
+        return (screen_x, screen_y)
+
+    # Project Nx3 points to the screen with one matrix multiply.
+    # Returns an Nx2 array of screen coordinates and a mask of the points in front of the camera.
+    def world_to_screen_batch(points, modelView, projection, viewPort):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+
+        # The GL matrices are column major, so row vectors are multiplied from the left
+        model_view_projection = np.asarray(modelView, dtype=np.float64) @ np.asarray(projection, dtype=np.float64)
+        clip_space_points = points @ model_view_projection[:3] + model_view_projection[3]
+
+        in_front = clip_space_points[:, 3] > 0.0
+        w = np.where(in_front, clip_space_points[:, 3], 1.0)
+
+        screen = np.empty((len(points), 2), dtype=np.float64)
+        screen[:, 0] = ((clip_space_points[:, 0] / w + 1.0) / 2.0) * viewPort[2] + viewPort[0]
+        screen[:, 1] = ((clip_space_points[:, 1] / w + 1.0) / 2.0) * viewPort[3] + viewPort[1]
+
+        return screen, in_front
@@ -0,0 +1,74 @@
+"""
+This file contains vectorized ray intersection routines used for picking.
+"""
+
+import numpy as np
+
+EPSILON = 0.00000001
+
+# Number of triangles tested per batch, keeps the temporaries of huge meshes bounded
+BATCH_SIZE = 262144
+
+# Convert a Vector3 or a sequence of 3 numbers to a float64 numpy array
+def to_np3(v):
+    if hasattr(v, "x"):
+        return np.array([v.x, v.y, v.z], dtype=np.float64)
+    return np.asarray(v, dtype=np.float64).reshape(3)
+
+# Möller–Trumbore Intersection Algorithm over arrays of triangles.
+# v0, v1, v2 are Kx3 arrays of triangle corners.
+# Returns a K array with the hit distance of each triangle, or inf where the ray misses.
+def intersect_ray_triangles(ray_origin, ray_direction, v0, v1, v2):
+    origin = to_np3(ray_origin)
+    direction = to_np3(ray_direction)
+
+    v0 = np.asarray(v0, dtype=np.float64)
+    e1 = np.asarray(v1, dtype=np.float64) - v0
+    e2 = np.asarray(v2, dtype=np.float64) - v0
+
+    h = np.cross(direction, e2)
+    a = np.einsum("ij,ij->i", e1, h)
+    parallel = np.abs(a) < EPSILON
+    with np.errstate(divide="ignore", invalid="ignore"):
+        f = 1.0 / np.where(parallel, 1.0, a)
+
+    s = origin - v0
+    u = f * np.einsum("ij,ij->i", s, h)
+
+    q = np.cross(s, e1)
+    v = f * (q @ direction)
+
+    t = f * np.einsum("ij,ij->i", e2, q)
+
+    hit = ~parallel & (u >= 0.0) & (u <= 1.0) & (v >= 0.0) & (u + v <= 1.0) & (t > EPSILON)
+    return np.where(hit, t, np.inf)
+
+# Test the ray against every triangle of the mesh in batches.
+# positions is an Nx3 vertex array, indices an Mx3 triangle index array.
+# triangle_ids optionally restricts the test to a subset of triangles.
+# Returns (triangle_index, distance) of the nearest hit, or (-1, None) on a miss.
+def nearest_ray_triangle_hit(ray_origin, ray_direction, positions, indices, triangle_ids=None):
+    closest_hit_triangle = -1
+    smallest_distance = np.inf
+
+    count = len(indices) if triangle_ids is None else len(triangle_ids)
+    for start in range(0, count, BATCH_SIZE):
+        if triangle_ids is None:
+            ids = None
+            tris = indices[start:start + BATCH_SIZE]
+        else:
+            ids = triangle_ids[start:start + BATCH_SIZE]
+            tris = indices[ids]
+
+        distances = intersect_ray_triangles(ray_origin, ray_direction, positions[tris[:, 0]], positions[tris[:, 1]], positions[tris[:, 2]])
+        if len(distances) == 0:
+            continue
+
+        i = int(np.argmin(distances))
+        if distances[i] < smallest_distance:
+            smallest_distance = distances[i]
+            closest_hit_triangle = start + i if ids is None else int(ids[i])
+
+    if closest_hit_triangle == -1:
+        return -1, None
+    return closest_hit_triangle, float(smallest_distance)
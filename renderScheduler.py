@@ -0,0 +1,60 @@
+"""
+This file contains the RenderScheduler class, which only redraws the scene when something changed.
+
+Anything that changes what is on screen marks the scene dirty, from any thread. A GLUT timer running at the
+FPS cap posts a redisplay for dirty scenes and skips the frame otherwise, so an idle viewer does not burn a core.
+"""
+
+import time
+from OpenGL.GLUT import *
+from instances import Instances
+
+class RenderScheduler:
+    def __init__(self, fps_cap = 60.0):
+        self.fps_cap = fps_cap
+        self.dirty = True
+        # While an animation plays every tick renders, paced by the FPS cap
+        self.playback_active = False
+
+        self.frames_rendered = 0
+        self.frames_skipped = 0
+        self.last_frame_time = 0.0
+
+    # Mark the scene as changed, it is redrawn on the next tick
+    def mark_dirty(self):
+        self.dirty = True
+
+    def set_fps_cap(self, fps_cap):
+        self.fps_cap = max(float(fps_cap), 1.0)
+
+    def tick_interval_ms(self):
+        return max(int(1000.0 / self.fps_cap), 1)
+
+    def start(self):
+        glutTimerFunc(self.tick_interval_ms(), self.tick, 0)
+
+    # GLUT timer callback, runs on the GLUT thread
+    def tick(self, value):
+        # Commands from the command server run here, on the render thread, between frames
+        if Instances.command_queue_instance is not None and Instances.command_queue_instance.has_pending():
+            Instances.command_queue_instance.run_pending()
+        if self.dirty or self.playback_active:
+            self.dirty = False
+            glutPostRedisplay()
+        else:
+            self.frames_skipped += 1
+        glutTimerFunc(self.tick_interval_ms(), self.tick, 0)
+
+    # Called by the display function after a frame was drawn
+    def frame_rendered(self):
+        self.frames_rendered += 1
+        self.last_frame_time = time.perf_counter()
+
+    def stats_string(self):
+        return "Render: {} frames rendered, {} idle frames skipped, FPS cap {:.0f}{}".format(
+            self.frames_rendered, self.frames_skipped, self.fps_cap, ", playing" if self.playback_active else "")
+
+# Ask for a redraw of the scene. Safe to call from any thread and without a window.
+def request_redisplay():
+    if Instances.render_scheduler_instance is not None:
+        Instances.render_scheduler_instance.mark_dirty()
@@ -0,0 +1,103 @@
+"""
+This file contains the ScreenSpaceGrid class, a uniform grid over the projected vertices used for vertex picking.
+"""
+
+import numpy as np
+import pyMeshViewerUtils
+
+class ScreenSpaceGrid:
+    def __init__(self, cell_size = 8.0):
+        self.cell_size = cell_size
+
+        # What the grid was built for, it is only rebuilt when one of these changes
+        self.model_view = None
+        self.projection = None
+        self.view_port = None
+        self.positions_version = -1
+
+        self.screen = None
+        self.columns = 0
+        self.rows = 0
+        # Vertex ids sorted by cell and the sorted cell key of each of them
+        self.vertex_ids = None
+        self.cell_keys = None
+
+        self.rebuild_count = 0
+
+    def is_valid(self, camera, positions_version):
+        return (self.positions_version == positions_version
+                and self.view_port is not None
+                and np.array_equal(self.view_port, camera.viewPort)
+                and np.array_equal(self.model_view, camera.modelView)
+                and np.array_equal(self.projection, camera.projection))
+
+    # Rebuild the grid if the camera or the vertex positions changed since the last build
+    def update(self, positions, positions_version, camera):
+        if self.is_valid(camera, positions_version):
+            return
+
+        self.model_view = np.array(camera.modelView)
+        self.projection = np.array(camera.projection)
+        self.view_port = np.array(camera.viewPort)
+        self.positions_version = positions_version
+
+        self.screen, in_front = pyMeshViewerUtils.PyMeshViewerUtils.world_to_screen_batch(positions, self.model_view, self.projection, self.view_port)
+
+        # Vertices behind the camera or far off screen can never be picked
+        x0, y0, width, height = (float(v) for v in self.view_port[:4])
+        margin = self.cell_size
+        visible = in_front & (self.screen[:, 0] >= x0 - margin) & (self.screen[:, 0] < x0 + width + margin) \
+            & (self.screen[:, 1] >= y0 - margin) & (self.screen[:, 1] < y0 + height + margin)
+        ids = np.flatnonzero(visible)
+
+        self.columns = int(np.ceil((width + 2 * margin) / self.cell_size)) + 1
+        self.rows = int(np.ceil((height + 2 * margin) / self.cell_size)) + 1
+        keys = self.cell_key(self.screen[ids, 0], self.screen[ids, 1])
+
+        order = np.argsort(keys, kind="stable")
+        self.vertex_ids = ids[order]
+        self.cell_keys = keys[order]
+        self.rebuild_count += 1
+
+    def cell_coordinates(self, x, y):
+        cx = np.floor((x - (self.view_port[0] - self.cell_size)) / self.cell_size).astype(np.int64)
+        cy = np.floor((y - (self.view_port[1] - self.cell_size)) / self.cell_size).astype(np.int64)
+        return cx, cy
+
+    def cell_key(self, x, y):
+        cx, cy = self.cell_coordinates(x, y)
+        return cy * self.columns + cx
+
+    # Find the vertex nearest to (x, y) within radius pixels.
+    # Returns (vertex_index, distance), or (-1, None) when no vertex is close enough.
+    def nearest(self, x, y, radius):
+        cx, cy = self.cell_coordinates(np.array([x], dtype=np.float64), np.array([y], dtype=np.float64))
+        reach = int(np.ceil(radius / self.cell_size))
+
+        candidates = []
+        for dy in range(-reach, reach + 1):
+            row = int(cy[0]) + dy
+            if row < 0 or row >= self.rows:
+                continue
+            lo_column = max(int(cx[0]) - reach, 0)
+            hi_column = min(int(cx[0]) + reach, self.columns - 1)
+            if lo_column > hi_column:
+                continue
+            # The cells of a row are contiguous in the sorted keys
+            lo = np.searchsorted(self.cell_keys, row * self.columns + lo_column, side="left")
+            hi = np.searchsorted(self.cell_keys, row * self.columns + hi_column, side="right")
+            candidates.append(self.vertex_ids[lo:hi])
+
+        if len(candidates) == 0:
+            return -1, None
+        candidates = np.concatenate(candidates)
+        if len(candidates) == 0:
+            return -1, None
+
+        distances = np.hypot(self.screen[candidates, 0] - x, self.screen[candidates, 1] - y)
+        smallest_distance = distances.min()
+        if smallest_distance >= radius:
+            return -1, None
+
+        # Prefer the lowest vertex index on ties
+        return int(candidates[distances == smallest_distance].min()), float(smallest_distance)
@@ -0,0 +1,455 @@
+"""
+This file contains the SoftwareRasterizer class, which draws a mesh in the style of ParticleSystem.render with NumPy
+only: a z-buffer, white triangles pushed back by the polygon offset, black wireframe and lines, green vertex points
+and the red highlight on top. It needs no GL context, so it works where even offscreen rendering is unavailable,
+e.g. for thumbnails and golden image tests.
+
+Triangles are rasterized in batches: every triangle is expanded to the pixel centers of its bounding box, which are
+tested against its edge functions and resolved with a minimum into the z-buffer. Triangles and lines are clipped against the
+near plane like GL does. Large images can be split into tiles, horizontal bands rasterized by worker processes.
+
+Thumbnails: python softwareRasterizer.py mesh1.obj mesh2.obj animation.pmanim ... --output thumbnails --size 256 192
+"""
+
+import argparse
+import contextlib
+import math
+import multiprocessing
+import os
+import sys
+import time
+import numpy as np
+from meshEdges import unique_edges
+
+# The colors of ParticleSystem.render as they end up in an 8 bit GL framebuffer
+BACKGROUND_COLOR = np.array([0, 0, 0], dtype=np.uint8)
+FILL_COLOR = np.array([253, 253, 253], dtype=np.uint8)
+LINE_COLOR = np.array([0, 0, 0], dtype=np.uint8)
+POINT_COLOR = np.array([28, 253, 28], dtype=np.uint8)
+HIGHLIGHT_COLOR = np.array([253, 28, 28], dtype=np.uint8)
+
+# Smallest resolvable difference of a 24 bit depth buffer, the unit of glPolygonOffset
+DEPTH_UNIT = 1.0 / (1 << 24)
+
+class SoftwareRasterizer:
+    def __init__(self, width = 800, height = 600, fovy = 45.0, near = 0.1, far = 50.0,
+                 point_size = 5.0, highlight_point_size = 6.0, line_width = 1.5, polygon_offset = (1.0, 1.0), batch_size = 1 << 21,
+                 highlight_line_width = 3.0):
+        self.width = width
+        self.height = height
+        self.fovy = fovy
+        self.near = near
+        self.far = far
+        self.point_size = point_size
+        self.highlight_point_size = highlight_point_size
+        self.line_width = line_width
+        self.highlight_line_width = highlight_line_width
+        # glPolygonOffset(factor, units) of the filled triangles
+        self.polygon_offset = polygon_offset
+        # Candidate pixels tested at once, bounds the memory of a batch
+        self.batch_size = batch_size
+
+    # Transform the positions to clip space, Nx4 float64
+    def project(self, positions, camera):
+        camera.update_matrices(self.width, self.height, self.fovy, self.near, self.far)
+        # The matrices are in glGetFloatv layout, so row vectors are multiplied from the left
+        matrix = camera.modelView.astype(np.float64) @ camera.projection.astype(np.float64)
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+        return positions @ matrix[:3] + matrix[3]
+
+    # Clip space to image coordinates (x right, y down, in pixels) and window depth in [0, 1]
+    def to_screen(self, clip):
+        w = clip[..., 3]
+        screen = np.empty(clip.shape[:-1] + (3,), dtype=np.float64)
+        screen[..., 0] = (clip[..., 0] / w + 1.0) * 0.5 * self.width
+        screen[..., 1] = (1.0 - clip[..., 1] / w) * 0.5 * self.height
+        screen[..., 2] = (clip[..., 2] / w + 1.0) * 0.5
+        return screen
+
+    # Render the mesh, returns an HxWx3 uint8 image of the region (x0, y0, x1, y1), the whole image by default.
+    # highlight is ("v", vertex index), ("t", triangle index) or ("e", index of the edge in unique_edges),
+    # lines an Lx2x3 array of extra line segments and edges the Ex2 vertex indices of the wireframe, all edges by default.
+    def render(self, positions, indices, camera, highlight = None, lines = None, highlights_only = False, region = None, edges = None):
+        return self.draw(self.prepare(positions, indices, camera, highlight, lines, highlights_only, edges), region)
+
+    # Transform and clip everything that is drawn, the result only depends on the camera and not on the region
+    def prepare(self, positions, indices, camera, highlight = None, lines = None, highlights_only = False, edges = None):
+        positions = np.asarray(positions, dtype=np.float32).reshape(-1, 3)
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+        clip = self.project(positions, camera)
+        in_front = clip[:, 2] >= -clip[:, 3]
+        scene = Scene()
+
+        if not highlights_only:
+            scene.triangles = self.to_screen(clip_triangles(clip[indices]))
+            # Every edge once, like the edge buffer of the viewer
+            if edges is None:
+                edges = unique_edges(indices, len(positions))
+            segments = clip[np.asarray(edges, dtype=np.int64).reshape(-1, 2)]
+            if lines is not None and len(lines) > 0:
+                segments = np.concatenate([segments, self.project(lines, camera).reshape(-1, 2, 4)])
+            scene.segments = self.to_screen(clip_segments(segments))
+            scene.points = self.to_screen(clip[in_front])
+
+        if highlight is not None:
+            kind, index = highlight
+            if kind == "t" and 0 <= index < len(indices):
+                scene.highlight_triangles = self.to_screen(clip_triangles(clip[indices[index:index + 1]]))
+            elif kind == "v" and 0 <= index < len(positions) and in_front[index]:
+                scene.highlight_points = self.to_screen(clip[index:index + 1])
+            elif kind == "e":
+                all_edges = unique_edges(indices, len(positions))
+                if 0 <= index < len(all_edges):
+                    scene.highlight_segments = self.to_screen(clip_segments(clip[all_edges[index:index + 1].astype(np.int64)]))
+        return scene
+
+    # Rasterize a prepared scene into the region
+    def draw(self, scene, region = None):
+        if region is None:
+            region = (0, 0, self.width, self.height)
+        target = RenderTarget(region)
+        if scene.triangles is not None:
+            self.fill_triangles(target, scene.triangles, depth_test=True)
+            target.color[target.depth < np.inf] = FILL_COLOR
+        if scene.segments is not None:
+            self.draw_segments(target, scene.segments, LINE_COLOR)
+        if scene.points is not None:
+            self.draw_points(target, scene.points, self.point_size, POINT_COLOR, depth_test=True)
+
+        # The highlight is drawn over everything, without the depth test
+        if scene.highlight_triangles is not None:
+            highlight_target = RenderTarget(region)
+            self.fill_triangles(highlight_target, scene.highlight_triangles, depth_test=False)
+            target.color[highlight_target.depth < np.inf] = HIGHLIGHT_COLOR
+        if scene.highlight_segments is not None:
+            self.draw_segments(target, scene.highlight_segments, HIGHLIGHT_COLOR, self.highlight_line_width, depth_test=False)
+        if scene.highlight_points is not None:
+            self.draw_points(target, scene.highlight_points, self.highlight_point_size, HIGHLIGHT_COLOR, depth_test=False)
+        return target.color
+
+    # Render what ParticleSystem.render draws for this particle system
+    def render_particle_system(self, particle_system, camera, region = None):
+        highlight = None
+        if particle_system.select_particle_enabled:
+            highlight = ("v", particle_system.selected_element_index)
+        elif particle_system.select_triangle_enabled:
+            highlight = ("t", particle_system.selected_element_index)
+        elif particle_system.select_edge_enabled:
+            highlight = ("e", particle_system.selected_element_index)
+        lines = np.array([[p.x, p.y, p.z] for p in particle_system.lines], dtype=np.float32)
+        edges = None
+        if particle_system.edge_mode == "features":
+            mesh_edges = particle_system.get_edges()
+            if mesh_edges is not None:
+                edges = mesh_edges.draw_list(particle_system.edge_mask(mesh_edges, particle_system.positions, particle_system.indices))[0]
+        return self.render(particle_system.positions, particle_system.indices, camera, highlight, lines, particle_system.show_highlights_only, region, edges)
+
+    # Rasterize triangles (Tx3x3 image coordinates and depth) into the depth buffer of the target,
+    # with the polygon offset of the fill pass
+    def fill_triangles(self, target, triangles, depth_test):
+        a = triangles[:, 0]
+        b = triangles[:, 1]
+        c = triangles[:, 2]
+        area = (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])
+
+        # Pixels whose centers lie in the bounding box, clipped to the region
+        low = np.minimum(np.minimum(a[:, :2], b[:, :2]), c[:, :2])
+        high = np.maximum(np.maximum(a[:, :2], b[:, :2]), c[:, :2])
+        x_min = np.maximum(np.ceil(low[:, 0] - 0.5), target.x0).astype(np.int64)
+        x_max = np.minimum(np.floor(high[:, 0] - 0.5), target.x1 - 1).astype(np.int64)
+        y_min = np.maximum(np.ceil(low[:, 1] - 0.5), target.y0).astype(np.int64)
+        y_max = np.minimum(np.floor(high[:, 1] - 0.5), target.y1 - 1).astype(np.int64)
+        keep = (area != 0.0) & (x_max >= x_min) & (y_max >= y_min)
+        if not keep.any():
+            return
+        a, b, c, area = a[keep], b[keep], c[keep], area[keep]
+        x_min, y_min = x_min[keep], y_min[keep]
+        box_width = x_max[keep] - x_min + 1
+        pixel_counts = box_width * (y_max[keep] - y_min + 1)
+
+        # glPolygonOffset: factor times the largest depth slope plus units times the depth resolution
+        offset = np.zeros(len(a))
+        if depth_test:
+            dz_dx = ((b[:, 2] - a[:, 2]) * (c[:, 1] - a[:, 1]) - (c[:, 2] - a[:, 2]) * (b[:, 1] - a[:, 1])) / area
+            dz_dy = ((c[:, 2] - a[:, 2]) * (b[:, 0] - a[:, 0]) - (b[:, 2] - a[:, 2]) * (c[:, 0] - a[:, 0])) / area
+            offset = self.polygon_offset[0] * np.maximum(np.abs(dz_dx), np.abs(dz_dy)) + self.polygon_offset[1] * DEPTH_UNIT
+
+        for first, last in batches(pixel_counts, self.batch_size):
+            counts = pixel_counts[first:last]
+            triangle = np.repeat(np.arange(first, last), counts)
+            local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            px = x_min[triangle] + local % box_width[triangle]
+            py = y_min[triangle] + local // box_width[triangle]
+            cx = px + 0.5
+            cy = py + 0.5
+
+            ta, tb, tc = a[triangle], b[triangle], c[triangle]
+            inverse_area = 1.0 / area[triangle]
+            l0 = ((tc[:, 0] - tb[:, 0]) * (cy - tb[:, 1]) - (tc[:, 1] - tb[:, 1]) * (cx - tb[:, 0])) * inverse_area
+            l1 = ((ta[:, 0] - tc[:, 0]) * (cy - tc[:, 1]) - (ta[:, 1] - tc[:, 1]) * (cx - tc[:, 0])) * inverse_area
+            l2 = 1.0 - l0 - l1
+            depth = l0 * ta[:, 2] + l1 * tb[:, 2] + l2 * tc[:, 2]
+            inside = (l0 >= 0.0) & (l1 >= 0.0) & (l2 >= 0.0) & (depth >= 0.0) & (depth <= 1.0)
+            if not depth_test:
+                depth = np.zeros(len(depth))
+            np.minimum.at(target.depth.reshape(-1), target.pixel_index(px[inside], py[inside]), (depth + offset[triangle])[inside])
+
+    # Draw line segments (Sx2x3 image coordinates and depth) one sample per pixel step, depth tested against the fill
+    def draw_segments(self, target, segments, color, width = None, depth_test = True):
+        width = self.line_width if width is None else width
+        # Segments that miss the region entirely
+        margin = max(1, int(round(width)))
+        low = np.minimum(segments[:, 0, :2], segments[:, 1, :2])
+        high = np.maximum(segments[:, 0, :2], segments[:, 1, :2])
+        segments = segments[(high[:, 0] >= target.x0 - margin) & (low[:, 0] < target.x1 + margin) & (high[:, 1] >= target.y0 - margin) & (low[:, 1] < target.y1 + margin)]
+        if len(segments) == 0:
+            return
+        p = segments[:, 0]
+        d = segments[:, 1] - segments[:, 0]
+        steps = np.ceil(np.maximum(np.abs(d[:, 0]), np.abs(d[:, 1]))).astype(np.int64) + 1
+        # Lines wider than a pixel are thickened across their major axis
+        thickness = max(1, int(round(width)))
+        x_major = np.abs(d[:, 0]) > np.abs(d[:, 1])
+
+        for first, last in batches(steps * thickness, self.batch_size):
+            counts = steps[first:last] * thickness
+            segment = np.repeat(np.arange(first, last), counts)
+            local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            t = (local // thickness) / np.maximum(steps[segment] - 1, 1)
+            x = p[segment, 0] + t * d[segment, 0]
+            y = p[segment, 1] + t * d[segment, 1]
+            depth = p[segment, 2] + t * d[segment, 2]
+            # Across the line the pixels whose centers are within half the thickness
+            shift = local % thickness
+            across_x = np.ceil(x - thickness * 0.5 - 0.5).astype(np.int64) + shift
+            across_y = np.ceil(y - thickness * 0.5 - 0.5).astype(np.int64) + shift
+            px = np.where(x_major[segment], np.floor(x).astype(np.int64), across_x)
+            py = np.where(x_major[segment], across_y, np.floor(y).astype(np.int64))
+            target.draw_fragments(px, py, depth, color, depth_test)
+
+    # Draw square points of the given size in pixels, centered on the projected positions
+    def draw_points(self, target, points, size, color, depth_test):
+        size = max(1, int(round(size)))
+        points = points[(points[:, 0] >= target.x0 - size) & (points[:, 0] < target.x1 + size) & (points[:, 1] >= target.y0 - size) & (points[:, 1] < target.y1 + size)]
+        offsets = np.arange(size)
+        # Pixels whose centers are inside the square of the point
+        x0 = np.ceil(points[:, 0] - size * 0.5 - 0.5).astype(np.int64)
+        y0 = np.ceil(points[:, 1] - size * 0.5 - 0.5).astype(np.int64)
+        px = (x0[:, None, None] + offsets[None, None, :]) + np.zeros((1, size, 1), dtype=np.int64)
+        py = (y0[:, None, None] + offsets[None, :, None]) + np.zeros((1, 1, size), dtype=np.int64)
+        depth = np.repeat(points[:, 2], size * size)
+        target.draw_fragments(px.reshape(-1), py.reshape(-1), depth, color, depth_test)
+
+# Screen space geometry of a frame: image coordinates and window depth, None for what is not drawn
+class Scene:
+    def __init__(self):
+        # Tx3x3 filled triangles, Sx2x3 wireframe and line segments, Px3 vertex points
+        self.triangles = None
+        self.segments = None
+        self.points = None
+        self.highlight_triangles = None
+        self.highlight_segments = None
+        self.highlight_points = None
+
+# Color and depth buffer of a region of the image
+class RenderTarget:
+    def __init__(self, region):
+        self.x0, self.y0, self.x1, self.y1 = region
+        self.width = self.x1 - self.x0
+        self.height = self.y1 - self.y0
+        self.color = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        self.color[:] = BACKGROUND_COLOR
+        self.depth = np.full((self.height, self.width), np.inf)
+
+    def pixel_index(self, px, py):
+        return (py - self.y0) * self.width + (px - self.x0)
+
+    # Set the color of the fragments inside the region that pass the depth test, without writing depth
+    def draw_fragments(self, px, py, depth, color, depth_test):
+        keep = (px >= self.x0) & (px < self.x1) & (py >= self.y0) & (py < self.y1) & (depth >= 0.0) & (depth <= 1.0)
+        index = self.pixel_index(px[keep], py[keep])
+        if depth_test:
+            index = index[depth[keep] <= self.depth.reshape(-1)[index]]
+        self.color.reshape(-1, 3)[index] = color
+
+# Clip triangles (Tx3x4 clip space) against the near plane, as GL does before rasterizing.
+# A triangle with one vertex in front stays a triangle, one with two vertices in front becomes two.
+def clip_triangles(triangles):
+    distance = triangles[:, :, 2] + triangles[:, :, 3]
+    inside = distance >= 0.0
+    inside_count = inside.sum(axis=1)
+    result = [triangles[inside_count == 3]]
+
+    for count in (1, 2):
+        selected = inside_count == count
+        if not selected.any():
+            continue
+        tri = triangles[selected]
+        d = distance[selected]
+        # Rotate the vertices, keeping the winding, so the vertex on its own side of the plane comes first
+        lone = np.argmax(inside[selected] == (count == 1), axis=1)
+        order = (lone[:, None] + np.arange(3)[None, :]) % 3
+        tri = np.take_along_axis(tri, order[:, :, None], axis=1)
+        d = np.take_along_axis(d, order, axis=1)
+        p0, p1, p2 = tri[:, 0], tri[:, 1], tri[:, 2]
+        # Where the edges from the lone vertex cross the plane
+        q1 = p0 + (d[:, 0] / (d[:, 0] - d[:, 1]))[:, None] * (p1 - p0)
+        q2 = p0 + (d[:, 0] / (d[:, 0] - d[:, 2]))[:, None] * (p2 - p0)
+        if count == 1:
+            result.append(np.stack([p0, q1, q2], axis=1))
+        else:
+            result.append(np.stack([q1, p1, p2], axis=1))
+            result.append(np.stack([q1, p2, q2], axis=1))
+    return np.concatenate(result)
+
+# Clip line segments (Sx2x4 clip space) against the near plane
+def clip_segments(segments):
+    distance = segments[:, :, 2] + segments[:, :, 3]
+    keep = (distance >= 0.0).any(axis=1)
+    segments = segments[keep].copy()
+    distance = distance[keep]
+    for end in (0, 1):
+        behind = distance[:, end] < 0.0
+        other = 1 - end
+        t = distance[behind, other] / (distance[behind, other] - distance[behind, end])
+        segments[behind, end] = segments[behind, other] + t[:, None] * (segments[behind, end] - segments[behind, other])
+    return segments
+
+# Split items with the given costs into consecutive ranges of about batch_size total cost, at least one item each
+def batches(costs, batch_size):
+    ends = np.cumsum(costs)
+    first = 0
+    while first < len(costs):
+        done = ends[first - 1] if first > 0 else 0
+        last = int(np.searchsorted(ends, done + batch_size, side="right"))
+        last = max(last, first + 1)
+        yield first, last
+        first = last
+
+# Center and radius of a sphere around the mesh, the one of its bounding box
+def bounding_sphere(positions):
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+    low, high = positions.min(axis=0), positions.max(axis=0)
+    return (low + high) * 0.5, max(np.linalg.norm(high - low) * 0.5, 1e-6)
+
+# Move the camera so the whole mesh is in view, looking down the -z axis at its center
+def fit_camera(camera, positions, fovy = 45.0, aspect = 4.0 / 3.0):
+    from vector3 import Vector3
+    center, radius = bounding_sphere(positions)
+    half_angle = math.radians(fovy) * 0.5
+    # The narrower of the vertical and the horizontal field of view has to hold the bounding sphere
+    half_angle = min(half_angle, math.atan(math.tan(half_angle) * aspect))
+    distance = radius / math.sin(half_angle)
+    camera.camera_pos = Vector3(center[0], center[1], center[2] + distance)
+    camera.camera_angle = [0.0, 0.0]
+    return camera
+
+# Near and far plane around the mesh as seen from the camera, so a large mesh is not cut off by the default far
+# plane. The near plane stays in front of the camera when the camera is inside the mesh.
+def fit_clip_planes(camera, positions, margin = 1.5):
+    center, radius = bounding_sphere(positions)
+    eye = np.array([camera.camera_pos.x, camera.camera_pos.y, camera.camera_pos.z], dtype=np.float64)
+    distance = np.linalg.norm(center - eye)
+    far = distance + margin * radius
+    near = max(distance - margin * radius, far * 1e-4)
+    return near, far
+
+# Scene of the worker processes of the tiled mode
+tile_scene = None
+
+def init_tile_worker(rasterizer, scene):
+    global tile_scene
+    tile_scene = (rasterizer, scene)
+
+def render_tile(region):
+    rasterizer, scene = tile_scene
+    return region, rasterizer.draw(scene, region)
+
+# Split the image into horizontal bands and rasterize them in worker_count processes.
+# The geometry is transformed and clipped once and sent to every worker once.
+def render_tiled(rasterizer, positions, indices, camera, highlight = None, lines = None, worker_count = None, bands_per_worker = 2):
+    if worker_count is None:
+        worker_count = os.cpu_count() or 1
+    band_height = max(1, -(-rasterizer.height // (worker_count * bands_per_worker)))
+    regions = [(0, y, rasterizer.width, min(y + band_height, rasterizer.height)) for y in range(0, rasterizer.height, band_height)]
+    scene = rasterizer.prepare(positions, indices, camera, highlight, lines)
+    image = np.empty((rasterizer.height, rasterizer.width, 3), dtype=np.uint8)
+    if worker_count <= 1:
+        init_tile_worker(rasterizer, scene)
+        tiles = list(map(render_tile, regions))
+    else:
+        with multiprocessing.Pool(worker_count, initializer=init_tile_worker, initargs=(rasterizer, scene)) as pool:
+            tiles = pool.map(render_tile, regions)
+    for (x0, y0, x1, y1), tile in tiles:
+        image[y0:y1, x0:x1] = tile
+    return image
+
+# Read the vertex positions and triangle indices of an OBJ mesh or of one frame of an animation, without the viewer
+def load_mesh_arrays(path, frame = 0):
+    from animationFormat import AnimationData, is_binary_animation, load_binary_animation
+    if is_binary_animation(path):
+        data = load_binary_animation(path)
+        return np.array(data.frames[frame], dtype=np.float32), data.triangles
+    if path.lower().endswith(".json"):
+        import json
+        with open(path) as f:
+            data = AnimationData.from_json_dict(json.load(f))
+        return data.frames[frame], data.triangles
+
+    import meshCache
+    from objParser import OBJParser
+    cached = meshCache.load_mesh_cache(path)
+    if cached is not None:
+        return cached
+    return OBJParser().parse(path)
+
+# Render the thumbnail of one input, returns its report line and whether it worked
+def render_thumbnail(task):
+    path, output_directory, width, height, frame, camera_pos, camera_angle = task
+    from camera import Camera
+    from pngWriter import write_png
+    from vector3 import Vector3
+    start_time = time.perf_counter()
+    try:
+        positions, indices = load_mesh_arrays(path, frame)
+        camera = Camera()
+        if camera_pos is None:
+            fit_camera(camera, positions, aspect=width / height)
+        else:
+            camera.camera_pos = Vector3(*camera_pos)
+        if camera_angle is not None:
+            camera.camera_angle = list(camera_angle)
+        near, far = fit_clip_planes(camera, positions)
+        image = SoftwareRasterizer(width, height, near=near, far=far).render(positions, indices, camera)
+        output_path = os.path.join(output_directory, os.path.splitext(os.path.basename(path))[0] + ".png")
+        write_png(output_path, image)
+    except Exception as e:
+        return "{}: FAILED {}: {}".format(path, type(e).__name__, e), False
+    return "{} in {:.1f} ms".format(output_path, (time.perf_counter() - start_time) * 1000.0), True
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Render thumbnails of meshes and animations without OpenGL")
+    parser.add_argument("inputs", nargs="+", help="OBJ meshes and JSON or binary animations")
+    parser.add_argument("--output", default=".", help="directory of the PNG files")
+    parser.add_argument("--size", type=int, nargs=2, default=[256, 192], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--frame", type=int, default=0, help="animation frame to render")
+    parser.add_argument("--camera-pos", type=float, nargs=3, metavar=("X", "Y", "Z"), help="camera position, by default the camera is fitted to the mesh")
+    parser.add_argument("--camera-angle", type=float, nargs=2, metavar=("PITCH", "YAW"))
+    parser.add_argument("--workers", type=int, help="worker processes, one per input up to the CPU count by default")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output, exist_ok=True)
+    tasks = [(path, args.output, args.size[0], args.size[1], args.frame, args.camera_pos, args.camera_angle) for path in args.inputs]
+    worker_count = args.workers if args.workers is not None else min(len(tasks), os.cpu_count() or 1)
+    start_time = time.perf_counter()
+    failed = 0
+    with multiprocessing.Pool(worker_count) if worker_count > 1 else contextlib.nullcontext() as pool:
+        for line, ok in (pool.imap(render_thumbnail, tasks) if pool is not None else map(render_thumbnail, tasks)):
+            print(line)
+            failed += 0 if ok else 1
+    elapsed = time.perf_counter() - start_time
+    print("{} thumbnails in {:.2f} s, {:.1f} per second, {} failed".format(len(tasks), elapsed, len(tasks) / elapsed, failed))
+    return 1 if failed > 0 else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,257 @@
+"""
+This file contains the StreamingAnimationLoader class, which decodes JSON animations frame by frame.
+
+The "frames" array is parsed one frame object at a time and every frame's points are written straight into a
+preallocated frames x vertices x 3 float32 block, so the decoded JSON tree of the whole file is never held in memory.
+"""
+
+import codecs
+import json
+import os
+import re
+import time
+import numpy as np
+from animationFormat import AnimationData
+
+TRIANGLES_KEY = '"triangle_indices"'
+NUMBER_CHARACTERS = "0123456789.eE+-"
+# Tokens skip_value has to look at: strings, which may contain brackets, and brackets
+TOKEN_PATTERN = re.compile(r'["\[\]{}]')
+STRING_PATTERN = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"', re.S)
+# An object without nested containers, e.g. a triangle of triangle_indices, is skipped in one match
+FLAT_OBJECT_PATTERN = re.compile(r'\{[^"\[\]{}]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"\[\]{}]*)*\}', re.S)
+
+class StreamingAnimationLoader:
+    def __init__(self, path, chunk_size = 4 * 1024 * 1024, progress_step = 0.05):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.progress_step = progress_step
+        self.file_size = os.path.getsize(path)
+
+        self.file = None
+        self.decoder = json.JSONDecoder()
+        self.text_decoder = None
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.bytes_read = 0
+
+        self.frames = None
+        self.frame_count = 0
+        self.frame_types = []
+        self.triangles = None
+        self.marks = {}
+
+        self.load_time = 0.0
+
+    # Decode the whole file and return an AnimationData.
+    # on_first_frame(data) is called as soon as the first frame is decoded,
+    # on_frames(frames, frame_types) whenever more frames are available and
+    # on_progress(fraction, frame_count) every progress_step of the file.
+    def load(self, on_first_frame = None, on_frames = None, on_progress = None):
+        start_time = time.perf_counter()
+        self.text_decoder = codecs.getincrementaldecoder("utf-8")()
+
+        with open(self.path, "rb") as self.file:
+            self.expect("{")
+            while True:
+                if self.peek() == "}":
+                    break
+                key = self.read_value()
+                self.expect(":")
+                if key == "frames":
+                    self.read_frames(on_first_frame, on_frames, on_progress)
+                elif key == "triangle_indices":
+                    if self.triangles is None:
+                        self.triangles = triangles_to_np(self.read_value())
+                    else:
+                        # Already decoded by find_triangles for the first frame
+                        self.skip_value()
+                elif key == "marks":
+                    self.marks = self.read_value()
+                else:
+                    self.skip_value()
+
+                if self.peek() == ",":
+                    self.pos += 1
+
+        if self.frames is None:
+            raise ValueError("{} has no frames".format(self.path))
+        if self.triangles is None:
+            self.triangles = np.empty((0, 3), dtype=np.uint32)
+
+        self.load_time = time.perf_counter() - start_time
+        return AnimationData(self.frames[:self.frame_count], self.frame_types, self.triangles, self.marks)
+
+    def stats_string(self):
+        return "Loaded {} frames of {} vertices from {:.2f} MB in {:.2f} s, frame block {:.2f} MB".format(
+            self.frame_count, self.frames.shape[1] if self.frames is not None else 0, self.file_size / (1024.0 * 1024.0),
+            self.load_time, self.frames[:self.frame_count].nbytes / (1024.0 * 1024.0) if self.frames is not None else 0.0)
+
+    # Parse the frames array, one frame object at a time
+    def read_frames(self, on_first_frame, on_frames, on_progress):
+        self.expect("[")
+        last_progress = 0.0
+        while self.peek() != "]":
+            frame_start = self.bytes_read - len(self.buffer) + self.pos
+            frame = self.read_value()
+            points = frame["points"]
+
+            if self.frames is None:
+                if self.triangles is None:
+                    # The triangles usually come after the frames, fetch them now so the first frame can be shown
+                    self.triangles = self.find_triangles()
+                frame_bytes = max(self.bytes_read - len(self.buffer) + self.pos - frame_start, 1)
+                self.frames = np.empty((self.estimate_frame_count(frame_bytes, frame_start), len(points), 3), dtype=np.float32)
+
+            if self.frame_count == len(self.frames):
+                self.grow_frames()
+            self.frames[self.frame_count] = [(p["X"], p["Y"], p["Z"]) for p in points]
+            self.frame_types.append(frame["type"])
+            self.frame_count += 1
+
+            if self.frame_count == 1 and on_first_frame is not None:
+                on_first_frame(AnimationData(self.frames[:1], self.frame_types, self.triangles, self.marks))
+            elif on_frames is not None:
+                on_frames(self.frames[:self.frame_count], self.frame_types)
+
+            progress = self.bytes_read / max(self.file_size, 1)
+            if on_progress is not None and progress - last_progress >= self.progress_step:
+                on_progress(progress, self.frame_count)
+                last_progress = progress
+
+            if self.peek() == ",":
+                self.pos += 1
+        self.pos += 1
+
+        if on_progress is not None:
+            on_progress(1.0, self.frame_count)
+
+    # Estimate the number of frames from the size of the first one, with a little headroom
+    def estimate_frame_count(self, frame_bytes, frames_start):
+        return max(int((self.file_size - frames_start) / frame_bytes * 1.02) + 1, 1)
+
+    # Only happens when the estimate was too small, the block is moved to a bigger one
+    def grow_frames(self):
+        grown = np.empty((int(len(self.frames) * 1.25) + 1,) + self.frames.shape[1:], dtype=np.float32)
+        grown[:self.frame_count] = self.frames[:self.frame_count]
+        self.frames = grown
+
+    # Search the file backwards for the triangle_indices key and decode its value
+    def find_triangles(self):
+        overlap = len(TRIANGLES_KEY)
+        with open(self.path, "rb") as f:
+            end = self.file_size
+            while end > 0:
+                start = max(end - self.chunk_size, 0)
+                f.seek(start)
+                block = f.read(end + overlap - start)
+                found = block.rfind(TRIANGLES_KEY.encode("utf-8"))
+                if found != -1:
+                    return triangles_to_np(self.decode_value_at(f, start + found + len(TRIANGLES_KEY)))
+                end = start
+        return np.empty((0, 3), dtype=np.uint32)
+
+    # Decode the value following the ':' at byte offset in f
+    def decode_value_at(self, f, offset):
+        f.seek(offset)
+        text = ""
+        read_size = self.chunk_size
+        while True:
+            more = f.read(read_size)
+            text += more.decode("utf-8", errors="replace")
+            body = text.lstrip()
+            if body.startswith(":"):
+                body = body[1:].lstrip()
+            try:
+                return self.decoder.raw_decode(body)[0]
+            except json.JSONDecodeError:
+                if not more:
+                    raise
+                read_size *= 2
+
+    # Append the next chunk of the file to the buffer, dropping what was already parsed
+    def fill(self, size):
+        if self.eof:
+            return False
+        data = self.file.read(size)
+        self.bytes_read += len(data)
+        if not data:
+            self.eof = True
+            self.buffer = self.buffer[self.pos:] + self.text_decoder.decode(b"", final=True)
+        else:
+            self.buffer = self.buffer[self.pos:] + self.text_decoder.decode(data)
+        self.pos = 0
+        return True
+
+    # Return the next non whitespace character without consuming it
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            self.fill_or_fail()
+
+    def expect(self, character):
+        if self.peek() != character:
+            raise ValueError("{}: expected '{}' at offset {}".format(self.path, character, self.bytes_read - len(self.buffer) + self.pos))
+        self.pos += 1
+
+    # Decode the next complete JSON value, reading more of the file while it is cut off
+    def read_value(self):
+        self.peek()
+        read_size = self.chunk_size
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number at the end of the buffer may continue in the next chunk, e.g. "-2500." of "-2500.0"
+                if self.eof or (end < len(self.buffer) and self.buffer[end] not in NUMBER_CHARACTERS):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill(read_size)
+            read_size *= 2
+
+    # Move past the next JSON value without building it
+    def skip_value(self):
+        if self.peek() not in "[{":
+            self.read_value()
+            return
+        depth = 0
+        while True:
+            token = TOKEN_PATTERN.search(self.buffer, self.pos)
+            if token is None:
+                self.pos = len(self.buffer)
+                self.fill_or_fail()
+                continue
+            self.pos = token.start()
+            character = self.buffer[self.pos]
+            if character == '"' or character == "{":
+                skipped = (STRING_PATTERN if character == '"' else FLAT_OBJECT_PATTERN).match(self.buffer, self.pos)
+                if skipped is not None:
+                    self.pos = skipped.end()
+                elif character == '"':
+                    # The string is cut off by the end of the buffer
+                    self.fill_or_fail()
+                    continue
+                else:
+                    depth += 1
+                    self.pos += 1
+            elif character == "[":
+                depth += 1
+                self.pos += 1
+            else:
+                depth -= 1
+                self.pos += 1
+            if depth == 0:
+                return
+
+    def fill_or_fail(self):
+        if not self.fill(self.chunk_size):
+            raise ValueError("{}: unexpected end of file".format(self.path))
+
+def triangles_to_np(triangles):
+    return np.array([[t['A'], t['B'], t['C']] for t in triangles], dtype=np.uint32).reshape(-1, 3)
@@ -1,22 +1,49 @@
 """
 This file contains the TerminalManager class, which is responsible for managing the terminal interface.
+
+Output from any thread goes through tprint. Plain messages wait in a bounded queue, the oldest is dropped when it
+is full. Messages with a source, e.g. the frame status during playback, only keep the latest text per source and
+are printed at most every source_interval seconds. The printer coroutine sleeps until it is woken up and then
+prints everything that is queued in one batch.
 """
 
 from instances import Instances
 from prompt_toolkit import PromptSession
 from prompt_toolkit.patch_stdout import patch_stdout
 from prompt_toolkit.shortcuts import print_formatted_text
+from collections import deque
 from queue import Queue
-from threading import Thread
+from threading import Lock, local
 import time
 import asyncio
 
 class TerminalManager:
-    def __init__(self):
+    def __init__(self, max_queued = 1000, source_interval = 0.1):
         self.input_queue = Queue()
-        self.output_queue = Queue()
         self.loop = asyncio.new_event_loop()
 
+        self.lock = Lock()
+        self.messages = deque()
+        self.max_queued = max_queued
+        # source -> latest text not printed yet
+        self.latest = {}
+        # source -> time it was printed last
+        self.last_printed = {}
+        self.source_interval = source_interval
+
+        self.output_event = asyncio.Event()
+        # True while a wake-up of the printer is scheduled and not handled yet
+        self.wakeup_pending = False
+        self.timer_pending = False
+
+        self.printed = 0
+        self.dropped = 0
+        # source -> messages replaced by a newer one before they were printed
+        self.coalesced = {}
+
+        # Per thread list collecting the output of a command run for the command server
+        self.capture = local()
+
     def start_async_loop(self):
         asyncio.set_event_loop(self.loop)
         self.loop.create_task(self.start_routine())
@@ -26,13 +53,44 @@ class TerminalManager:
     async def start_routine(self):
         with patch_stdout():
             background_task = self.loop.create_task(self.print_output())
+            if Instances.command_server_instance is not None:
+                await Instances.command_server_instance.start()
+                self.tprint("Listening for commands on {}".format(Instances.command_server_instance.address_string()))
             try:
                 await self.interactive_shell()
             finally:
                 self.loop.stop()
 
-    def tprint(self, s):
-        self.output_queue.put(s)
+    # Queue a message for printing, safe to call from any thread.
+    # Messages with the same source replace each other until printed, e.g. source="frame" for the frame status.
+    def tprint(self, s, source = None):
+        captured = getattr(self.capture, "lines", None)
+        if captured is not None:
+            captured.append(s)
+            return
+        with self.lock:
+            if source is None:
+                if len(self.messages) >= self.max_queued:
+                    self.messages.popleft()
+                    self.dropped += 1
+                self.messages.append(s)
+            else:
+                if source in self.latest:
+                    self.coalesced[source] = self.coalesced.get(source, 0) + 1
+                self.latest[source] = s
+            if self.wakeup_pending:
+                return
+            self.wakeup_pending = True
+        self.loop.call_soon_threadsafe(self.output_event.set)
+
+    # Collect the output printed by this thread until end_capture, instead of printing it
+    def begin_capture(self):
+        self.capture.lines = []
+
+    def end_capture(self):
+        lines = self.capture.lines
+        self.capture.lines = None
+        return lines
 
     async def interactive_shell(self):
         session = PromptSession("Command: ")
@@ -47,13 +105,45 @@ class TerminalManager:
 
     async def print_output(self):
         """
-        Coroutine that prints counters.
+        Coroutine that prints the queued messages in batches whenever it is woken up.
         """
         try:
             while True:
-                if not self.output_queue.empty():
-                    message = self.output_queue.get()
-                    print_formatted_text(message)
-                await asyncio.sleep(0.01)
+                await self.output_event.wait()
+                self.output_event.clear()
+                batch, delay = self.take_batch(time.perf_counter())
+                if len(batch) > 0:
+                    print_formatted_text("\n".join(batch))
+                if delay is not None and not self.timer_pending:
+                    # A rate limited source holds a message back, print it when its interval is over
+                    self.timer_pending = True
+                    self.loop.call_later(delay, self.timer_expired)
         except asyncio.CancelledError:
-            print("Background task cancelled.")
\ No newline at end of file
+            print("Background task cancelled.")
+
+    def timer_expired(self):
+        self.timer_pending = False
+        self.output_event.set()
+
+    # Take the queued messages and the latest message of every source whose interval is over.
+    # Returns the messages and the seconds until a held back message is due, or None.
+    def take_batch(self, now):
+        with self.lock:
+            self.wakeup_pending = False
+            batch = list(self.messages)
+            self.messages.clear()
+
+            delay = None
+            for source in list(self.latest):
+                wait = self.last_printed.get(source, -self.source_interval) + self.source_interval - now
+                if wait <= 0.0:
+                    batch.append(self.latest.pop(source))
+                    self.last_printed[source] = now
+                elif delay is None or wait < delay:
+                    delay = wait
+        self.printed += len(batch)
+        return batch, delay
+
+    def stats_string(self):
+        coalesced = ", ".join("{} {}".format(source, count) for source, count in self.coalesced.items())
+        return "Terminal: {} messages printed, {} dropped, coalesced: {}".format(self.printed, self.dropped, coalesced if coalesced else "none")
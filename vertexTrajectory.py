@@ -0,0 +1,97 @@
+"""
+This file contains the VertexTrajectory class, which holds the paths of a set of vertices across animation frames.
+
+All quantities are computed in one pass over a frames x vertices x 3 block gathered from the animation.
+Velocities and accelerations use central differences, in units per frame unless a frame time is given.
+"""
+
+import numpy as np
+from vector3 import Vector3
+from compressedAnimation import CompressedFrames
+from framePrefetcher import FramePrefetcher
+
+class VertexTrajectory:
+    def __init__(self, frames, vertex_ids, start = 0, end = None, frame_time = 1.0):
+        if end is None:
+            end = len(frames)
+        if not 0 <= start < end <= len(frames):
+            raise IndexError("frame range {}..{} out of range".format(start, end))
+
+        self.vertex_ids = np.atleast_1d(np.asarray(vertex_ids, dtype=np.int64))
+        self.start = start
+        self.end = end
+        self.frame_time = frame_time
+
+        # frames x vertices x 3
+        self.positions = gather_positions(frames, self.vertex_ids, start, end)
+        positions = self.positions.astype(np.float64)
+        if len(positions) > 1:
+            self.velocity = np.gradient(positions, frame_time, axis=0)
+            self.acceleration = np.gradient(self.velocity, frame_time, axis=0)
+        else:
+            self.velocity = np.zeros_like(positions)
+            self.acceleration = np.zeros_like(positions)
+
+        step_lengths = np.linalg.norm(np.diff(positions, axis=0), axis=2)
+        self.path_length = step_lengths.sum(axis=0)
+        displacement = np.linalg.norm(positions - positions[0], axis=2)
+        self.max_displacement_frame = start + displacement.argmax(axis=0)
+        self.max_displacement = displacement.max(axis=0)
+
+    def frame_count(self):
+        return self.end - self.start
+
+    def summary_lines(self):
+        lines = []
+        for k, vertex in enumerate(self.vertex_ids):
+            lines.append("Vertex {}: frames {}..{}, path length {:.6f}, max displacement {:.6f} at frame {}, max speed {:.6f}".format(
+                vertex, self.start, self.end - 1, self.path_length[k], self.max_displacement[k], self.max_displacement_frame[k],
+                np.linalg.norm(self.velocity[:, k], axis=1).max()))
+        return lines
+
+    # One row per frame and vertex: frame, vertex, x, y, z, vx, vy, vz, ax, ay, az
+    def rows(self):
+        frame_count, vertex_count = self.positions.shape[:2]
+        rows = np.empty((frame_count, vertex_count, 11), dtype=np.float64)
+        rows[:, :, 0] = np.arange(self.start, self.end)[:, np.newaxis]
+        rows[:, :, 1] = self.vertex_ids[np.newaxis, :]
+        rows[:, :, 2:5] = self.positions
+        rows[:, :, 5:8] = self.velocity
+        rows[:, :, 8:11] = self.acceleration
+        return rows.reshape(-1, 11)
+
+    def save_csv(self, path):
+        np.savetxt(path, self.rows(), delimiter=",", header="frame,vertex,x,y,z,vx,vy,vz,ax,ay,az", comments="",
+                   fmt=["%d", "%d"] + ["%.9g"] * 9)
+
+    # Saves the frames x vertices x 9 array of position, velocity and acceleration
+    def save_npy(self, path):
+        np.save(path, np.concatenate([self.positions, self.velocity, self.acceleration], axis=2))
+
+    def save(self, path):
+        if path.endswith(".npy"):
+            self.save_npy(path)
+        else:
+            self.save_csv(path)
+
+    # Line segments along the path of every vertex, in the point pair layout of ParticleSystem.lines
+    def polyline(self):
+        lines = []
+        for k in range(len(self.vertex_ids)):
+            path = self.positions[:, k].tolist()
+            for a, b in zip(path[:-1], path[1:]):
+                lines.append(Vector3(*a))
+                lines.append(Vector3(*b))
+        return lines
+
+# Positions of the vertices in the frames start to end - 1, as a frames x vertices x 3 float32 array
+def gather_positions(frames, vertex_ids, start, end):
+    if isinstance(frames, FramePrefetcher):
+        frames = frames.source
+    if isinstance(frames, CompressedFrames):
+        positions = np.empty((end - start, len(vertex_ids), 3), dtype=np.float32)
+        for i in range(start, end):
+            positions[i - start] = frames[i][vertex_ids]
+        return positions
+    # In memory or memory-mapped block, one gather for all frames
+    return np.asarray(frames[start:end, vertex_ids], dtype=np.float32)